@@ -0,0 +1,13 @@
+"""Banc de charge de bout en bout du bot Kanaé.
+
+Les vrais handlers (`events.setup`) et commandes slash (`commands.setup`) sont montés sur un faux
+serveur Discord (`fake_discord`) et une base MySQL simulée en mémoire (`fake_mysql`), ou une base
+MySQL/MariaDB jetable avec `--mysql` (variables DB_* habituelles, tables créées par `ensure_tables`).
+
+Usage :
+    python -m benchmarks reaction_storm --events 2000 --rate 500
+    python -m benchmarks booster_rush --events 200 --db-latency-ms 1
+    python -m benchmarks all --mysql
+
+Chaque scénario affiche débit, latences p50/p99, requêtes SQL et appels API par événement.
+"""
@@ -0,0 +1,43 @@
+import argparse
+import asyncio
+import logging
+
+from .harness import Harness
+from .scenarios import SCENARIOS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Banc de charge du bot Kanaé")
+    parser.add_argument("scenario", choices=[*SCENARIOS, "all"])
+    parser.add_argument("--events", type=int, default=500, help="nombre d'événements par scénario")
+    parser.add_argument("--rate", type=float, default=0.0, help="débit cible en évt/s (0 = rafale)")
+    parser.add_argument("--users", type=int, default=200, help="membres synthétiques sur le serveur")
+    parser.add_argument("--db-latency-ms", type=float, default=0.5, help="aller-retour simulé par requête SQL")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0, help="latence simulée par appel API Discord")
+    parser.add_argument("--timeout", type=float, default=30.0, help="abandon d'un événement bloqué (s)")
+    parser.add_argument("--mysql", action="store_true", help="utilise la vraie base configurée (DB_*) au lieu du fake")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    return parser.parse_args()
+
+
+async def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+    for name in names:
+        # Un harness neuf par scénario : caches, cooldowns et base repartent de zéro
+        async with Harness(
+            users=args.users,
+            db_latency=args.db_latency_ms / 1000,
+            api_latency=args.api_latency_ms / 1000,
+            mysql=args.mysql,
+            timeout=args.timeout,
+        ) as harness:
+            result = await SCENARIOS[name](harness, args.events, args.rate)
+        print(result.report())
+        print()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
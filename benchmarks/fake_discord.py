@@ -0,0 +1,233 @@
+"""Objets Discord synthétiques : juste assez de surface pour les handlers et commandes du bot.
+
+Chaque appel « réseau » (send, defer, edit...) attend `api_latency` secondes et est compté,
+pour séparer le coût du bot de celui de l'API Discord.
+"""
+import asyncio
+import itertools
+from datetime import datetime, timezone
+
+import discord
+
+_ids = itertools.count(10**17)
+
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+class ApiCounter:
+    """Latence simulée et compteur d'appels à l'API Discord."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def call(self):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeRole:
+    def __init__(self, role_id: int, name: str = "role", position: int = 1):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self.mention = f"<@&{role_id}>"
+
+
+class FakeGuild:
+    def __init__(self, api: ApiCounter, name: str = "Kanaé (bench)"):
+        self.id = snowflake()
+        self.name = name
+        self.api = api
+        self.icon = None
+        self._members = {}
+        self._channels = {}
+        self._roles = {}
+
+    @property
+    def members(self):
+        return list(self._members.values())
+
+    def get_member(self, user_id: int):
+        return self._members.get(user_id)
+
+    def get_channel(self, channel_id: int):
+        return self._channels.get(channel_id)
+
+    def get_role(self, role_id: int):
+        return self._roles.get(role_id)
+
+    def add_member(self, name: str = None, bot: bool = False) -> "FakeMember":
+        member = FakeMember(self, name=name, bot=bot)
+        self._members[member.id] = member
+        return member
+
+    def add_channel(self, channel_id: int = None, name: str = "salon") -> "FakeTextChannel":
+        channel = FakeTextChannel(self, channel_id or snowflake(), name)
+        self._channels[channel.id] = channel
+        return channel
+
+
+class FakeMember:
+    """Membre du serveur. Volontairement PAS un `discord.Member` : les mises à jour de rôles de
+    prestige (appels API de gestion des rôles) ne font pas partie des mesures."""
+
+    def __init__(self, guild: FakeGuild, name: str = None, bot: bool = False):
+        self.id = snowflake()
+        self.guild = guild
+        self.name = name or f"membre{self.id % 100000}"
+        self.display_name = self.name
+        self.global_name = self.name
+        self.bot = bot
+        self.roles = []
+        self.joined_at = datetime.now(timezone.utc)
+        self.mention = f"<@{self.id}>"
+        self.dms = []
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.api.call()
+        self.dms.append((content, kwargs))
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, channel, author, content: str = "", attachments=(), embeds=None, view=None):
+        self.id = snowflake()
+        self.channel = channel
+        self.guild = getattr(channel, "guild", None)
+        self.author = author
+        self.content = content
+        self.attachments = list(attachments)
+        self.embeds = list(embeds or [])
+        self.view = view
+        self.created_at = datetime.now(timezone.utc)
+        self.flags = discord.MessageFlags()
+
+    async def edit(self, **kwargs):
+        await self.channel.guild.api.call()
+        if "embed" in kwargs and kwargs["embed"] is not None:
+            self.embeds = [kwargs["embed"]]
+        if "content" in kwargs:
+            self.content = kwargs["content"]
+        return self
+
+    async def add_reaction(self, emoji):
+        await self.channel.guild.api.call()
+
+
+class FakeAttachment:
+    def __init__(self, filename: str):
+        self.filename = filename
+
+
+class FakeTextChannel(discord.TextChannel):
+    """Vrai sous-type de `discord.TextChannel` (les handlers font des isinstance), sans état de connexion."""
+
+    def __init__(self, guild: FakeGuild, channel_id: int, name: str):
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.sent = []
+
+    @property
+    def mention(self):
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.api.call()
+        message = FakeMessage(self, None, content or "", embeds=[kwargs["embed"]] if kwargs.get("embed") else None)
+        self.sent.append(message)
+        return message
+
+    def __repr__(self):
+        return f"<FakeTextChannel id={self.id} name={self.name!r}>"
+
+
+class FakeReaction:
+    def __init__(self, message: FakeMessage, emoji: str = "🔥"):
+        self.message = message
+        self.emoji = emoji
+        self.count = 1
+
+
+class FakeClient:
+    """Ce que les commandes attendent de `interaction.client`."""
+
+    def __init__(self, guild: FakeGuild):
+        self.guild = guild
+        self.user = guild.add_member("KanaéBot", bot=True)
+
+    def get_channel(self, channel_id: int):
+        return self.guild.get_channel(channel_id)
+
+    def get_guild(self, guild_id: int):
+        return self.guild if guild_id == self.guild.id else None
+
+    def get_user(self, user_id: int):
+        return self.guild.get_member(user_id)
+
+
+class FakeResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def _respond(self, **kwargs):
+        if self._done:
+            raise discord.InteractionResponded(self._interaction)
+        self._done = True
+        await self._interaction.guild.api.call()
+        self._interaction.replies.append(kwargs)
+
+    async def defer(self, **kwargs):
+        await self._respond(deferred=True, **kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        await self._respond(content=content, **kwargs)
+
+    async def edit_message(self, **kwargs):
+        await self._respond(**kwargs)
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, **kwargs):
+        await self._interaction.guild.api.call()
+        self._interaction.replies.append(dict(content=content, **kwargs))
+        return FakeMessage(self._interaction.channel, self._interaction.client.user, content or "")
+
+
+class FakeInteraction:
+    """Interaction de commande slash (ou de bouton si `message` est fourni)."""
+
+    def __init__(self, client: FakeClient, user: FakeMember, channel: FakeTextChannel, message: FakeMessage = None):
+        self.id = snowflake()
+        self.client = client
+        self.user = user
+        self.guild = channel.guild
+        self.guild_id = channel.guild.id
+        self.channel = channel
+        self.channel_id = channel.id
+        self.message = message
+        self.replies = []
+        self.extras = {}
+        self.created_at = datetime.now(timezone.utc)
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def edit_original_response(self, **kwargs):
+        await self.guild.api.call()
+        self.replies.append(kwargs)
+
+    async def original_response(self):
+        return self.message
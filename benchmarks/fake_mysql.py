@@ -0,0 +1,262 @@
+"""Stand-in MySQL en mémoire, compatible avec l'usage qu'en fait `bot.database` (API aiomysql).
+
+Ce n'est pas un moteur SQL : seules les requêtes des scénarios ont une vraie sémantique
+(scores, réactions, boosters, Pokédex, liens Twitch) ; les autres SELECT renvoient 0 ligne
+et les écritures 1 ligne modifiée. Chaque requête attend `latency` secondes (aller-retour
+simulé) et le pool limite les connexions à `maxsize`, comme aiomysql (10 par défaut).
+"""
+import asyncio
+import contextvars
+import random
+import re
+import time
+from datetime import datetime, timezone
+
+# Compteur de requêtes de l'événement en cours (posé par le harness autour de chaque événement)
+current_event_queries = contextvars.ContextVar("current_event_queries", default=None)
+
+SEED_POKEWEEDS = [
+    # id, name, hp, capture_points, power, rarity, drop_rate
+    (1, "Bulbakush", 60, 2, 40, "Commun", 0.3),
+    (2, "Lemonix", 55, 2, 35, "Commun", 0.3),
+    (3, "Piekachu", 50, 2, 45, "Commun", 0.3),
+    (4, "Mimosaur", 65, 2, 38, "Commun", 0.3),
+    (5, "Amnesir", 70, 4, 55, "Peu Commun", 0.15),
+    (6, "Sourmander", 72, 4, 60, "Peu Commun", 0.15),
+    (7, "Gelachu", 80, 8, 70, "Rare", 0.07),
+    (8, "Durbanape", 85, 8, 75, "Rare", 0.07),
+    (9, "Kanéclor", 120, 15, 110, "Légendaire", 0.01),
+]
+
+
+def _norm(sql: str) -> str:
+    return " ".join(sql.split())
+
+
+class FakeStore:
+    """Tables en mémoire + règles (motif SQL → handler)."""
+
+    def __init__(self):
+        self.scores = {}
+        self.monthly_scores = {}  # {(period, user_id): points}
+        self.reactions = set()
+        self.booster_cooldowns = {}
+        self.pokeweeds = list(SEED_POKEWEEDS)
+        self.collection = {}  # {(user_id, pokeweed_id): count}
+        self.social_links = {}  # {(username, platform): user_id}
+        self.queries = 0
+        self.by_statement = {}
+        self._rules = [
+            (r"^INSERT INTO (scores) \(user_id, points\) VALUES \(%s, GREATEST\(0, %s\)\)", self._add_points),
+            (r"^INSERT INTO (scores) \(user_id, points\) SELECT d\.user_id", self._add_points_batch),
+            (r"^SELECT points FROM (scores) WHERE user_id=%s", self._get_points),
+            (r"^INSERT INTO (monthly_scores) \(period, user_id, points\) VALUES \(%s, %s, GREATEST\(0, %s\)\)", self._add_points),
+            (r"^INSERT INTO (monthly_scores) \(period, user_id, points\) SELECT %s, d\.user_id", self._add_points_batch),
+            (r"^SELECT points FROM (monthly_scores) WHERE period=%s AND user_id=%s", self._get_points),
+            (r"^SELECT 1 FROM reaction_tracker", self._has_reaction),
+            (r"^INSERT IGNORE INTO reaction_tracker", self._set_reaction),
+            (r"^SELECT last_opened FROM booster_cooldowns", self._get_cooldown),
+            (r"^INSERT INTO booster_cooldowns", self._set_cooldown),
+            (r"^SELECT \* FROM pokeweeds ORDER BY RAND\(\) LIMIT (\d+)", self._random_pokeweeds),
+            (r"^SELECT pokeweed_id, count FROM user_pokeweed_counts", self._get_counts),
+            (r"^SELECT count FROM user_pokeweed_counts", self._get_count),
+            (r"^INSERT INTO user_pokeweed_counts", self._incr_count),
+            (r"^SELECT user_id FROM social_links WHERE username = %s AND platform = %s", self._get_social),
+        ]
+        self._rules = [(re.compile(pattern), handler) for pattern, handler in self._rules]
+
+    def run(self, sql: str, params):
+        statement = _norm(sql)
+        self.queries += 1
+        key = statement[:80]
+        self.by_statement[key] = self.by_statement.get(key, 0) + 1
+        counter = current_event_queries.get()
+        if counter is not None:
+            counter[0] += 1
+        params = tuple(params or ())
+        for pattern, handler in self._rules:
+            match = pattern.search(statement)
+            if match:
+                return handler(match, params)
+        if statement.upper().startswith(("SELECT", "SHOW")):
+            return [], 0
+        return [], 1
+
+    # --- Handlers : renvoient (lignes, rowcount) ---
+
+    def _table(self, name, params):
+        """(table, clé de ligne, paramètres restants) : monthly_scores est partitionnée par période."""
+        if name == "scores":
+            return self.scores, (lambda user_id: int(user_id)), params
+        period = params[0]
+        return self.monthly_scores, (lambda user_id: (period, int(user_id))), params[1:]
+
+    def _add_points(self, match, params):
+        table, key, params = self._table(match.group(1), params)
+        user_id, pts = key(params[0]), int(params[1])
+        table[user_id] = max(0, table.get(user_id, 0) + pts)
+        return [], 1
+
+    def _add_points_batch(self, match, params):
+        table, key, params = self._table(match.group(1), params)
+        for user_id, pts in zip(params[0::2], params[1::2]):
+            table[key(user_id)] = max(0, table.get(key(user_id), 0) + int(pts))
+        return [], len(params) // 2
+
+    def _get_points(self, match, params):
+        table, key, params = self._table(match.group(1), params)
+        user_id = key(params[0])
+        return ([(table[user_id],)] if user_id in table else []), 1
+
+    def _has_reaction(self, match, params):
+        return ([(1,)] if (int(params[0]), int(params[1])) in self.reactions else []), 1
+
+    def _set_reaction(self, match, params):
+        key = (int(params[0]), int(params[1]))
+        if key in self.reactions:
+            return [], 0
+        self.reactions.add(key)
+        return [], 1
+
+    def _get_cooldown(self, match, params):
+        user_id = int(params[0])
+        return ([(self.booster_cooldowns[user_id],)] if user_id in self.booster_cooldowns else []), 1
+
+    def _set_cooldown(self, match, params):
+        self.booster_cooldowns[int(params[0])] = params[1]
+        return [], 1
+
+    def _random_pokeweeds(self, match, params):
+        return random.sample(self.pokeweeds, min(int(match.group(1)), len(self.pokeweeds))), 0
+
+    def _get_counts(self, match, params):
+        user_id, ids = int(params[0]), params[1:]
+        rows = [(pid, self.collection[(user_id, pid)]) for pid in ids if (user_id, pid) in self.collection]
+        return rows, len(rows)
+
+    def _get_count(self, match, params):
+        key = (int(params[0]), int(params[1]))
+        return ([(self.collection[key],)] if key in self.collection else []), 1
+
+    def _incr_count(self, match, params):
+        key = (int(params[0]), int(params[1]))
+        self.collection[key] = self.collection.get(key, 0) + int(params[2])
+        return [], 1
+
+    def _get_social(self, match, params):
+        user_id = self.social_links.get((params[0], params[1]))
+        return ([(user_id,)] if user_id else []), 1
+
+
+class FakeCursor:
+    def __init__(self, conn: "FakeConnection"):
+        self._conn = conn
+        self._rows = []
+        self.rowcount = 0
+        self.lastrowid = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql, params=None):
+        await self._conn.pool.round_trip()
+        self._rows, self.rowcount = self._conn.pool.store.run(sql, params)
+        self._rows = list(self._rows)
+        self.lastrowid = self._conn.pool.next_id()
+        return self.rowcount
+
+    async def executemany(self, sql, seq_params):
+        # aiomysql regroupe les INSERT multi-lignes en un seul aller-retour
+        await self._conn.pool.round_trip()
+        total = 0
+        for params in seq_params:
+            _, count = self._conn.pool.store.run(sql, params)
+            total += count
+        self.rowcount = total
+        return total
+
+    async def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    async def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    async def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+
+    def cursor(self, *args):
+        return FakeCursor(self)
+
+    async def begin(self):
+        await self.pool.round_trip()
+
+    async def commit(self):
+        await self.pool.round_trip()
+
+    async def rollback(self):
+        await self.pool.round_trip()
+
+    async def ping(self, reconnect=True):
+        await self.pool.round_trip()
+
+
+class _Acquire:
+    def __init__(self, pool: "FakePool"):
+        self._pool = pool
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        await self._pool._sem.acquire()
+        self._pool.acquire_waits.append(time.perf_counter() - start)
+        return FakeConnection(self._pool)
+
+    async def __aexit__(self, *exc):
+        self._pool._sem.release()
+        return False
+
+
+class FakePool:
+    def __init__(self, latency: float = 0.0005, maxsize: int = 10, store: FakeStore = None):
+        self.latency = latency
+        self.maxsize = maxsize
+        self.store = store or FakeStore()
+        self.acquire_waits = []
+        self._sem = asyncio.Semaphore(maxsize)
+        self._last_id = 0
+
+    def acquire(self):
+        return _Acquire(self)
+
+    async def round_trip(self):
+        await asyncio.sleep(self.latency)
+
+    def next_id(self) -> int:
+        self._last_id += 1
+        return self._last_id
+
+    @property
+    def size(self):
+        return self.maxsize
+
+    @property
+    def freesize(self):
+        return self._sem._value
+
+    def close(self):
+        pass
+
+    async def wait_closed(self):
+        pass
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
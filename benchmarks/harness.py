@@ -0,0 +1,201 @@
+"""Moteur de mesure : monte le vrai bot (handlers + commandes) sur de faux objets Discord
+et rejoue des événements à débit fixe (boucle ouverte) en mesurant chaque événement."""
+import asyncio
+import contextvars
+import logging
+import time
+from dataclasses import dataclass, field
+
+import discord
+from discord.ext import commands
+
+from bot import commands as bot_commands, config, database, events
+
+from . import fake_discord, fake_mysql
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Result:
+    scenario: str
+    events: int
+    duration: float
+    latencies: list = field(default_factory=list)
+    queries: list = field(default_factory=list)
+    errors: int = 0
+    timeouts: int = 0
+    api_calls: int = 0
+    pool_waits: list = field(default_factory=list)
+    notes: list = field(default_factory=list)
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+    def report(self) -> str:
+        lat = self.latencies
+        lines = [
+            f"📊 {self.scenario}",
+            f"  événements      : {self.events} ({self.errors} en erreur, {self.timeouts} bloqués)",
+            f"  durée           : {self.duration:.3f} s",
+            f"  débit           : {self.events / self.duration if self.duration else 0:.1f} évt/s",
+            f"  latence p50/p99 : {self._percentile(lat, 50) * 1000:.2f} ms / {self._percentile(lat, 99) * 1000:.2f} ms",
+            f"  latence max     : {max(lat, default=0) * 1000:.2f} ms",
+            f"  requêtes/évt    : {sum(self.queries) / len(self.queries) if self.queries else 0:.2f}",
+            f"  appels API/évt  : {self.api_calls / self.events if self.events else 0:.2f}",
+        ]
+        if self.timeouts:
+            lines.append(f"  ⚠️ {self.timeouts} événements abandonnés après le timeout (pool épuisé ? acquire imbriqués ?)")
+        if self.pool_waits:
+            lines.append(f"  attente pool p99: {self._percentile(self.pool_waits, 99) * 1000:.2f} ms")
+        lines.extend(f"  ⚠️ {note}" for note in self.notes)
+        return "\n".join(lines)
+
+
+class Harness:
+    """Un bot Kanaé branché sur un faux serveur et une base (fake ou MySQL jetable)."""
+
+    def __init__(self, users: int = 200, db_latency: float = 0.0005, api_latency: float = 0.0, mysql: bool = False,
+                 timeout: float = 30.0):
+        self.api = fake_discord.ApiCounter(api_latency)
+        self.guild = fake_discord.FakeGuild(self.api)
+        self.client = fake_discord.FakeClient(self.guild)
+        self.members = [self.guild.add_member() for _ in range(users)]
+        self.use_mysql = mysql
+        self.db_latency = db_latency
+        self.timeout = timeout
+        self.store = None
+        self.bot = None
+        self._query_patch = None
+
+    async def __aenter__(self):
+        intents = discord.Intents.default()
+        intents.message_content = True
+        intents.members = True
+        self.bot = commands.Bot(command_prefix="!", intents=intents)
+        events.setup(self.bot)
+        bot_commands.setup(self.bot)
+
+        # Salons que les handlers/commandes vont chercher via la config
+        for channel_id, name in (
+            (config.CHANNEL_POKEWEED_ID, "pokeweed"),
+            (config.BLABLA_CHANNEL_ID, "blabla"),
+        ):
+            if channel_id:
+                self.guild.add_channel(channel_id, name)
+
+        if self.use_mysql:
+            database.db_pool = await database.init_db_pool()
+            await database.ensure_tables(database.db_pool)
+            await self._seed_mysql()
+            self._patch_aiomysql_counters()
+        else:
+            self.store = fake_mysql.FakeStore()
+            # Même partage de connexion (unités de travail) que les pools créés par init_db_pool
+            database.db_pool = database.share_connections(fake_mysql.FakePool(latency=self.db_latency, store=self.store))
+        return self
+
+    async def __aexit__(self, *exc):
+        if self._query_patch:
+            self._query_patch()
+        if self.use_mysql and database.db_pool is not None:
+            database.db_pool.close()
+            await database.db_pool.wait_closed()
+        database.db_pool = None
+        return False
+
+    async def _seed_mysql(self):
+        async with database.db_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    "INSERT IGNORE INTO pokeweeds (id, name, hp, capture_points, power, rarity, drop_rate) "
+                    "VALUES (%s, %s, %s, %s, %s, %s, %s);",
+                    fake_mysql.SEED_POKEWEEDS,
+                )
+
+    def _patch_aiomysql_counters(self):
+        """Compte les requêtes réelles de chaque événement (mode MySQL)."""
+        import aiomysql.cursors
+
+        cursor_cls = aiomysql.cursors.Cursor
+        original_execute, original_many = cursor_cls.execute, cursor_cls.executemany
+
+        def _count():
+            counter = fake_mysql.current_event_queries.get()
+            if counter is not None:
+                counter[0] += 1
+
+        async def execute(cursor, query, args=None):
+            _count()
+            return await original_execute(cursor, query, args)
+
+        async def executemany(cursor, query, args):
+            _count()
+            return await original_many(cursor, query, args)
+
+        cursor_cls.execute, cursor_cls.executemany = execute, executemany
+
+        def restore():
+            cursor_cls.execute, cursor_cls.executemany = original_execute, original_many
+
+        self._query_patch = restore
+
+    # --- Fabriques d'objets synthétiques ---
+
+    def channel(self, channel_id: int = None, name: str = "salon"):
+        return self.guild.get_channel(channel_id) or self.guild.add_channel(channel_id, name)
+
+    def message(self, author, channel=None, content: str = "", attachments=()):
+        return fake_discord.FakeMessage(channel or self.channel(config.BLABLA_CHANNEL_ID, "blabla"), author, content, attachments)
+
+    def interaction(self, user, channel=None, message=None):
+        return fake_discord.FakeInteraction(self.client, user, channel or self.channel(config.BLABLA_CHANNEL_ID, "blabla"), message)
+
+    def command(self, name: str):
+        command = self.bot.tree.get_command(name)
+        if command is None:
+            raise LookupError(f"Commande /{name} introuvable")
+        return command.callback
+
+    # --- Exécution ---
+
+    async def _measure(self, coro_factory, index: int, result: Result):
+        counter = [0]
+        token = fake_mysql.current_event_queries.set(counter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro_factory(index), self.timeout)
+        except asyncio.TimeoutError:
+            result.timeouts += 1
+        except Exception:
+            result.errors += 1
+            logger.exception("Événement %s en erreur", index)
+        finally:
+            result.latencies.append(time.perf_counter() - start)
+            result.queries.append(counter[0])
+            fake_mysql.current_event_queries.reset(token)
+
+    async def run(self, name: str, coro_factory, count: int, rate: float = 0.0) -> Result:
+        """Lance `count` événements ; `rate` > 0 → débit cible en évt/s, sinon tout d'un coup (rafale)."""
+        result = Result(scenario=name, events=count, duration=0.0)
+        api_before = self.api.calls
+        waits_before = len(getattr(database.db_pool, "acquire_waits", ()))
+        tasks = []
+        start = time.perf_counter()
+        for index in range(count):
+            if rate > 0:
+                delay = start + index / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            # Contexte neuf par événement (comme le dispatch de discord.py)
+            ctx = contextvars.copy_context()
+            tasks.append(asyncio.create_task(self._measure(coro_factory, index, result), context=ctx))
+        await asyncio.gather(*tasks)
+        result.duration = time.perf_counter() - start
+        result.api_calls = self.api.calls - api_before
+        result.pool_waits = list(getattr(database.db_pool, "acquire_waits", ())[waits_before:])
+        return result
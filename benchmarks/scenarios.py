@@ -0,0 +1,99 @@
+"""Scénarios de charge. Chacun reçoit un `Harness` prêt et renvoie un `Result`."""
+import random
+import time
+from types import SimpleNamespace
+
+from bot import config, database, state
+
+from . import fake_discord, fake_mysql
+from .harness import Result
+
+
+async def reaction_storm(harness, events: int, rate: float) -> Result:
+    """Des centaines de membres réagissent aux mêmes messages populaires (avec des doublons)."""
+    authors = harness.members[:10]
+    messages = [harness.message(random.choice(authors), content="🔥 gros son") for _ in range(25)]
+
+    async def fire(index):
+        message = messages[index % len(messages)]
+        reactor = random.choice(harness.members)
+        await harness.bot.on_reaction_add(fake_discord.FakeReaction(message), reactor)
+
+    return await harness.run("reaction_storm", fire, events, rate)
+
+
+async def twitch_raid(harness, events: int, rate: float) -> Result:
+    """Un raid Twitch : une vague de messages de chat, une partie des viewers a lié son compte."""
+    try:
+        from bot import twitch_bot
+    except ImportError as e:
+        return Result(scenario="twitch_raid", events=0, duration=0.0, notes=[f"twitchio indisponible ({e}), scénario ignoré"])
+
+    viewers = [f"raider{i}" for i in range(len(harness.members) * 2)]
+    linked = dict(zip(viewers[::2], harness.members))
+    if harness.store is not None:
+        for name, member in linked.items():
+            harness.store.social_links[(name, "twitch")] = member.id
+    else:
+        async with database.db_pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    "INSERT IGNORE INTO social_links (user_id, platform, username) VALUES (%s, 'twitch', %s);",
+                    [(member.id, name) for name, member in linked.items()],
+                )
+
+    # Live « ON » déjà en cache : on mesure le chemin chaud, pas DecAPI
+    twitch_bot.is_live_cache = True
+    twitch_bot.last_live_check = time.time()
+    twitch_bot.twitch_cooldowns.clear()
+    bot = twitch_bot.twitch_bot_instance
+
+    async def fire(index):
+        name = viewers[index % len(viewers)]
+        message = SimpleNamespace(echo=False, content="KanaéRaid", author=SimpleNamespace(name=name))
+        await bot.event_message(message)
+
+    return await harness.run("twitch_raid", fire, events, rate)
+
+
+async def booster_rush(harness, events: int, rate: float) -> Result:
+    """Reset des cooldowns : tout le monde ouvre son /booster en même temps."""
+    booster = harness.command("booster")
+    channel = harness.channel(config.CHANNEL_POKEWEED_ID, "pokeweed")
+
+    async def fire(index):
+        user = harness.members[index % len(harness.members)]
+        await booster(harness.interaction(user, channel))
+
+    result = await harness.run("booster_rush", fire, events, rate)
+    if events > len(harness.members):
+        result.notes.append("plus d'événements que de membres : les suivants tombent sur le cooldown de 12h")
+    return result
+
+
+async def capture_race(harness, events: int, rate: float) -> Result:
+    """Un Pokéweed sauvage apparaît et `events` joueurs tapent /capture au même moment."""
+    capture = harness.command("capture")
+    channel = harness.channel(config.CHANNEL_POKEWEED_ID, "pokeweed")
+    sent_before = len(channel.sent)
+    state.current_spawn = random.choice(fake_mysql.SEED_POKEWEEDS)
+    state.capture_winner = None
+
+    async def fire(index):
+        user = harness.members[index % len(harness.members)]
+        await capture(harness.interaction(user, channel))
+
+    result = await harness.run("capture_race", fire, events, rate)
+    winners = sum(1 for message in channel.sent[sent_before:] if message.content.startswith("🎉 Bravo"))
+    if winners != 1:
+        result.notes.append(f"{winners} gagnants pour un seul Pokéweed (course sur state.capture_winner)")
+    state.current_spawn = None
+    return result
+
+
+SCENARIOS = {
+    "reaction_storm": reaction_storm,
+    "twitch_raid": twitch_raid,
+    "booster_rush": booster_rush,
+    "capture_race": capture_race,
+}
@@ -0,0 +1,159 @@
+"""Sauvegardes des scores en JSON lines compressé (gzip), et restauration.
+
+Format : une 1re ligne d'en-tête `{"kanae_backup": 1, "created": ..., "tables": {table: [colonnes]}}`,
+puis une ligne par enregistrement `{"t": table, "r": [valeurs]}`. Les lignes sont lues par paquets
+via un curseur serveur et écrites/relues dans un thread : la mémoire ne dépend pas du nombre de membres.
+"""
+import asyncio
+import gzip
+import json
+import logging
+import os
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from . import config, database
+
+logger = logging.getLogger(__name__)
+
+BACKUP_FORMAT = 1
+BACKUP_BATCH = 1000
+BACKUP_KEEP = 7  # Fichiers conservés en local dans config.BACKUP_DIR
+
+# Contenus restaurables par /restore-scores
+RESTORE_SETS = {
+    "scores": ("scores", "monthly_scores"),
+    "tout": tuple(database.BACKUP_TABLES),
+}
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=" ")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value)
+    raise TypeError(f"Type non sérialisable : {type(value).__name__}")
+
+
+class _Writer:
+    """Écriture gzip (appelée uniquement depuis des threads, jamais sur la boucle)."""
+
+    def __init__(self, path):
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+
+    def header(self, tables):
+        self._file.write(json.dumps({
+            "kanae_backup": BACKUP_FORMAT,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "tables": {table: list(columns) for table, columns in tables.items()},
+        }) + "\n")
+
+    def rows(self, table, rows):
+        self._file.writelines(json.dumps({"t": table, "r": row}, default=_json_default) + "\n" for row in rows)
+
+    def close(self):
+        self._file.close()
+
+
+class _Reader:
+    """Relecture gzip par paquets (appelée depuis des threads)."""
+
+    def __init__(self, path):
+        self._file = gzip.open(path, "rt", encoding="utf-8")
+        try:
+            header = json.loads(self._file.readline() or "{}")
+        except ValueError:
+            header = {}
+        if header.get("kanae_backup") != BACKUP_FORMAT:
+            self._file.close()
+            raise ValueError("Ce fichier n'est pas une sauvegarde Kanaé (format inconnu).")
+        self.tables = header.get("tables", {})
+        self.created = header.get("created")
+
+    def batch(self, size):
+        rows = []
+        for line in self._file:
+            record = json.loads(line)
+            rows.append((record["t"], record["r"]))
+            if len(rows) >= size:
+                break
+        return rows
+
+    def close(self):
+        self._file.close()
+
+
+def _prepare_path():
+    os.makedirs(config.BACKUP_DIR, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return os.path.join(config.BACKUP_DIR, f"kanae-scores-{stamp}.jsonl.gz")
+
+def _rotate():
+    files = sorted(f for f in os.listdir(config.BACKUP_DIR) if f.startswith("kanae-scores-") and f.endswith(".jsonl.gz"))
+    for name in files[:-BACKUP_KEEP]:
+        os.remove(os.path.join(config.BACKUP_DIR, name))
+
+
+async def write_backup(pool):
+    """Écrit une sauvegarde complète. Renvoie (chemin, {table: nb de lignes})."""
+    path = await asyncio.to_thread(_prepare_path)
+    writer = await asyncio.to_thread(_Writer, path)
+    counts = {}
+    try:
+        await asyncio.to_thread(writer.header, database.BACKUP_TABLES)
+        for table in database.BACKUP_TABLES:
+            counts[table] = 0
+            async for rows in database.stream_backup_rows(pool, table, BACKUP_BATCH):
+                await asyncio.to_thread(writer.rows, table, rows)
+                counts[table] += len(rows)
+    finally:
+        await asyncio.to_thread(writer.close)
+    await asyncio.to_thread(_rotate)
+    logger.info("🗂️ Sauvegarde écrite : %s (%s)", path, counts)
+    return path, counts
+
+
+async def open_for_upload(path):
+    """Sauvegarde ouverte dans un thread, à passer à discord.File puis à fermer par l'appelant.
+
+    aiohttp la lit ensuite par morceaux dans son exécuteur : rien n'est chargé en entier en mémoire.
+    """
+    return await asyncio.to_thread(open, path, "rb")
+
+
+async def restore_backup(pool, path, tables):
+    """Remplace le contenu de `tables` par celui de la sauvegarde, en une seule transaction.
+
+    Renvoie (date de la sauvegarde, {table: nb de lignes restaurées}).
+    """
+    reader = await asyncio.to_thread(_Reader, path)
+    try:
+        missing = [table for table in tables if table not in reader.tables]
+        if missing:
+            raise ValueError(f"Tables absentes de la sauvegarde : {', '.join(missing)}")
+        for table in tables:
+            if list(reader.tables[table]) != list(database.BACKUP_TABLES[table]):
+                raise ValueError(f"Colonnes de {table} incompatibles avec la base actuelle.")
+
+        counts = {table: 0 for table in tables}
+        async with database.unit_of_work(pool, transaction=True):
+            await database.clear_backup_tables(pool, tables)
+            while True:
+                batch = await asyncio.to_thread(reader.batch, BACKUP_BATCH)
+                if not batch:
+                    break
+                by_table = {}
+                for table, row in batch:
+                    if table in counts:
+                        by_table.setdefault(table, []).append(row)
+                for table, rows in by_table.items():
+                    await database.insert_backup_rows(pool, table, rows)
+                    counts[table] += len(rows)
+            if "user_pokeweeds" in tables:
+                await database.rebuild_pokeweed_counts(pool)
+        logger.info("♻️ Sauvegarde du %s restaurée : %s", reader.created, counts)
+        return reader.created, counts
+    finally:
+        await asyncio.to_thread(reader.close)
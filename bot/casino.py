@@ -0,0 +1,447 @@
+import asyncio
+import bisect
+import itertools
+import logging
+from datetime import timezone
+
+import discord
+
+from . import database, helpers, rng, state
+
+logger = logging.getLogger(__name__)
+
+# Durées des manches (en secondes)
+JACKPOT_DURATION = 900   # 15 minutes. Modifie ici si tu veux 1h (3600)
+DOUILLE_DURATION = 60    # Les joueurs ont 60 secondes pour rejoindre
+DOUILLE_MAX_PLAYERS = 6
+SLOT_FRAME_INTERVAL = 1.0  # 1 frame d'animation par seconde max
+
+def to_timestamp(ends_at) -> int:
+    """DATETIME UTC (naïf) stocké en base -> timestamp Discord <t:...:R>."""
+    return int(ends_at.replace(tzinfo=timezone.utc).timestamp())
+
+
+# ===================================================================
+# 🔫 LA DOUILLE
+# ===================================================================
+
+class DouilleView(discord.ui.View):
+    def __init__(self, round_id: int, host_id: int, mise: int, end_time: int, players=None):
+        super().__init__(timeout=None) # Le chrono est géré par le scheduler (casino_rounds)
+        self.round_id = round_id
+        self.host_id = host_id
+        self.mise = mise
+        self.end_time = end_time
+        self.players = set(players or {host_id}) # Le créateur est automatiquement dedans
+        self.editor = None
+
+    def describe(self, footer: str = None) -> str:
+        mentions = " ".join([f"<@{pid}>" for pid in self.players])
+        footer = footer or f"*Cliquez sur le bouton pour rejoindre ! Le coup part <t:{self.end_time}:R>.*"
+        return f"**Mise :** {self.mise} points\n**Joueurs ({len(self.players)}/{DOUILLE_MAX_PLAYERS}) :**\n{mentions}\n\n{footer}"
+
+    @discord.ui.button(label="Rejoindre la partie 🔫", style=discord.ButtonStyle.danger, custom_id="join_douille")
+    async def join_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+        user_id = interaction.user.id
+        if user_id in self.players:
+            await interaction.response.send_message("❌ T'es déjà dans la partie frérot, calme-toi !", ephemeral=True)
+            return
+
+        if len(self.players) >= DOUILLE_MAX_PLAYERS:
+            await interaction.response.send_message("❌ Le barillet est plein (6 joueurs max) !", ephemeral=True)
+            return
+
+        # Débit de la mise (Mois + À Vie) et inscription dans la même transaction
+        status, solde_jouable, stakes = await database.place_casino_stake(
+            database.db_pool, self.round_id, user_id, self.mise,
+            max_players=DOUILLE_MAX_PLAYERS, single_entry=True
+        )
+        if stakes:
+            self.players = set(stakes)
+
+        if status == "funds":
+            await interaction.response.send_message(
+                f"❌ T'es à sec ! Il te faut au moins **{self.mise} points** pour rejoindre (Solde jouable actuel : **{solde_jouable}**).",
+                ephemeral=True
+            )
+            return
+        if status == "already":
+            await interaction.response.send_message("❌ T'es déjà dans la partie frérot, calme-toi !", ephemeral=True)
+            return
+        if status == "full":
+            await interaction.response.send_message("❌ Le barillet est plein (6 joueurs max) !", ephemeral=True)
+            return
+        if status != "ok":
+            await interaction.response.send_message("❌ Trop tard, le coup est déjà parti !", ephemeral=True)
+            return
+
+        await interaction.response.send_message(f"✅ Tu as rejoint la partie pour {self.mise} points !", ephemeral=True)
+
+        # On met à jour le message public avec les nouveaux joueurs et LE COMPTE À REBOURS
+        # (edits regroupés : une rafale de joueurs = quelques edits seulement)
+        if self.editor is None:
+            embed = interaction.message.embeds[0]
+
+            def render():
+                embed.description = self.describe()
+                return {"embed": embed}
+
+            self.editor = helpers.CoalescingEditor(interaction.message, render)
+        self.editor.mark_dirty()
+
+        # Si on atteint 6 joueurs, on lance la partie direct sans attendre la fin du chrono
+        if len(self.players) >= DOUILLE_MAX_PLAYERS:
+            asyncio.create_task(resolve_round(interaction.client, self.round_id))
+
+
+# ===================================================================
+# 🎰 LE GROS POT (JACKPOT)
+# ===================================================================
+
+class JackpotBetModal(discord.ui.Modal, title="Ta mise pour le Gros Pot"):
+    mise_input = discord.ui.TextInput(
+        label="Combien veux-tu miser ? (Min: 10)",
+        placeholder="Ex: 500",
+        min_length=1,
+        max_length=5
+    )
+
+    def __init__(self, parent_view):
+        super().__init__()
+        self.parent_view = parent_view
+
+    async def on_submit(self, interaction: discord.Interaction):
+        try:
+            valeur = int(self.mise_input.value)
+            if valeur < 10:
+                await interaction.response.send_message("❌ La mise minimum est de 10 points !", ephemeral=True)
+                return
+            if valeur > 10000:
+                await interaction.response.send_message("❌ Doucement frérot, mise maximum : 10 000 points !", ephemeral=True)
+                return
+
+            # 🔒 Vérification des points (Mois + Vie), DÉBIT et ajout au pot dans UNE transaction
+            # (la ligne de la manche est verrouillée : les mises passent une par une)
+            status, solde_jouable, stakes = await database.place_casino_stake(
+                database.db_pool, self.parent_view.round_id, interaction.user.id, valeur
+            )
+            if status == "funds":
+                await interaction.response.send_message(f"❌ T'es à sec ! Tu ne peux miser que **{solde_jouable}** max.", ephemeral=True)
+                return
+            if status != "ok":
+                await interaction.response.send_message("❌ Trop tard, le tirage est déjà lancé !", ephemeral=True)
+                return
+
+            # Le pot (cumulable si le joueur remet de l'argent) fait foi en base.
+            # Il ne fait que grossir : on ignore une réponse plus ancienne arrivée en retard
+            if sum(stakes.values()) >= sum(self.parent_view.bets.values()):
+                self.parent_view.bets = stakes
+
+            await interaction.response.send_message(f"✅ BIM ! Tu viens d'injecter **{valeur} points** dans le pot !", ephemeral=True)
+
+            # Mise à jour visuelle du message
+            await self.parent_view.update_message(interaction.message)
+
+        except ValueError:
+            await interaction.response.send_message("❌ Entre un nombre valide, pas des lettres frérot.", ephemeral=True)
+
+
+class JackpotView(discord.ui.View):
+    def __init__(self, round_id: int, end_time: int, bets=None):
+        super().__init__(timeout=None) # Le chrono est géré par le scheduler (casino_rounds)
+        self.round_id = round_id
+        self.end_time = end_time
+        self.bets = dict(bets or {}) # Format : {user_id (int): total_mise (int)}
+        self.editor = None
+
+    @discord.ui.button(label="Miser dans le Pot 💸", style=discord.ButtonStyle.success, custom_id="join_jackpot_btn")
+    async def join_jackpot(self, interaction: discord.Interaction, button: discord.ui.Button):
+        # Ouvre la modale pour taper le montant
+        modal = JackpotBetModal(self)
+        await interaction.response.send_modal(modal)
+
+    async def update_message(self, message: discord.Message):
+        """Programme la mise à jour du pot (edits regroupés, le dernier état gagne)."""
+        if self.editor is None:
+            embed = message.embeds[0]
+            self.editor = helpers.CoalescingEditor(message, lambda: {"embed": self.render_embed(embed)})
+        self.editor.mark_dirty()
+
+    def render_embed(self, embed: discord.Embed) -> discord.Embed:
+        total_pot = sum(self.bets.values())
+
+        # On trie les joueurs par mise (le plus gros parieur en haut)
+        sorted_bets = sorted(self.bets.items(), key=lambda x: x[1], reverse=True)
+
+        lines = []
+        for uid, amount in sorted_bets:
+            prob = (amount / total_pot) * 100
+            lines.append(f"• <@{uid}> : **{amount} pts** *(Chances: {prob:.1f}%)*")
+
+        embed.description = (
+            f"💰 **POT TOTAL : {total_pot} POINTS**\n"
+            f"⏳ **Tirage :** <t:{self.end_time}:R>\n\n"
+            "**🔥 Parieurs actuels :**\n" + ("\n".join(lines) if lines else "*Le pot est vide, sois le premier !*")
+        )
+        return embed
+
+
+# ===================================================================
+# 🎰 LA MACHINE À SOUS (SLOTS 420)
+# ===================================================================
+
+SLOT_SYMBOLS = ("🍒", "🍋", "🍇", "💨", "🍁")
+SLOT_WEIGHTS = (65, 20, 10, 4, 1)
+# Poids compilés une seule fois en table cumulative (tirage = 1 random() + 1 bisect)
+_SLOT_CUMULATIVE = tuple(itertools.accumulate(SLOT_WEIGHTS))
+_SLOT_TOTAL_WEIGHT = _SLOT_CUMULATIVE[-1]
+
+# Brelans : symbole -> (multiplicateur, message, couleur)
+SLOT_TRIPLES = {
+    "🍁": (50, "🌟 **LE GRAND JACKPOT 420 !!!** 🌟\n*Tu as braqué le casino !*", discord.Color.gold()),
+    "💨": (10, "🔥 **SUPER COMBO !** Grosse latte en approche.", discord.Color.orange()),
+    "🍇": (5, "🍇 **Beau gain !**", discord.Color.purple()),
+    "🍋": (3, "🍋 **Pas mal du tout !**", discord.Color.yellow()),
+    "🍒": (2, "🍒 **Petite victoire !** La mise est doublée.", discord.Color.green()),
+}
+SLOT_PAIR = (0.5, "🤏 *Presque... 2 symboles identiques, on te rend la moitié pour l'effort.*", discord.Color.light_grey())
+SLOT_LOSS = (0, "💥 **Perdu !** *La banque encaisse ton don avec le sourire.*", discord.Color.red())
+
+def draw_slot_symbol(gen) -> str:
+    return SLOT_SYMBOLS[bisect.bisect_right(_SLOT_CUMULATIVE, gen.random() * _SLOT_TOTAL_WEIGHT)]
+
+def slot_payout(reels):
+    """(multiplicateur, message, couleur) pour un tirage de 3 rouleaux."""
+    r1, r2, r3 = reels
+    if r1 == r2 == r3:
+        return SLOT_TRIPLES[r1]
+    if r1 == r2 or r1 == r3 or r2 == r3:
+        return SLOT_PAIR
+    return SLOT_LOSS
+
+def spin_slots(mise: int, gen=None):
+    """Tire le résultat d'un coup ET prépare toutes les frames de l'animation.
+
+    Renvoie (rouleaux, multiplicateur, gain total, message, couleur, frames, ticket).
+    Le tirage n'est PAS journalisé ici : l'appelant passe le ticket à `record_spin` une fois le débit connu.
+    """
+    gen = gen or rng.get("slots")
+    reels = (draw_slot_symbol(gen), draw_slot_symbol(gen), draw_slot_symbol(gen))
+    ticket = gen.claim()
+    r1, r2, r3 = reels
+    multiplicateur, message_fin, couleur = slot_payout(reels)
+    frames = (
+        f"💸 **Mise :** `{mise}` points\n\n> {r1} | 🌀 | 🌀 <\n\n*Le premier rouleau ralentit...*",
+        f"💸 **Mise :** `{mise}` points\n\n> {r1} | {r2} | 🌀 <\n\n*Plus qu'un...*",
+        f"💸 **Mise :** `{mise}` points\n\n> **{r1} | {r2} | {r3}** <",
+    )
+    return reels, multiplicateur, int(mise * multiplicateur), message_fin, couleur, frames, ticket
+
+def record_spin(reels, ticket, played: bool, gen=None):
+    """Journalise un coup de machine : un coup refusé (fonds insuffisants) garde sa place dans la séquence, marqué refusé."""
+    outcome = "".join(reels) if played else f"{''.join(reels)} refusé"
+    (gen or rng.get("slots")).record(outcome, ticket)
+
+async def play_slot_animation(message: discord.Message, embed: discord.Embed, frames, final_embed: discord.Embed):
+    """Joue les frames précalculées : 1 edit par seconde max, les frames en retard sont sautées."""
+    current = {"embed": embed}
+    editor = helpers.CoalescingEditor(message, lambda: current, interval=SLOT_FRAME_INTERVAL)
+    for frame in frames:
+        await asyncio.sleep(SLOT_FRAME_INTERVAL)
+        embed.description = frame
+        editor.mark_dirty()
+    current["embed"] = final_embed
+    editor.mark_dirty()
+    await editor.flush()
+
+
+# ===================================================================
+# ⚙️ MOTEUR : résolution par le scheduler, reprise au démarrage
+# ===================================================================
+
+def register_view(view: discord.ui.View):
+    state.casino_views[view.round_id] = view
+
+async def _close_message(channel, message_id, view, embed=None):
+    """Désactive les boutons de la manche (et met à jour l'embed si fourni)."""
+    if not channel or not message_id:
+        return
+    kwargs = {"view": None}
+    if view is not None:
+        # Plus d'edit "live" en attente : le message passe en mode résultat
+        if view.editor is not None:
+            view.editor.cancel()
+        view.stop()
+        for child in view.children:
+            child.disabled = True
+        kwargs["view"] = view
+    if embed is not None:
+        kwargs["embed"] = embed
+    try:
+        await channel.get_partial_message(message_id).edit(**kwargs)
+    except discord.HTTPException:
+        pass
+
+async def _refund(round_id, stakes) -> bool:
+    return await database.settle_casino_round(database.db_pool, round_id, stakes, status='refunded')
+
+async def resolve_round(bot: discord.Client, round_id: int):
+    """Ferme la manche (une seule fois, même si le scheduler et un bouton arrivent ensemble) puis la règle."""
+    claimed = await database.claim_casino_round(database.db_pool, round_id)
+    if not claimed:
+        return
+    game, channel_id, message_id, stake, stakes = claimed
+    view = state.casino_views.pop(round_id, None)
+    channel = bot.get_channel(channel_id)
+
+    try:
+        if game == "jackpot":
+            await _resolve_jackpot(round_id, channel, message_id, view, stakes)
+        elif game == "douille":
+            await _resolve_douille(round_id, channel, message_id, view, stake, stakes)
+        else:
+            await _refund(round_id, stakes)
+    except Exception as e:
+        logger.exception(f"Erreur résolution manche casino {round_id} : {e}")
+        # Si les gains n'ont pas été versés, on rembourse tout le monde
+        await _refund(round_id, stakes)
+
+async def _resolve_jackpot(round_id, channel, message_id, view, bets):
+    # On désactive le bouton
+    await _close_message(channel, message_id, view)
+
+    # 🛡️ SÉCURITÉ : Remboursement s'il y a moins de 2 joueurs
+    if len(bets) < 2:
+        await _refund(round_id, bets)
+        if channel:
+            cancel_embed = discord.Embed(
+                title="🛑 JACKPOT ANNULÉ",
+                description="Il n'y avait pas assez de participants (minimum 2).\n💸 **Toutes les mises ont été remboursées.**",
+                color=discord.Color.red()
+            )
+            await channel.send(embed=cancel_embed)
+        return
+
+    # 🎲 TIRAGE AU SORT PONDÉRÉ
+    participants = list(bets.keys())
+    poids = list(bets.values())
+    total_pot = sum(poids)
+
+    # Choix du gagnant en fonction du poids de sa mise
+    gen = rng.get("jackpot")
+    gagnant_id = gen.choices(participants, weights=poids, k=1)[0]
+    gen.record(f"round {round_id} -> {gagnant_id}")
+
+    # Créditer le gagnant (et clore la manche dans la même transaction)
+    if not await database.settle_casino_round(database.db_pool, round_id, {gagnant_id: total_pot}):
+        return
+    if not channel:
+        return
+
+    # Vérification du rôle de prestige pour le gagnant
+    guild_member = channel.guild.get_member(gagnant_id)
+    if guild_member:
+        new_total = await database.get_user_points(database.db_pool, gagnant_id)
+        await helpers.update_member_prestige_role(guild_member, new_total)
+
+    # 🥁 Animation de suspense
+    suspense_msg = await channel.send("🥁 *Le bot mélange les tickets de tout le monde...*")
+    await asyncio.sleep(2)
+    await suspense_msg.edit(content="🥁 *La main innocente de Kanaé pioche un ticket...*")
+    await asyncio.sleep(2)
+    await suspense_msg.delete()
+
+    # 🎉 Annonce du grand gagnant
+    res_embed = discord.Embed(
+        title="🎊 ET LE GRAND GAGNANT EST... 🎊",
+        description=(
+            f"🏆 **<@{gagnant_id}>** vient de braquer la banque et rafle **{total_pot} points** ! 🤑\n\n"
+            f"📊 *Statistiques du braquage :*\n"
+            f"Il avait misé **{bets[gagnant_id]} points**.\n"
+            f"Il avait **{(bets[gagnant_id] / total_pot) * 100:.1f}%** de chances de l'emporter."
+        ),
+        color=discord.Color.green()
+    )
+    res_embed.set_thumbnail(url="https://i.imgur.com/8Q5A40b.gif") # Un gif festif/casino si tu veux
+
+    await channel.send(content=f"INCROYABLE <@{gagnant_id}> ! 🎉", embed=res_embed)
+
+async def _resolve_douille(round_id, channel, message_id, view, mise, stakes):
+    players = list(stakes.keys())
+
+    # ON ENLÈVE LE CHRONO ET ON ANNONCE LE TIRAGE
+    embed_final = None
+    if view is not None and channel:
+        view.players = set(players)
+        try:
+            message = await channel.fetch_message(message_id)
+            embed_final = message.embeds[0]
+            embed_final.description = view.describe("*Le temps est écoulé... Le barillet tourne ! 💥*")
+        except (discord.HTTPException, IndexError):
+            embed_final = None
+    await _close_message(channel, message_id, view, embed_final)
+
+    if len(players) < 2:
+        # Les mises ont été débitées à l'entrée : on les rend
+        await _refund(round_id, stakes)
+        if channel:
+            await channel.send("❌ Pas assez de couilles sur le serveur... La partie est annulée (il faut au moins 2 joueurs) !")
+        return
+
+    # 💥 LE TIRAGE FATAL
+    gen = rng.get("douille")
+    loser_id = gen.choice(players)
+    gen.record(f"round {round_id} -> {loser_id}")
+    winners = [pid for pid in players if pid != loser_id]
+
+    # Le perdant perd toute sa mise, les gagnants récupèrent la leur + se partagent celle du perdant
+    gain_per_winner = mise // len(winners)
+    payouts = {wid: mise + gain_per_winner for wid in winners}
+    if not await database.settle_casino_round(database.db_pool, round_id, payouts):
+        return
+    if not channel:
+        return
+
+    # Création du message de résultat
+    loser_mention = f"<@{loser_id}>"
+    winners_mentions = "\n".join([f"✅ <@{w}> (+{gain_per_winner} pts)" for w in winners])
+
+    res_embed = discord.Embed(
+        title="💥 PAN ! LE COUP EST PARTI !",
+        description=f"Le barillet a tourné... Et c'est {loser_mention} qui se prend la douille dans la tête ! 💀\n\n"
+                    f"💸 **Il perd sa mise de {mise} points.**\n\n"
+                    f"🏆 **Les survivants se partagent le butin :**\n{winners_mentions}",
+        color=discord.Color.red()
+    )
+    await channel.send(embed=res_embed)
+
+async def resume_rounds(bot: discord.Client):
+    """Au démarrage : rebranche les boutons des manches ouvertes, rembourse celles qu'on ne peut pas reprendre."""
+    rows = await database.get_unfinished_casino_rounds(database.db_pool)
+    for round_id, game, channel_id, message_id, host_id, stake, status, ends_at in rows:
+        channel = bot.get_channel(channel_id)
+        message = None
+        if status == 'open' and channel and message_id:
+            try:
+                message = await channel.fetch_message(message_id)
+            except discord.HTTPException:
+                message = None
+
+        if message is None:
+            # Manche coupée en plein règlement ou message disparu : tout le monde récupère sa mise
+            stakes = await database.get_casino_stakes(database.db_pool, round_id)
+            if await _refund(round_id, stakes):
+                logger.info("♻️ Manche casino %s (%s) remboursée au démarrage", round_id, game)
+                if channel and stakes:
+                    await channel.send(f"♻️ Une partie de **{game}** a été interrompue par un redémarrage : 💸 **toutes les mises ont été remboursées.**")
+            continue
+
+        stakes = await database.get_casino_stakes(database.db_pool, round_id)
+        end_time = to_timestamp(ends_at)
+        if game == "jackpot":
+            view = JackpotView(round_id, end_time, stakes)
+        else:
+            view = DouilleView(round_id, host_id, stake, end_time, stakes.keys())
+        bot.add_view(view, message_id=message_id)
+        register_view(view)
+        logger.info("🎰 Manche casino %s (%s) reprise après redémarrage", round_id, game)
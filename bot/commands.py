@@ -7,20 +7,41 @@ from discord import app_commands
 import asyncio
 import unicodedata
 import re
-import random
+import time
 
-from . import config, database, helpers, state
+from . import backups, casino, config, database, dm_dispatcher, helpers, metrics, persistent_views, query_trace, rng, state
 from datetime import datetime, timedelta, timezone, date
 
 logger = logging.getLogger(__name__)
-active_slots_players = set()
-active_jackpot = False  # Sécurité : Un seul jackpot à la fois
+
+def _save_twitch_tokens():
+    with open(".env", "r") as f:
+        lines = f.readlines()
+    with open(".env", "w") as f:
+        for line in lines:
+            if line.startswith("TWITCH_API_TOKEN="):
+                f.write(f"TWITCH_API_TOKEN={config.TWITCH_API_TOKEN}\n")
+            elif line.startswith("TWITCH_REFRESH_TOKEN="):
+                f.write(f"TWITCH_REFRESH_TOKEN={config.TWITCH_REFRESH_TOKEN}\n")
+            else:
+                f.write(line)
+
+def _write_file(path, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 async def get_valid_twitch_headers():
     if not config.TWITCH_API_TOKEN or not config.TWITCH_REFRESH_TOKEN:
         return None
         
-    async with aiohttp.ClientSession() as session:
+    async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
         # 1. On teste si le token actuel est valide
         validate_url = "https://id.twitch.tv/oauth2/validate"
         headers_test = {"Authorization": f"OAuth {config.TWITCH_API_TOKEN}"}
@@ -43,18 +64,9 @@ async def get_valid_twitch_headers():
                         config.TWITCH_API_TOKEN = js["access_token"]
                         config.TWITCH_REFRESH_TOKEN = js["refresh_token"]
                         
-                        # On met à jour le fichier .env en dur pour sauvegarder
+                        # On met à jour le fichier .env en dur pour sauvegarder (hors de la boucle)
                         try:
-                            with open(".env", "r") as f:
-                                lines = f.readlines()
-                            with open(".env", "w") as f:
-                                for line in lines:
-                                    if line.startswith("TWITCH_API_TOKEN="):
-                                        f.write(f"TWITCH_API_TOKEN={config.TWITCH_API_TOKEN}\n")
-                                    elif line.startswith("TWITCH_REFRESH_TOKEN="):
-                                        f.write(f"TWITCH_REFRESH_TOKEN={config.TWITCH_REFRESH_TOKEN}\n")
-                                    else:
-                                        f.write(line)
+                            await asyncio.to_thread(_save_twitch_tokens)
                             logger.info("✅ Nouveau token Twitch généré et sauvegardé !")
                         except Exception as e:
                             logger.error(f"❌ Erreur d'écriture du .env : {e}")
@@ -99,25 +111,41 @@ def format_pokeweed_display(name, power, hp, rarity, owned=0):
 
 # Set global pour bloquer le double-clic (anti-cheat)
 _inflight_claims: set[int] = set()
+# Noms des cartes (les boutons persistants ne transportent que l'id)
+_card_names: dict[int, str] = {}
 
-class ClaimPokeweedView(discord.ui.View):
-    def __init__(self, user_id: int, pokeweed_id: int, pokeweed_name: str, points_value: int, total_owned: int):
-        super().__init__(timeout=None)
+async def _card_name(pokeweed_id: int) -> str:
+    if pokeweed_id not in _card_names:
+        _card_names.update(await database.get_pokeweed_names(database.db_pool, [pokeweed_id]))
+    return _card_names.get(pokeweed_id, "cette carte")
+
+def _sell_label(points_value: int, total_owned: int, remaining: int = None) -> str:
+    quota = f" [{remaining}/{database.SALES_QUOTA}]" if remaining is not None else ""
+    if total_owned == 1:
+        return f"Vendre l'unique ({points_value} pts) 💰{quota}"
+    return f"Vendre 1 double ({points_value} pts) 💰{quota}"
+
+@persistent_views.dynamic
+class SellCardButton(discord.ui.DynamicItem[discord.ui.Button], template=r"pw_sell:(?P<uid>\d+):(?P<pid>\d+):(?P<pts>\d+):(?P<owned>\d+)"):
+    """Bouton Vendre : custom_id = pw_sell:<joueur>:<carte>:<points>:<exemplaires possédés>."""
+
+    def __init__(self, user_id: int, pokeweed_id: int, points_value: int, total_owned: int, label: str = None):
+        # Choix de la couleur : rouge s'il n'en a qu'un (attention danger), vert sinon
+        super().__init__(discord.ui.Button(
+            label=label or _sell_label(points_value, total_owned),
+            style=discord.ButtonStyle.danger if total_owned == 1 else discord.ButtonStyle.success,
+            custom_id=f"pw_sell:{user_id}:{pokeweed_id}:{points_value}:{total_owned}"
+        ))
         self.user_id = user_id
         self.pokeweed_id = pokeweed_id
-        self.pokeweed_name = pokeweed_name
         self.points_value = points_value
         self.total_owned = total_owned
 
-        # Choix de la couleur : rouge s'il n'en a qu'un (attention danger), vert sinon
-        btn_style = discord.ButtonStyle.danger if total_owned == 1 else discord.ButtonStyle.success
-        label = f"Vendre l'unique ({points_value} pts) 💰" if total_owned == 1 else f"Vendre 1 double ({points_value} pts) 💰"
-
-        self.claim_btn = discord.ui.Button(label=label, style=btn_style, custom_id=f"claim_{pokeweed_id}")
-        self.claim_btn.callback = self.claim_callback
-        self.add_item(self.claim_btn)
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["uid"]), int(match["pid"]), int(match["pts"]), int(match["owned"]), item.label)
 
-    async def claim_callback(self, interaction: discord.Interaction):
+    async def callback(self, interaction: discord.Interaction):
         # Sécurité 1 : Vérifie si c'est bien l'auteur de la commande
         if interaction.user.id != self.user_id:
             await interaction.response.send_message("❌ Bas les pattes, ce n'est pas ton Pokédex !", ephemeral=True)
@@ -133,44 +161,41 @@ class ClaimPokeweedView(discord.ui.View):
             # 🛠️ CORRECTION ICI : On defer la mise à jour du composant (sans recréer de message éphémère)
             await interaction.response.defer()
 
-            # Sécurité 3 : Limite de 10 ventes par 5 heures
-            sales_count = await database.get_recent_sales_count(database.db_pool, self.user_id, hours=5)
-            if sales_count >= 10:
-                await interaction.followup.send("❌ Tu as atteint la limite de **10 ventes par 5 heures**. Reviens plus tard frérot !", ephemeral=True)
-                return
+            # Exécution de la vente (quota de 10 ventes / 5h vérifié dans la même transaction)
+            status, _, _, new_total, remaining = await database.sell_cards(
+                database.db_pool, self.user_id, [(self.pokeweed_id, 1)], self.points_value
+            )
+            name = await _card_name(self.pokeweed_id)
 
-            # Exécution de la vente
-            success = await database.sell_pokeweed(database.db_pool, self.user_id, self.pokeweed_id, self.points_value)
+            if status == "quota":
+                await interaction.followup.send(f"❌ Tu as atteint la limite de **{database.SALES_QUOTA} ventes par {database.SALES_QUOTA_HOURS} heures**. Reviens plus tard frérot !", ephemeral=True)
+                return
 
-            if not success:
-                self.claim_btn.disabled = True
+            if status != "ok":
+                self.item.disabled = True
                 # 🛠️ CORRECTION ICI : On utilise edit_original_response au lieu de message.edit
-                await interaction.edit_original_response(view=self)
-                await interaction.followup.send(f"❌ Impossible de vendre {self.pokeweed_name}. (As-tu déjà tout vendu ?)", ephemeral=True)
+                await interaction.edit_original_response(view=self.view)
+                await interaction.followup.send(f"❌ Impossible de vendre {name}. (As-tu déjà tout vendu ?)", ephemeral=True)
                 return
 
-            self.total_owned -= 1
-            sales_count += 1
-
             # Mise à jour des grades s'il a dépassé un palier grâce à l'argent
-            from . import helpers # Assure-toi que helpers est bien importé ou accessible
-            new_total = await database.get_user_points(database.db_pool, str(self.user_id))
             await helpers.update_member_prestige_role(interaction.user, new_total)
 
-            # Modification dynamique du bouton
+            # Modification dynamique du bouton (le nouveau stock repart dans le custom_id)
+            self.total_owned -= 1
             if self.total_owned > 0:
-                self.claim_btn.label = f"Vendre 1 double ({self.points_value} pts) 💰 [{10 - sales_count}/10]"
+                self.custom_id = f"pw_sell:{self.user_id}:{self.pokeweed_id}:{self.points_value}:{self.total_owned}"
+                self.item.label = _sell_label(self.points_value, self.total_owned, remaining)
                 if self.total_owned == 1:
-                    self.claim_btn.style = discord.ButtonStyle.danger
-                    self.claim_btn.label = f"Vendre l'unique ({self.points_value} pts) 💰 [{10 - sales_count}/10]"
+                    self.item.style = discord.ButtonStyle.danger
             else:
-                self.claim_btn.label = "Plus de cartes ❌"
-                self.claim_btn.disabled = True
+                self.item.label = "Plus de cartes ❌"
+                self.item.disabled = True
 
             # 🛠️ CORRECTION ICI AUSSI
-            await interaction.edit_original_response(view=self)
+            await interaction.edit_original_response(view=self.view)
             
-            await interaction.followup.send(f"✅ Vente réussie ! **+{self.points_value} pts** pour {self.pokeweed_name}.", ephemeral=True)
+            await interaction.followup.send(f"✅ Vente réussie ! **+{self.points_value} pts** pour {name}.", ephemeral=True)
 
         except Exception as e:
             logger.exception(f"Erreur claim_callback pour {self.user_id} : {e}")
@@ -178,6 +203,12 @@ class ClaimPokeweedView(discord.ui.View):
         finally:
             _inflight_claims.discard(self.user_id)
 
+class ClaimPokeweedView(discord.ui.View):
+    def __init__(self, user_id: int, pokeweed_id: int, pokeweed_name: str, points_value: int, total_owned: int):
+        super().__init__(timeout=None)
+        _card_names[pokeweed_id] = pokeweed_name
+        self.add_item(SellCardButton(user_id, pokeweed_id, points_value, total_owned))
+
 class LivePreviewView(discord.ui.View):
     def __init__(self, bot, author, content_to_send):
         super().__init__(timeout=120) # 2 minutes pour confirmer
@@ -219,46 +250,73 @@ class LivePreviewView(discord.ui.View):
             child.disabled = True
         await interaction.response.edit_message(content="❌ **Annonce annulée.** T'as eu un coup de pression ?", view=self)
 
-class TradeOfferView(discord.ui.View):
-    def __init__(self, u1: discord.Member, u2: discord.Member, p1_id: int, p2_id: int, p1_name: str, p2_name: str):
-        super().__init__(timeout=7200) # 2 heures
+def _trade_label(name: str, qty: int) -> str:
+    return f"{qty}x {name}" if qty > 1 else name
+
+TRADE_TIMEOUT = 7200 # 2 heures
+
+@persistent_views.dynamic
+class TradeButton(discord.ui.DynamicItem[discord.ui.Button], template=r"trade:(?P<action>ok|no):(?P<u1>\d+):(?P<u2>\d+):(?P<p1>\d+):(?P<q1>\d+):(?P<p2>\d+):(?P<q2>\d+)"):
+    """Boutons d'une offre d'échange : custom_id = trade:<ok|no>:<u1>:<u2>:<carte1>:<qté1>:<carte2>:<qté2>."""
+
+    def __init__(self, action: str, u1: int, u2: int, p1_id: int, p1_qty: int, p2_id: int, p2_qty: int):
+        accept = action == "ok"
+        super().__init__(discord.ui.Button(
+            label="Accepter l'échange ✅" if accept else "Annuler ❌",
+            style=discord.ButtonStyle.success if accept else discord.ButtonStyle.danger,
+            custom_id=f"trade:{action}:{u1}:{u2}:{p1_id}:{p1_qty}:{p2_id}:{p2_qty}"
+        ))
+        self.action = action
         self.u1 = u1
         self.u2 = u2
         self.p1_id = p1_id
+        self.p1_qty = p1_qty
         self.p2_id = p2_id
-        self.p1_name = p1_name
-        self.p2_name = p2_name
+        self.p2_qty = p2_qty
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(match["action"], int(match["u1"]), int(match["u2"]), int(match["p1"]), int(match["q1"]), int(match["p2"]), int(match["q2"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        if persistent_views.message_age(interaction.message) > TRADE_TIMEOUT:
+            persistent_views.disable_all(self.view)
+            await interaction.response.edit_message(content="⌛ **Offre expirée.** Relance un `/echange` si tu veux toujours cette carte.", embed=None, view=self.view)
+            return
+        if self.action == "ok":
+            await self.accept(interaction)
+        else:
+            await self.cancel(interaction)
 
-    @discord.ui.button(label="Accepter l'échange ✅", style=discord.ButtonStyle.success)
-    async def btn_accept(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id != self.u2.id:
+    async def accept(self, interaction: discord.Interaction):
+        if interaction.user.id != self.u2:
             await interaction.response.send_message("❌ Bas les pattes, cet échange ne t'est pas adressé !", ephemeral=True)
             return
 
         # Sécurité anti-spam
-        if self.u1.id in _inflight_claims or self.u2.id in _inflight_claims:
+        if self.u1 in _inflight_claims or self.u2 in _inflight_claims:
             await interaction.response.send_message("⏳ L'un de vous a déjà une transaction en cours, doucement...", ephemeral=True)
             return
 
-        _inflight_claims.update([self.u1.id, self.u2.id])
+        _inflight_claims.update([self.u1, self.u2])
         try:
             await interaction.response.defer()
             # L'exécution ultra sécurisée de l'échange
-            success = await database.execute_trade(database.db_pool, self.u1.id, self.p1_id, self.u2.id, self.p2_id)
+            success = await database.execute_trade(database.db_pool, self.u1, self.p1_id, self.u2, self.p2_id, self.p1_qty, self.p2_qty)
             
-            for child in self.children:
-                child.disabled = True
+            persistent_views.disable_all(self.view)
             
             if success:
                 # 1. On grise les boutons et on met à jour le message d'offre
                 embed = interaction.message.embeds[0]
                 embed.color = discord.Color.green()
                 embed.title = "🤝 Échange terminé avec succès !"
-                await interaction.edit_original_response(embed=embed, view=self)
+                await interaction.edit_original_response(embed=embed, view=self.view)
                 
                 # 2. On envoie l'annonce officielle DIRECTEMENT dans le salon Pokéweed
+                p1_name, p2_name = await _card_name(self.p1_id), await _card_name(self.p2_id)
                 pokeweed_channel = interaction.client.get_channel(config.CHANNEL_POKEWEED_ID)
-                success_msg = f"🎉 **Échange réussi !** {self.u1.mention} récupère **{self.p2_name}** et {self.u2.mention} récupère **{self.p1_name}** ! 🤝🌿"
+                success_msg = f"🎉 **Échange réussi !** <@{self.u1}> récupère **{_trade_label(p2_name, self.p2_qty)}** et <@{self.u2}> récupère **{_trade_label(p1_name, self.p1_qty)}** ! 🤝🌿"
                 
                 if pokeweed_channel:
                     await pokeweed_channel.send(success_msg)
@@ -266,24 +324,31 @@ class TradeOfferView(discord.ui.View):
                     # Petite sécurité si jamais le salon bug
                     await interaction.followup.send(success_msg)
             else:
-                await interaction.edit_original_response(content="❌ **Échange annulé.** Quelqu'un a vendu sa carte entre-temps ou un problème est survenu !", embed=None, view=self)
+                await interaction.edit_original_response(content="❌ **Échange annulé.** Quelqu'un a vendu sa carte entre-temps ou un problème est survenu !", embed=None, view=self.view)
         finally:
-            _inflight_claims.discard(self.u1.id)
-            _inflight_claims.discard(self.u2.id)
+            _inflight_claims.discard(self.u1)
+            _inflight_claims.discard(self.u2)
 
-    @discord.ui.button(label="Annuler ❌", style=discord.ButtonStyle.danger)
-    async def btn_cancel(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user.id not in [self.u1.id, self.u2.id]:
+    async def cancel(self, interaction: discord.Interaction):
+        if interaction.user.id not in [self.u1, self.u2]:
             await interaction.response.send_message("❌ Tu n'es pas dans cet échange.", ephemeral=True)
             return
             
-        for child in self.children:
-            child.disabled = True
-        await interaction.response.edit_message(content=f"🚫 Échange annulé par {interaction.user.mention}.", embed=None, view=self)
+        persistent_views.disable_all(self.view)
+        await interaction.response.edit_message(content=f"🚫 Échange annulé par {interaction.user.mention}.", embed=None, view=self.view)
+
+class TradeOfferView(discord.ui.View):
+    def __init__(self, u1: discord.Member, u2: discord.Member, p1_id: int, p2_id: int, p1_name: str, p2_name: str, p1_qty: int = 1, p2_qty: int = 1):
+        # Pas de timeout : l'offre expire au bout de 2h d'après l'âge du message (même après un redémarrage)
+        super().__init__(timeout=None)
+        _card_names[p1_id] = p1_name
+        _card_names[p2_id] = p2_name
+        for action in ("ok", "no"):
+            self.add_item(TradeButton(action, u1.id, u2.id, p1_id, p1_qty, p2_id, p2_qty))
 
 
 class TradePreviewView(discord.ui.View):
-    def __init__(self, bot, u1: discord.Member, u2: discord.Member, p1_id: int, p2_id: int, p1_name: str, p2_name: str):
+    def __init__(self, bot, u1: discord.Member, u2: discord.Member, p1_id: int, p2_id: int, p1_name: str, p2_name: str, p1_qty: int = 1, p2_qty: int = 1):
         super().__init__(timeout=120)
         self.bot = bot
         self.u1 = u1
@@ -292,6 +357,8 @@ class TradePreviewView(discord.ui.View):
         self.p2_id = p2_id
         self.p1_name = p1_name
         self.p2_name = p2_name
+        self.p1_qty = p1_qty
+        self.p2_qty = p2_qty
 
     @discord.ui.button(label="Confirmer et Proposer ✅", style=discord.ButtonStyle.success)
     async def btn_confirm(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -310,10 +377,10 @@ class TradePreviewView(discord.ui.View):
             description=f"{self.u2.mention}, tu as **2 heures** pour répondre à l'offre de {self.u1.mention} !",
             color=discord.Color.gold()
         )
-        embed.add_field(name=f"Ce que propose {self.u1.display_name} :", value=f"🌿 **{self.p1_name}**", inline=False)
-        embed.add_field(name="Ce qu'il veut en retour :", value=f"🌿 **{self.p2_name}**", inline=False)
+        embed.add_field(name=f"Ce que propose {self.u1.display_name} :", value=f"🌿 **{_trade_label(self.p1_name, self.p1_qty)}**", inline=False)
+        embed.add_field(name="Ce qu'il veut en retour :", value=f"🌿 **{_trade_label(self.p2_name, self.p2_qty)}**", inline=False)
         
-        view = TradeOfferView(self.u1, self.u2, self.p1_id, self.p2_id, self.p1_name, self.p2_name)
+        view = TradeOfferView(self.u1, self.u2, self.p1_id, self.p2_id, self.p1_name, self.p2_name, self.p1_qty, self.p2_qty)
         await channel.send(content=self.u2.mention, embed=embed, view=view)
 
     @discord.ui.button(label="Annuler ❌", style=discord.ButtonStyle.secondary)
@@ -375,50 +442,6 @@ class LiveModal(discord.ui.Modal, title='Annonce ton Live Twitch !'):
         view = LivePreviewView(interaction.client, interaction.user, message_content)
         await interaction.response.send_message(preview_text, view=view, ephemeral=True)            
 
-class DouilleView(discord.ui.View):
-    def __init__(self, host_id: int, mise: int, end_time: int):
-        super().__init__(timeout=60.0) # Les joueurs ont 60 secondes pour rejoindre
-        self.host_id = host_id
-        self.mise = mise
-        self.end_time = end_time # On le sauvegarde
-        self.players = {host_id} # Le créateur est automatiquement dedans
-        
-    @discord.ui.button(label="Rejoindre la partie 🔫", style=discord.ButtonStyle.danger, custom_id="join_douille")
-    async def join_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
-        user_id = interaction.user.id
-        if user_id in self.players:
-            await interaction.response.send_message("❌ T'es déjà dans la partie frérot, calme-toi !", ephemeral=True)
-            return
-            
-        if len(self.players) >= 6:
-            await interaction.response.send_message("❌ Le barillet est plein (6 joueurs max) !", ephemeral=True)
-            return
-            
-        # On vérifie si le joueur a assez de points pour suivre la mise (Mois + À Vie)
-        current_points = await database.get_user_points(database.db_pool, str(user_id))
-        monthly_points = await database.get_user_monthly_points(database.db_pool, str(user_id))
-        solde_jouable = min(current_points, monthly_points)
-
-        if solde_jouable < self.mise:
-            await interaction.response.send_message(
-                f"❌ T'es à sec ! Il te faut au moins **{self.mise} points** pour rejoindre (Solde jouable actuel : **{solde_jouable}**).", 
-                ephemeral=True
-            )
-            return
-            
-        self.players.add(user_id)
-        await interaction.response.send_message(f"✅ Tu as rejoint la partie pour {self.mise} points !", ephemeral=True)
-        
-        # On met à jour le message public avec les nouveaux joueurs et LE COMPTE À REBOURS
-        mentions = " ".join([f"<@{pid}>" for pid in self.players])
-        embed = interaction.message.embeds[0]
-        embed.description = f"**Mise :** {self.mise} points\n**Joueurs ({len(self.players)}/6) :**\n{mentions}\n\n*Cliquez sur le bouton pour rejoindre ! Le coup part <t:{self.end_time}:R>.*"
-        await interaction.message.edit(embed=embed)
-        
-        # Si on atteint 6 joueurs, on lance la partie direct sans attendre la fin du chrono
-        if len(self.players) >= 6:
-            self.stop()
-
 class CandidatureModal(discord.ui.Modal, title='Candidature Staff Kanaé'):
     # On définit les champs que l'utilisateur devra remplir
     poste = discord.ui.TextInput(
@@ -481,92 +504,6 @@ class CandidatureModal(discord.ui.Modal, title='Candidature Staff Kanaé'):
         else:
             logger.error("❌ Impossible de trouver le salon de recrutement. Vérifie CHANNEL_RECRUTEMENT_ID.")
 
-class JackpotBetModal(discord.ui.Modal, title="Ta mise pour le Gros Pot"):
-    mise_input = discord.ui.TextInput(
-        label="Combien veux-tu miser ? (Min: 10)",
-        placeholder="Ex: 500",
-        min_length=1,
-        max_length=5
-    )
-
-    def __init__(self, parent_view):
-        super().__init__()
-        self.parent_view = parent_view
-
-    async def on_submit(self, interaction: discord.Interaction):
-        try:
-            valeur = int(self.mise_input.value)
-            if valeur < 10:
-                await interaction.response.send_message("❌ La mise minimum est de 10 points !", ephemeral=True)
-                return
-            if valeur > 10000:
-                await interaction.response.send_message("❌ Doucement frérot, mise maximum : 10 000 points !", ephemeral=True)
-                return
-            
-            user_id = str(interaction.user.id)
-            
-            # 🔒 SÉCURITÉ ANTI-RACE CONDITION (Traitement un par un)
-            async with self.parent_view.lock:
-                # 1. Vérification stricte des points (Mois + Vie)
-                p_vie = await database.get_user_points(database.db_pool, user_id)
-                p_mois = await database.get_user_monthly_points(database.db_pool, user_id)
-                solde_jouable = min(p_vie, p_mois)
-
-                if solde_jouable < valeur:
-                    await interaction.response.send_message(f"❌ T'es à sec ! Tu ne peux miser que **{solde_jouable}** max.", ephemeral=True)
-                    return
-
-                # 2. DÉBIT IMMÉDIAT (Pour éviter les fraudes)
-                await database.add_points(database.db_pool, user_id, -valeur)
-                
-                # 3. Ajout au pot (cumulable si le joueur remet de l'argent)
-                current_bet = self.parent_view.bets.get(interaction.user.id, 0)
-                self.parent_view.bets[interaction.user.id] = current_bet + valeur
-
-            await interaction.response.send_message(f"✅ BIM ! Tu viens d'injecter **{valeur} points** dans le pot !", ephemeral=True)
-            
-            # Mise à jour visuelle du message
-            await self.parent_view.update_message(interaction.message)
-
-        except ValueError:
-            await interaction.response.send_message("❌ Entre un nombre valide, pas des lettres frérot.", ephemeral=True)
-
-
-class JackpotView(discord.ui.View):
-    def __init__(self, end_time: int):
-        super().__init__(timeout=None) # Le timeout est géré manuellement
-        self.end_time = end_time
-        self.bets = {} # Format : {user_id (int): total_mise (int)}
-        self.lock = asyncio.Lock() # Cadenas de sécurité
-        
-    @discord.ui.button(label="Miser dans le Pot 💸", style=discord.ButtonStyle.success, custom_id="join_jackpot_btn")
-    async def join_jackpot(self, interaction: discord.Interaction, button: discord.ui.Button):
-        # Ouvre la modale pour taper le montant
-        modal = JackpotBetModal(self)
-        await interaction.response.send_modal(modal)
-
-    async def update_message(self, message: discord.Message):
-        total_pot = sum(self.bets.values())
-        
-        # On trie les joueurs par mise (le plus gros parieur en haut)
-        sorted_bets = sorted(self.bets.items(), key=lambda x: x[1], reverse=True)
-        
-        lines = []
-        for uid, amount in sorted_bets:
-            prob = (amount / total_pot) * 100
-            lines.append(f"• <@{uid}> : **{amount} pts** *(Chances: {prob:.1f}%)*")
-        
-        embed = message.embeds[0]
-        embed.description = (
-            f"💰 **POT TOTAL : {total_pot} POINTS**\n"
-            f"⏳ **Tirage :** <t:{self.end_time}:R>\n\n"
-            "**🔥 Parieurs actuels :**\n" + ("\n".join(lines) if lines else "*Le pot est vide, sois le premier !*")
-        )
-        try:
-            await message.edit(embed=embed)
-        except discord.NotFound:
-            pass
-
 def setup(bot: commands.Bot):
     # ---------------------------------------
     # /hey
@@ -576,7 +513,7 @@ def setup(bot: commands.Bot):
     async def hey(interaction: discord.Interaction, message: str):
         await interaction.response.defer(ephemeral=True)
         try:
-            async with aiohttp.ClientSession() as session:
+            async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
                 headers = {
                     "Authorization": f"Bearer {config.MISTRAL_API_KEY}",
                     "Content-Type": "application/json",
@@ -615,8 +552,11 @@ def setup(bot: commands.Bot):
                 # Récupérer classement global
                 await cur.execute("SELECT user_id, points FROM scores ORDER BY points DESC;")
                 global_rows = await cur.fetchall()
-                # Récupérer classement mensuel
-                await cur.execute("SELECT user_id, points FROM monthly_scores ORDER BY points DESC;")
+                # Récupérer classement mensuel (période en cours)
+                await cur.execute(
+                    "SELECT user_id, points FROM monthly_scores WHERE period=%s ORDER BY points DESC;",
+                    (database.current_period(),)
+                )
                 monthly_rows = await cur.fetchall()
 
         # Fonction locale pour calculer la position et les points en ignorant les exclus
@@ -666,21 +606,40 @@ def setup(bot: commands.Bot):
     # ---------------------------------------
     # /top (Mois et À vie)
     # ---------------------------------------
+    async def period_autocomplete(interaction: discord.Interaction, current: str):
+        periods = await database.get_monthly_periods(database.db_pool)
+        return [app_commands.Choice(name=p, value=p) for p in periods if current in p][:25]
+
     @bot.tree.command(name="top", description="Affiche le classement des meilleurs fumeurs")
-    @app_commands.describe(categorie="Choisis quel classement tu veux voir")
+    @app_commands.describe(
+        categorie="Choisis quel classement tu veux voir",
+        mois="Historique : classement d'un mois passé (AAAA-MM)"
+    )
     @app_commands.choices(categorie=[
         app_commands.Choice(name="🏆 Mensuel (Kanaé d'Or)", value="mois"),
         app_commands.Choice(name="🌟 À vie (Panthéon)", value="vie"),
     ])
-    async def top(interaction: discord.Interaction, categorie: app_commands.Choice[str]):
-        is_monthly = (categorie.value == "mois")
-        table = "monthly_scores" if is_monthly else "scores"
-        header = "🏆 Classement du Mois : Kanaé d'Or 🏆" if is_monthly else "🌟 Classement à Vie : Panthéon 🌟"
-        
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(f"SELECT user_id, points FROM {table} ORDER BY points DESC;")
-                rows = await cur.fetchall()
+    @app_commands.autocomplete(mois=period_autocomplete)
+    async def top(interaction: discord.Interaction, categorie: app_commands.Choice[str] = None, mois: str = None):
+        if mois is not None and not re.fullmatch(r"\d{4}-(0[1-9]|1[0-2])", mois.strip()):
+            await interaction.response.send_message("❌ Format du mois invalide, utilise AAAA-MM (ex : 2026-09).", ephemeral=True)
+            return
+
+        # Sans catégorie (ou avec un mois précis), on affiche le classement mensuel
+        is_monthly = mois is not None or categorie is None or categorie.value == "mois"
+        if mois is not None:
+            period = mois.strip()
+            header = f"🏆 Classement du Mois {period} : Kanaé d'Or 🏆"
+            rows = await database.get_monthly_standings(database.db_pool, period)
+        elif is_monthly:
+            header = "🏆 Classement du Mois : Kanaé d'Or 🏆"
+            rows = await database.get_monthly_standings(database.db_pool)
+        else:
+            header = "🌟 Classement à Vie : Panthéon 🌟"
+            async with database.db_pool.acquire() as conn:
+                async with conn.cursor() as cur:
+                    await cur.execute("SELECT user_id, points FROM scores ORDER BY points DESC;")
+                    rows = await cur.fetchall()
 
         filtered = []
         for uid, pts in rows:
@@ -768,8 +727,9 @@ def setup(bot: commands.Bot):
         try:
             await interaction.response.defer(ephemeral=True, thinking=True)
 
-            # Cooldown check
-            async with database.db_pool.acquire() as conn:
+            # Cooldown + tirage des 4 cartes + doublons : une seule connexion pour toutes les lectures
+            remaining = None
+            async with database.unit_of_work(database.db_pool) as conn:
                 async with conn.cursor() as cur:
                     await cur.execute("SELECT last_opened FROM booster_cooldowns WHERE user_id=%s;", (user_id,))
                     row = await cur.fetchone()
@@ -777,15 +737,18 @@ def setup(bot: commands.Bot):
                         last_time = row[0].replace(tzinfo=timezone.utc) if row[0].tzinfo is None else row[0]
                         if (now - last_time) < timedelta(hours=12):
                             remaining = timedelta(hours=12) - (now - last_time)
-                            h, m = remaining.seconds // 3600, (remaining.seconds % 3600) // 60
-                            await interaction.edit_original_response(content=f"🕒 Attends encore **{h}h {m}min** pour un nouveau booster.")
-                            return
 
-            # Tirage des 4 cartes
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute("SELECT * FROM pokeweeds ORDER BY RAND() LIMIT 4;")
-                    rewards = await cur.fetchall()
+                    if remaining is None:
+                        await cur.execute("SELECT * FROM pokeweeds ORDER BY RAND() LIMIT 4;")
+                        rewards = await cur.fetchall()
+                if remaining is None:
+                    # Vérification des doublons (1 seule requête sur le résumé du Pokédex)
+                    owned_counts = await database.get_pokeweed_counts(database.db_pool, user_id, [p[0] for p in rewards])
+
+            if remaining is not None:
+                h, m = remaining.seconds // 3600, (remaining.seconds % 3600) // 60
+                await interaction.edit_original_response(content=f"🕒 Attends encore **{h}h {m}min** pour un nouveau booster.")
+                return
 
             points_by_rarity = {"Commun": 2, "Peu Commun": 4, "Rare": 8, "Très Rare": 12, "Légendaire": 15}
             bonus_new = 5
@@ -796,56 +759,53 @@ def setup(bot: commands.Bot):
             inserts = []
             total_points = 0
 
-            # Vérification des doublons et préparation des messages
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    for pokeweed in rewards:
-                        pid, name, hp, cap_pts, power, rarity = pokeweed[:6]
-                        await cur.execute("SELECT COUNT(*) FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s;", (user_id, pid))
-                        owned = (await cur.fetchone())[0]
-
-                        # Points bonus
-                        pts = points_by_rarity.get(rarity, 0)
-                        if owned == 0:
-                            pts += bonus_new
-                        total_points += pts
-
-                        # Préparation de l'Embed et de l'image
-                        rarity_folder = rarity.lower().replace(" ", "").replace("é", "e")
-                        filename = sanitize_filename(name) + ".png"
-                        image_path = f"./assets/pokeweed/saison-1/{rarity_folder}/{filename}"
-                        embed = discord.Embed(
-                            title=f"{name} 🌿",
-                            description=f"💥 Attaque : {power}\n❤️ Vie : {hp}\n✨ Rareté : {rarity}\n📦 {'🆕 Nouvelle carte !' if owned == 0 else f'x{owned + 1}'}",
-                            color=discord.Color.green()
-                        )
+            # Préparation des messages
+            for pokeweed in rewards:
+                pid, name, hp, cap_pts, power, rarity = pokeweed[:6]
+                owned = owned_counts.get(pid, 0)
 
-                        try:
-                            file = discord.File(image_path, filename=filename)
-                            embed.set_image(url=f"attachment://{filename}")
-                            files.append(file)
-                        except Exception:
-                            embed.description += "\n⚠️ Image non trouvée."
-                            files.append(None) # On garde l'index aligné pour la suite
-
-                        embeds.append(embed)
-                        inserts.append((user_id, pid))
-                        
-                        # ✅ Création du bouton Vendre pour CHAQUE carte tirée
-                        total_owned = owned + 1 # Car il vient de l'obtenir
-                        view = ClaimPokeweedView(user_id, pid, name, cap_pts, total_owned)
-                        views.append(view)
+                # Points bonus
+                pts = points_by_rarity.get(rarity, 0)
+                if owned == 0:
+                    pts += bonus_new
+                total_points += pts
+
+                # Préparation de l'Embed et de l'image
+                rarity_folder = rarity.lower().replace(" ", "").replace("é", "e")
+                filename = sanitize_filename(name) + ".png"
+                image_path = f"./assets/pokeweed/saison-1/{rarity_folder}/{filename}"
+                embed = discord.Embed(
+                    title=f"{name} 🌿",
+                    description=f"💥 Attaque : {power}\n❤️ Vie : {hp}\n✨ Rareté : {rarity}\n📦 {'🆕 Nouvelle carte !' if owned == 0 else f'x{owned + 1}'}",
+                    color=discord.Color.green()
+                )
+
+                try:
+                    file = discord.File(image_path, filename=filename)
+                    embed.set_image(url=f"attachment://{filename}")
+                    files.append(file)
+                except Exception:
+                    embed.description += "\n⚠️ Image non trouvée."
+                    files.append(None) # On garde l'index aligné pour la suite
+
+                embeds.append(embed)
+                inserts.append((user_id, pid))
+                
+                # ✅ Création du bouton Vendre pour CHAQUE carte tirée
+                total_owned = owned + 1 # Car il vient de l'obtenir
+                view = ClaimPokeweedView(user_id, pid, name, cap_pts, total_owned)
+                views.append(view)
 
             # ✅ MAJ DB en PREMIER : On sauvegarde les cartes et on reset le cooldown
             # (Obligatoire pour que le bouton Vendre fonctionne instantanément)
-            async with database.db_pool.acquire() as conn:
+            # Cartes + points + cooldown dans une seule transaction, sur une seule connexion
+            async with database.unit_of_work(database.db_pool, transaction=True) as conn:
+                await database.add_pokeweeds(database.db_pool, user_id, [pid for _, pid in inserts])
+                await database.add_points(database.db_pool, user_id, total_points)
+                final_pts = await database.get_user_points(database.db_pool, user_id)
                 async with conn.cursor() as cur:
-                    for uid, pid in inserts:
-                        await cur.execute("INSERT INTO user_pokeweeds (user_id, pokeweed_id, capture_date) VALUES (%s, %s, NOW());", (uid, pid))
-                    await database.add_points(database.db_pool, user_id, total_points)
-                    final_pts = await database.get_user_points(database.db_pool, user_id)
-                    await helpers.update_member_prestige_role(interaction.user, final_pts)
                     await cur.execute("INSERT INTO booster_cooldowns (user_id, last_opened) VALUES (%s, %s) ON DUPLICATE KEY UPDATE last_opened = %s;", (user_id, now, now))
+            await helpers.update_member_prestige_role(interaction.user, final_pts)
 
             # ✅ Envoi de l'annonce Publique
             pokeweed_channel = interaction.client.get_channel(config.CHANNEL_POKEWEED_ID)
@@ -905,30 +865,31 @@ def setup(bot: commands.Bot):
 
         pokeweed = state.current_spawn
         user_id = interaction.user.id
+        # On verrouille la capture pour les autres joueurs AVANT le premier await (check-then-act atomique)
+        state.capture_winner = user_id
         
         pid = pokeweed[0]
         name = pokeweed[1]
         cap_pts = pokeweed[3]
 
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
+        try:
+            # Une seule connexion et une seule transaction pour toute la capture
+            async with database.unit_of_work(database.db_pool, transaction=True):
                 # 1. On vérifie s'il possède déjà la carte AVANT de lui donner
-                await cur.execute("SELECT COUNT(*) FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s;", (user_id, pid))
-                owned_before = (await cur.fetchone())[0]
+                owned_before = await database.get_specific_pokeweed_count(database.db_pool, user_id, pid)
+
+                # 2. On insère la nouvelle capture (copie + résumé du Pokédex)
+                await database.add_pokeweeds(database.db_pool, user_id, [pid])
 
-                # 2. On insère la nouvelle capture
-                await cur.execute(
-                    "INSERT INTO user_pokeweeds (user_id, pokeweed_id, capture_date) VALUES (%s, %s, NOW());",
-                    (user_id, pid)
-                )
-                
                 # 3. Ajout des points
                 await database.add_points(database.db_pool, user_id, cap_pts)
                 new_total = await database.get_user_points(database.db_pool, user_id)
-                await helpers.update_member_prestige_role(interaction.user, new_total)
-
-        # On verrouille la capture pour les autres joueurs
-        state.capture_winner = user_id
+        except Exception:
+            # Transaction annulée : le Pokéweed redevient capturable (s'il est toujours là)
+            if state.capture_winner == user_id and state.current_spawn is pokeweed:
+                state.capture_winner = None
+            raise
+        await helpers.update_member_prestige_role(interaction.user, new_total)
         
         # Message public dans le salon
         channel = interaction.channel
@@ -1037,18 +998,10 @@ def setup(bot: commands.Bot):
     async def pokedex(interaction: discord.Interaction, membre: discord.Member = None):
         target = membre if membre else interaction.user
 
+        rows = await database.get_user_pokedex(database.db_pool, target.id)
+
         async with database.db_pool.acquire() as conn:
             async with conn.cursor() as cur:
-                await cur.execute("""
-                    SELECT p.id, p.name, p.hp, p.capture_points, p.power, p.rarity,
-                        COUNT(*) as total, MAX(up.capture_date) as last_capture
-                    FROM user_pokeweeds up
-                    JOIN pokeweeds p ON up.pokeweed_id = p.id
-                    WHERE up.user_id=%s
-                    GROUP BY p.id;
-                """, (target.id,))
-                rows = await cur.fetchall()
-
                 await cur.execute("SELECT COUNT(*) FROM pokeweeds;")
                 total_available = (await cur.fetchone())[0]
 
@@ -1079,6 +1032,50 @@ def setup(bot: commands.Bot):
             ephemeral=True
         )
 
+    # ---------------------------------------
+    # /vendre-doublons
+    # ---------------------------------------
+    @bot.tree.command(name="vendre-doublons", description="Vend tous tes doublons Pokéweed (tu gardes 1 exemplaire de chaque)")
+    async def vendre_doublons(interaction: discord.Interaction):
+        user_id = interaction.user.id
+        if user_id in _inflight_claims:
+            await interaction.response.send_message("⏳ Transaction déjà en cours, doucement...", ephemeral=True)
+            return
+
+        _inflight_claims.add(user_id)
+        try:
+            await interaction.response.defer(ephemeral=True)
+
+            rows = await database.get_user_pokedex(database.db_pool, user_id)
+            # Les doublons les plus chers d'abord (le quota peut couper la fin de la liste)
+            doubles = sorted((r for r in rows if r[6] > 1), key=lambda r: r[3], reverse=True)
+            if not doubles:
+                await interaction.followup.send("📭 Tu n'as aucun doublon à vendre frérot.", ephemeral=True)
+                return
+
+            status, sold, earned, new_total, remaining = await database.sell_cards(
+                database.db_pool, user_id, [(r[0], r[6] - 1) for r in doubles]
+            )
+
+            if status == "quota":
+                await interaction.followup.send(f"❌ Tu as atteint la limite de **{database.SALES_QUOTA} ventes par {database.SALES_QUOTA_HOURS} heures**. Reviens plus tard frérot !", ephemeral=True)
+                return
+            if status != "ok":
+                await interaction.followup.send("❌ Impossible de vendre tes doublons. (As-tu déjà tout vendu ?)", ephemeral=True)
+                return
+
+            await helpers.update_member_prestige_role(interaction.user, new_total)
+            await interaction.followup.send(
+                f"✅ **{sold}** doublon(s) vendu(s) pour **+{earned} pts** ! "
+                f"({remaining}/{database.SALES_QUOTA} ventes restantes)",
+                ephemeral=True
+            )
+        except Exception as e:
+            logger.exception(f"Erreur /vendre-doublons pour {user_id} : {e}")
+            await interaction.followup.send("❌ Une erreur est survenue lors de la transaction.", ephemeral=True)
+        finally:
+            _inflight_claims.discard(user_id)
+
 
     # ---------------------------------------
     # /init-pokeweeds (admin)
@@ -1171,7 +1168,7 @@ def setup(bot: commands.Bot):
             return
         
         # --- Vérifie que le compte existe ---
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
             async with session.get(
                 "https://api.twitch.tv/helix/users",
                 headers=headers,
@@ -1204,7 +1201,7 @@ def setup(bot: commands.Bot):
             return
 
         # --- Vérif follow immédiate ---
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
             async with session.get(
                 "https://api.twitch.tv/helix/channels/followers",
                 headers=headers,
@@ -1285,7 +1282,7 @@ def setup(bot: commands.Bot):
             return
 
         # --- Récupère user_id Twitch ---
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
             async with session.get(
                 "https://api.twitch.tv/helix/users",
                 headers=headers,
@@ -1302,7 +1299,7 @@ def setup(bot: commands.Bot):
         total_gained = 0
         report = ["🔎 Vérification Twitch", ""]
 
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
 
             # ---------- FOLLOW ----------
             async with session.get(
@@ -1497,14 +1494,10 @@ def setup(bot: commands.Bot):
             await interaction.response.send_message("❌ Doucement le fou ! La mise maximale au casino est de **2000 points** par partie.", ephemeral=True)
             return
 
-        # 2. Sécurité : Vérifier si l'utilisateur a assez de points (mois + vie)
-        current_points = await database.get_user_points(database.db_pool, user_id)
-        monthly_points = await database.get_user_monthly_points(database.db_pool, user_id)
-        
-        # Le solde jouable est le minimum entre sa richesse à vie et sa richesse du mois
-        solde_jouable = min(current_points, monthly_points)
+        # 2. Sécurité : Débit de la mise seulement si le solde jouable (min mois / vie) suffit
+        ok, solde_jouable, new_total, _ = await database.debit_stake(database.db_pool, user_id, mise)
 
-        if solde_jouable < mise:
+        if not ok:
             await interaction.response.send_message(
                 f"❌ T'es à sec ! Ton solde jouable actuel est de **{solde_jouable} points**.", 
                 ephemeral=True
@@ -1518,17 +1511,21 @@ def setup(bot: commands.Bot):
         )
 
         # 3. Le fameux tirage au sort (1 à 100)
-        roll = random.randint(1, 100)
+        gen = rng.get("bet")
+        roll = gen.randint(1, 100)
+        gen.record(roll)
 
         # --- NOUVEAUTÉ : On récupère ton salon casino ---
         casino_channel = interaction.client.get_channel(1477651520878280914)
         if not casino_channel:
             logger.error("❌ Salon Casino introuvable !")
+            # La mise a déjà été débitée : on la rend
+            await database.add_points(database.db_pool, user_id, mise)
             return
 
-        if roll <= 46:
-            # 🎉 GAGNÉ (48% de chance : 1 à 48)
-            new_total = await database.add_points(database.db_pool, user_id, mise)
+        if roll <= rng.BET_WIN_THRESHOLD:
+            # 🎉 GAGNÉ (46% de chance : 1 à 46) : on rend la mise + le gain
+            new_total = await database.add_points(database.db_pool, user_id, mise * 2)
             await helpers.update_member_prestige_role(interaction.user, new_total)
             
             embed = discord.Embed(
@@ -1541,8 +1538,7 @@ def setup(bot: commands.Bot):
             # On envoie l'embed DANS LE SALON CASINO (avec un ping pour qu'il le voie bien)
             await casino_channel.send(content=interaction.user.mention, embed=embed)
         else:
-            # 💸 PERDU (52% de chance : 49 à 100)
-            new_total = await database.add_points(database.db_pool, user_id, -mise)
+            # 💸 PERDU (54% de chance : 47 à 100) : la mise est déjà débitée
             await helpers.update_member_prestige_role(interaction.user, new_total)
             
             embed = discord.Embed(
@@ -1605,94 +1601,34 @@ def setup(bot: commands.Bot):
             await interaction.response.send_message("❌ Minimum syndical : 10 points la partie.", ephemeral=True)
             return
             
-        user_id = str(interaction.user.id)
-        
-        # Vérification des points (Mois + À Vie) pour le créateur
-        current_points = await database.get_user_points(database.db_pool, user_id)
-        monthly_points = await database.get_user_monthly_points(database.db_pool, user_id)
-        solde_jouable = min(current_points, monthly_points)
+        # Ouverture de la manche + débit de la mise du créateur (Mois + À Vie) dans la même transaction
+        opened = await database.open_casino_round(
+            database.db_pool, "douille", interaction.channel_id, interaction.user.id, mise, casino.DOUILLE_DURATION
+        )
 
-        if solde_jouable < mise:
+        if opened == "funds":
+            solde_jouable, _, _ = await database.get_playable_balance(database.db_pool, interaction.user.id)
             await interaction.response.send_message(
-                f"❌ T'es à sec frérot ! Ton solde jouable maximum est de **{solde_jouable} points**.", 
+                f"❌ T'es à sec frérot ! Ton solde jouable maximum est de **{solde_jouable} points**.",
                 ephemeral=True
             )
             return
-            
-        end_time = int(datetime.now(timezone.utc).timestamp() + 60)
-        
-        view = DouilleView(interaction.user.id, mise, end_time) 
-        
+
+        round_id, ends_at = opened
+        view = casino.DouilleView(round_id, interaction.user.id, mise, casino.to_timestamp(ends_at))
+
         embed = discord.Embed(
             title="🔫 LA DOUILLE (Roulette Russe)",
-            description=f"**Mise :** {mise} points\n**Joueurs (1/6) :**\n{interaction.user.mention}\n\n*Cliquez sur le bouton pour rejoindre ! Le coup part <t:{end_time}:R>.*",
+            description=view.describe(),
             color=discord.Color.dark_theme()
         )
         await interaction.response.send_message(embed=embed, view=view)
-        
-        # 1. On récupère le message TOUT DE SUITE (avant que ça plante)
+
+        # La manche est persistée : le scheduler fera le tirage au bout de 60s (ou dès qu'on est 6)
         original_msg = await interaction.original_response()
-        
-        # 2. On attend 60 secondes OU que 6 joueurs soient là
-        await view.wait()
-        
-        # 3. On désactive le bouton une fois la partie lancée
-        for child in view.children:
-            child.disabled = True
-            
-        # 4. ON ENLÈVE LE CHRONO ET ON ANNONCE LE TIRAGE
-        embed_final = original_msg.embeds[0]
-        mentions = " ".join([f"<@{pid}>" for pid in view.players])
-        embed_final.description = f"**Mise :** {mise} points\n**Joueurs ({len(view.players)}/6) :**\n{mentions}\n\n*Le temps est écoulé... Le barillet tourne ! 💥*"
-            
-        # 5. On essaie de modifier le message avec une sécurité
-        try:
-            await original_msg.edit(embed=embed_final, view=view)
-        except discord.NotFound:
-            pass
+        await database.set_casino_round_message(database.db_pool, round_id, original_msg.id)
+        casino.register_view(view)
 
-        if len(view.players) < 2:
-            await interaction.followup.send("❌ Pas assez de couilles sur le serveur... La partie est annulée (il faut au moins 2 joueurs) !", ephemeral=False)
-            return
-            
-        # Sécurité ultime : on revérifie les points juste avant le tirage au cas où un mec a dépensé ses points entre-temps
-        final_players = []
-        for pid in view.players:
-            p_current = await database.get_user_points(database.db_pool, str(pid))
-            p_monthly = await database.get_user_monthly_points(database.db_pool, str(pid))
-            if min(p_current, p_monthly) >= mise:
-                final_players.append(pid)
-                
-        if len(final_players) < 2:
-            await interaction.followup.send("❌ Partie annulée : Certains petits malins ont dépensé leurs points avant le tirage.", ephemeral=False)
-            return
-            
-        # 💥 LE TIRAGE FATAL
-        loser_id = random.choice(final_players)
-        winners = [pid for pid in final_players if pid != loser_id]
-        
-        # Le perdant perd toute sa mise, les gagnants se partagent sa mise
-        gain_per_winner = mise // len(winners)
-        
-        # On retire les points du perdant
-        await database.add_points(database.db_pool, str(loser_id), -mise)
-        
-        # On donne les points aux gagnants
-        for wid in winners:
-            await database.add_points(database.db_pool, str(wid), gain_per_winner)
-            
-        # Création du message de résultat
-        loser_mention = f"<@{loser_id}>"
-        winners_mentions = "\n".join([f"✅ <@{w}> (+{gain_per_winner} pts)" for w in winners])
-        
-        res_embed = discord.Embed(
-            title="💥 PAN ! LE COUP EST PARTI !",
-            description=f"Le barillet a tourné... Et c'est {loser_mention} qui se prend la douille dans la tête ! 💀\n\n"
-                        f"💸 **Il perd sa mise de {mise} points.**\n\n"
-                        f"🏆 **Les survivants se partagent le butin :**\n{winners_mentions}",
-            color=discord.Color.red()
-        )
-        await interaction.followup.send(embed=res_embed)
     # ---------------------------------------
     # /spawn (admin)
     # ---------------------------------------
@@ -1826,16 +1762,13 @@ def setup(bot: commands.Bot):
 
     # Fonctions d'autocomplétion pour la commande /echange
     async def poke_autocomplete_self(interaction: discord.Interaction, current: str):
-        pokes = await database.get_user_pokeweeds_unique(database.db_pool, interaction.user.id)
-        choices = []
-        # On unpack 4 variables maintenant (pid, name, rarity, count)
-        for pid, name, rarity, count in pokes:
-            # On permet de chercher par nom OU par rareté !
-            if current.lower() in name.lower() or current.lower() in rarity.lower():
-                # Affichage stylé : "Gelachu ✨ Rare (x2)"
-                display_name = f"{name} ✨ {rarity} (x{count})"
-                choices.append(app_commands.Choice(name=display_name, value=str(pid)))
-        return choices[:25]
+        # Collection en cache + filtrage en mémoire (Discord ne laisse que 3s à l'autocomplétion)
+        keys, entries = await helpers.get_cached_collection(interaction.user.id)
+        # On permet de chercher par nom OU par rareté ! Affichage stylé : "Gelachu ✨ Rare (x2)"
+        return [
+            app_commands.Choice(name=display_name, value=str(pid))
+            for pid, display_name in helpers.filter_collection(keys, entries, current)
+        ]
 
     async def poke_autocomplete_other(interaction: discord.Interaction, current: str):
         target = interaction.namespace.membre
@@ -1848,22 +1781,20 @@ def setup(bot: commands.Bot):
             if target_id is None:
                 target_id = int(target)
                 
-            pokes = await database.get_user_pokeweeds_unique(database.db_pool, target_id)
+            keys, entries = await helpers.get_cached_collection(target_id)
             
-            if not pokes:
+            if not entries:
                 return [app_commands.Choice(name="❌ Ce joueur n'a aucun Pokéweed...", value="error")]
                 
-            choices = []
-            for pid, name, rarity, count in pokes:
-                # Pareil ici, on ajoute la rareté
-                if current.lower() in name.lower() or current.lower() in rarity.lower():
-                    display_name = f"{name} ✨ {rarity} (x{count})"
-                    choices.append(app_commands.Choice(name=display_name, value=str(pid)))
+            choices = [
+                app_commands.Choice(name=display_name, value=str(pid))
+                for pid, display_name in helpers.filter_collection(keys, entries, current)
+            ]
             
             if not choices:
                 return [app_commands.Choice(name="❌ Il n'a pas cette carte...", value="error")]
                 
-            return choices[:25]
+            return choices
             
         except Exception as e:
             logger.error(f"Erreur Autocomplete Echange : {e}")
@@ -1875,10 +1806,19 @@ def setup(bot: commands.Bot):
     @app_commands.describe(
         membre="Avec qui veux-tu échanger ?",
         mon_pokeweed="La carte que TU donnes",
-        son_pokeweed="La carte que TU veux"
+        son_pokeweed="La carte que TU veux",
+        ma_quantite="Combien d'exemplaires tu donnes (1 par défaut)",
+        sa_quantite="Combien d'exemplaires tu veux (1 par défaut)"
     )
     @app_commands.autocomplete(mon_pokeweed=poke_autocomplete_self, son_pokeweed=poke_autocomplete_other)
-    async def echange(interaction: discord.Interaction, membre: discord.Member, mon_pokeweed: str, son_pokeweed: str):
+    async def echange(
+        interaction: discord.Interaction,
+        membre: discord.Member,
+        mon_pokeweed: str,
+        son_pokeweed: str,
+        ma_quantite: app_commands.Range[int, 1, 10] = 1,
+        sa_quantite: app_commands.Range[int, 1, 10] = 1,
+    ):
         if membre.id == interaction.user.id or membre.bot:
             await interaction.response.send_message("❌ Tu ne peux pas échanger avec toi-même ou avec un bot frérot.", ephemeral=True)
             return
@@ -1894,11 +1834,11 @@ def setup(bot: commands.Bot):
         c1 = await database.get_specific_pokeweed_count(database.db_pool, interaction.user.id, p1_id)
         c2 = await database.get_specific_pokeweed_count(database.db_pool, membre.id, p2_id)
 
-        if c1 == 0:
-            await interaction.response.send_message("❌ Tu ne possèdes plus cette carte !", ephemeral=True)
+        if c1 < ma_quantite:
+            await interaction.response.send_message(f"❌ Tu n'as pas assez d'exemplaires de cette carte ({c1}) !", ephemeral=True)
             return
-        if c2 == 0:
-            await interaction.response.send_message(f"❌ {membre.display_name} ne possède plus cette carte !", ephemeral=True)
+        if c2 < sa_quantite:
+            await interaction.response.send_message(f"❌ {membre.display_name} n'a pas assez d'exemplaires de cette carte ({c2}) !", ephemeral=True)
             return
 
         # Récupération des noms pour l'affichage (via la base de données)
@@ -1915,20 +1855,20 @@ def setup(bot: commands.Bot):
             description="Vérifie bien les détails avant d'envoyer ta proposition sur le salon.",
             color=discord.Color.blue()
         )
-        embed.add_field(name="Tu donnes :", value=f"🌿 **{p1_name}**\n*(Il t'en restera {c1 - 1})*", inline=False)
-        embed.add_field(name="Tu reçois :", value=f"🌿 **{p2_name}**\n*(Lui en restera {c2 - 1})*", inline=False)
+        embed.add_field(name="Tu donnes :", value=f"🌿 **{_trade_label(p1_name, ma_quantite)}**\n*(Il t'en restera {c1 - ma_quantite})*", inline=False)
+        embed.add_field(name="Tu reçois :", value=f"🌿 **{_trade_label(p2_name, sa_quantite)}**\n*(Lui en restera {c2 - sa_quantite})*", inline=False)
         
-        view = TradePreviewView(interaction.client, interaction.user, membre, p1_id, p2_id, p1_name, p2_name)
+        view = TradePreviewView(interaction.client, interaction.user, membre, p1_id, p2_id, p1_name, p2_name, ma_quantite, sa_quantite)
         await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
     # --- AUTOCOMPLÉTIONS POUR LE PLANNING ---
     async def slot_free_autocomplete(interaction: discord.Interaction, current: str):
-        slots = await database.get_available_pro_slots(database.db_pool)
+        slots = await database.PlanningRepository(database.db_pool).available()
         choices = []
-        for slot_id, d, heure in slots:
-            label = f"{d.strftime('%d/%m/%Y')} à {heure}"
+        for slot in slots:
+            label = f"{slot.starts_at.strftime('%d/%m/%Y')} à {slot.heure}"
             if current.lower() in label.lower():
-                choices.append(app_commands.Choice(name=label, value=str(slot_id)))
+                choices.append(app_commands.Choice(name=label, value=str(slot.id)))
         return choices[:25]
 
     async def slot_cancel_autocomplete(interaction: discord.Interaction, current: str):
@@ -1936,12 +1876,12 @@ def setup(bot: commands.Bot):
         is_admin = interaction.user.guild_permissions.administrator
         anim_id = None if is_admin else interaction.user.id
         
-        slots = await database.get_reserved_pro_slots(database.db_pool, animateur_id=anim_id)
+        slots = await database.PlanningRepository(database.db_pool).reserved(animateur_id=anim_id)
         choices = []
-        for slot_id, d, heure, titre in slots:
-            label = f"{d.strftime('%d/%m')} - {titre[:20]}"
+        for slot in slots:
+            label = f"{slot.starts_at.strftime('%d/%m')} - {slot.titre[:20]}"
             if current.lower() in label.lower():
-                choices.append(app_commands.Choice(name=label, value=str(slot_id)))
+                choices.append(app_commands.Choice(name=label, value=str(slot.id)))
         return choices[:25]
 
     # ---------------------------------------
@@ -1958,8 +1898,11 @@ def setup(bot: commands.Bot):
         except ValueError:
             await interaction.response.send_message("❌ Format de date invalide ! Utilise le format JJ/MM/AAAA (ex: 24/04/2026).", ephemeral=True)
             return
+        if database.parse_slot_time(heure) is None:
+            await interaction.response.send_message("❌ Heure invalide ! Utilise par exemple 21h00, 21:30 ou 21h.", ephemeral=True)
+            return
 
-        await database.add_pro_slot(database.db_pool, date_obj, heure)
+        await database.PlanningRepository(database.db_pool).add(date_obj, heure)
         await interaction.response.send_message(f"✅ Créneau ouvert le **{date_obj.strftime('%d/%m/%Y')} à {heure}** ! Il est dispo pour les animateurs.", ephemeral=True)
 
     # ---------------------------------------
@@ -1975,40 +1918,25 @@ def setup(bot: commands.Bot):
             return
         try:
             slot_id = int(creneau)
-            slot_info = await database.get_pro_slot_by_id(database.db_pool, slot_id)
+            repo = database.PlanningRepository(database.db_pool)
+            slot = await repo.get(slot_id)
+            if not slot:
+                await interaction.followup.send("❌ Ce créneau n'existe pas.", ephemeral=True)
+                return
             
             event_id = None
-            d, heure_str, _, _ = slot_info 
+            d, heure_str = slot.starts_at, slot.heure
             
             # 🌟 MAGIE DISCORD : On crée l'événement officiel
             try:
-                import re
-                from datetime import datetime, timedelta, timezone
-                import zoneinfo
-                
-                # 1. Extraction plus souple de l'heure (Accepte "21h30", "21:30" et même "21h")
-                h, m = 0, 0
-                match = re.search(r"(\d{1,2})(?:[hH:](\d{2}))?", heure_str)
-                if match:
-                    h = int(match.group(1))
-                    m = int(match.group(2)) if match.group(2) else 0
-                    
-                naive_dt = datetime.combine(d, datetime.min.time()).replace(hour=h, minute=m)
+                # 1. Le créneau est stocké avec sa vraie date/heure (heure de Paris)
+                start_dt = d.replace(tzinfo=database.PLANNING_TZ)
                 
-                # 2. Gestion sécurisée du fuseau horaire (si tzdata manque sur ton Docker)
-                try:
-                    tz = zoneinfo.ZoneInfo("Europe/Paris")
-                except Exception:
-                    # Plan B si le serveur hébergeur ne connaît pas l'heure de Paris
-                    tz = timezone(timedelta(hours=1)) 
-                    
-                start_dt = naive_dt.replace(tzinfo=tz)
-                
-                # 3. Sécurité : Si l'heure est passée, on force à +5 mins pour éviter le crash Discord
+                # 2. Sécurité : Si l'heure est passée, on force à +5 mins pour éviter le crash Discord
                 if start_dt < discord.utils.utcnow():
                     start_dt = discord.utils.utcnow() + timedelta(minutes=5)
                     
-                # 4. Création de l'événement natif
+                # 3. Création de l'événement natif
                 event = await interaction.guild.create_scheduled_event(
                     name=titre[:100], # Sécurité Discord : max 100 caractères
                     description=f"{description[:800]}\n\n🎤 Animé par {interaction.user.display_name}",
@@ -2027,7 +1955,7 @@ def setup(bot: commands.Bot):
                 return 
 
             # On réserve en base de données avec l'event_id UNIQUEMENT si ça a marché au-dessus
-            await database.reserve_pro_slot(database.db_pool, slot_id, interaction.user.id, titre, description, event_id)
+            await repo.reserve(slot_id, interaction.user.id, titre, description, event_id)
             
             await interaction.followup.send(f"✅ Créneau réservé pour ton event : **{titre}** ! L'événement officiel a bien été créé en haut du serveur.", ephemeral=True)
             
@@ -2055,10 +1983,11 @@ def setup(bot: commands.Bot):
             return
         try:
             slot_id = int(creneau)
-            slot_info = await database.get_pro_slot_by_id(database.db_pool, slot_id)
+            repo = database.PlanningRepository(database.db_pool)
+            slot = await repo.get(slot_id)
             
-            if slot_info:
-                d, heure, titre_annule, event_id = slot_info
+            if slot:
+                d, heure, titre_annule, event_id = slot.starts_at, slot.heure, slot.titre, slot.event_id
                 
                 # 🗑️ Suppression de l'event natif Discord
                 if event_id:
@@ -2078,7 +2007,7 @@ def setup(bot: commands.Bot):
                     msg = f"🔴 **Créneau Libéré !** {interaction.user.mention} vient d'annuler son animation *{titre_annule}* prévue le **{d.strftime('%d/%m')} à {heure}**.\n👉 Le créneau est de nouveau dispo, à vos commandes !"
                     await staff_channel.send(msg)
 
-            await database.cancel_pro_slot(database.db_pool, slot_id)
+            await repo.cancel(slot_id)
             await interaction.followup.send("🗑️ Réservation et événement Discord annulés. Le créneau redevient **Libre** !", ephemeral=True)
             await helpers.refresh_event_message(interaction.client)
 
@@ -2089,16 +2018,16 @@ def setup(bot: commands.Bot):
     # /del_creneau (BO)
     # ---------------------------------------
     async def slot_all_autocomplete(interaction: discord.Interaction, current: str):
-        slots = await database.get_all_future_pro_slots(database.db_pool)
+        slots = await database.PlanningRepository(database.db_pool).upcoming()
         choices = []
-        for slot_id, d, heure, est_reserve, titre in slots:
-            status = "🔴 Réservé" if est_reserve else "🟢 Libre"
-            label = f"{d.strftime('%d/%m')} à {heure} - {status}"
-            if titre:
-                label += f" ({titre[:15]})"
+        for slot in slots:
+            status = "🔴 Réservé" if slot.est_reserve else "🟢 Libre"
+            label = f"{slot.starts_at.strftime('%d/%m')} à {slot.heure} - {status}"
+            if slot.titre:
+                label += f" ({slot.titre[:15]})"
             
             if current.lower() in label.lower():
-                choices.append(app_commands.Choice(name=label, value=str(slot_id)))
+                choices.append(app_commands.Choice(name=label, value=str(slot.id)))
         return choices[:25]
 
     @bot.tree.command(name="del_creneau", description="(Admin/Lead) Supprime définitivement un créneau du planning")
@@ -2111,13 +2040,14 @@ def setup(bot: commands.Bot):
             return
         try:
             slot_id = int(creneau)
-            slot_info = await database.get_pro_slot_by_id(database.db_pool, slot_id)
+            repo = database.PlanningRepository(database.db_pool)
+            slot = await repo.get(slot_id)
             
-            if not slot_info:
+            if not slot:
                 await interaction.followup.send("❌ Ce créneau n'existe pas.", ephemeral=True)
                 return
 
-            d, heure, _, event_id = slot_info
+            d, heure, event_id = slot.starts_at, slot.heure, slot.event_id
             
             # 🗑️ Suppression de l'event Discord s'il était réservé
             if event_id:
@@ -2130,7 +2060,7 @@ def setup(bot: commands.Bot):
                 except Exception:
                     pass
 
-            await database.delete_pro_slot(database.db_pool, slot_id)
+            await repo.delete(slot_id)
             await interaction.followup.send(f"🗑️ C'est fait ! Le créneau du **{d.strftime('%d/%m/%Y')} à {heure}** a été définitivement effacé.", ephemeral=True)
             await helpers.refresh_event_message(interaction.client)
             
@@ -2143,7 +2073,7 @@ def setup(bot: commands.Bot):
     @bot.tree.command(name="planning", description="(Staff) Affiche le planning à partir d'aujourd'hui")
     @app_commands.default_permissions(manage_messages=True)
     async def planning(interaction: discord.Interaction):
-        slots = await database.get_rolling_planning(database.db_pool)
+        slots = await database.PlanningRepository(database.db_pool).upcoming()
         
         if not slots:
             await interaction.response.send_message("📭 Aucun créneau n'est prévu à partir d'aujourd'hui. Demandez aux admins de faire `/add_creneau` !", ephemeral=True)
@@ -2160,7 +2090,8 @@ def setup(bot: commands.Bot):
         # Les jours de la semaine en Français pour que ça soit propre
         jours_fr = ["Lundi", "Mardi", "Mercredi", "Jeudi", "Vendredi", "Samedi", "Dimanche"]
 
-        for slot_id, d, heure, est_reserve, anim_id, titre, desc in slots:
+        for slot in slots:
+            d, heure, anim_id, titre, desc = slot.starts_at, slot.heure, slot.animateur_id, slot.titre, slot.description
             # Nom du jour + Date (ex: "Mercredi 15/04")
             jour_str = f"{jours_fr[d.weekday()]} {d.strftime('%d/%m')}"
 
@@ -2170,7 +2101,7 @@ def setup(bot: commands.Bot):
                 current_day = jour_str
                 day_content = ""
 
-            if est_reserve:
+            if slot.est_reserve:
                 day_content += f"🔴 **{heure}** : {titre} (par <@{anim_id}>)\n*↳ {desc}*\n\n"
             else:
                 day_content += f"🟢 **{heure}** : *Créneau Libre*\n\n"
@@ -2229,112 +2160,56 @@ def setup(bot: commands.Bot):
             await interaction.followup.send("❌ Tu dois miser au moins 1 point.", ephemeral=True)
             return
             
-        if interaction.user.id in active_slots_players:
+        if interaction.user.id in state.active_slot_spins:
             await interaction.followup.send("❌ Ta machine tourne déjà ! Attends la fin de l'animation.", ephemeral=True)
             return
 
-        # 2. Vérification du solde jouable (Mois + Vie)
-        current_points = await database.get_user_points(database.db_pool, str(interaction.user.id))
-        monthly_points = await database.get_user_monthly_points(database.db_pool, str(interaction.user.id))
-        solde_jouable = min(current_points, monthly_points)
+        # 2. Le tirage est fait AVANT l'animation (résultat + frames précalculés)
+        reels, multiplicateur, gain_total, message_fin, couleur, frames, ticket = casino.spin_slots(mise)
 
-        if solde_jouable < mise:
+        # 3. Vérification du solde jouable (Mois + Vie), DÉBIT de la mise et CRÉDIT du gain en une transaction
+        # (La sécurité absolue 🏦 : un plantage pendant l'animation ne peut plus faire perdre un gain)
+        state.active_slot_spins.add(interaction.user.id)
+        ok = False
+        try:
+            ok, solde_jouable, _, _ = await database.debit_stake(database.db_pool, interaction.user.id, mise, payout=gain_total)
+        finally:
+            # Journalisé une fois le débit connu : un coup refusé n'apparaît pas comme joué, sans trou dans la séquence
+            casino.record_spin(reels, ticket, played=ok)
+            # Refus OU erreur base de données : on libère la machine (sinon seule l'animation le fera)
+            if not ok:
+                state.active_slot_spins.discard(interaction.user.id)
+        if not ok:
             await interaction.followup.send(f"❌ Fonds insuffisants ! Ton solde jouable est de **{solde_jouable} points**.", ephemeral=True)
             return
-        
-        # 3. DÉDUCTION IMMÉDIATE (La sécurité absolue 🏦)
-        await database.add_points(database.db_pool, interaction.user.id, -mise)
-        active_slots_players.add(interaction.user.id)
-
-        # 4. Configuration de la machine
-        emojis = ["🍒", "🍋", "🍇", "💨", "🍁"]
-        weights = [65, 20, 10, 4, 1]
-
-        # On envoie le message de départ dans le casino
-        embed = discord.Embed(
-            title="🎰 MACHINE À SOUS KANAÉ...",
-            description=f"💸 **Mise :** `{mise}` points\n\n> ⬛ | ⬛ | ⬛ <\n\n*Les rouleaux se lancent...*",
-            color=discord.Color.dark_grey()
-        )
-        await interaction.followup.send("🎰 Ta machine tourne ! Va voir le résultat dans le salon Casino 🎰", ephemeral=True)
-        msg = await casino_channel.send(embed=embed)
 
-        # 5. L'Animation (Édition du message pour simuler la rotation)
-        for i in range(3):
-            await asyncio.sleep(1.0)
-            
-            t1 = random.choices(emojis, weights=weights)[0]
-            t2 = random.choices(emojis, weights=weights)[0]
-            
-            if i == 0:
-                desc = f"💸 **Mise :** `{mise}` points\n\n> {t1} | 🌀 | 🌀 <\n\n*Le premier rouleau ralentit...*"
-            elif i == 1:
-                desc = f"💸 **Mise :** `{mise}` points\n\n> {t1} | {t2} | 🌀 <\n\n*Plus qu'un...*"
-            else:
-                r1 = random.choices(emojis, weights=weights)[0]
-                r2 = random.choices(emojis, weights=weights)[0]
-                r3 = random.choices(emojis, weights=weights)[0]
-                desc = f"💸 **Mise :** `{mise}` points\n\n> **{r1} | {r2} | {r3}** <"
-
-            embed.description = desc
-            try:
-                await msg.edit(embed=embed)
-            except:
-                pass
-
-        # 6. Calcul des gains
-        multiplicateur = 0
-        message_fin = ""
-        couleur = discord.Color.red()
-
-        if r1 == r2 == r3:
-            if r1 == "🍁":
-                multiplicateur = 50
-                message_fin = "🌟 **LE GRAND JACKPOT 420 !!!** 🌟\n*Tu as braqué le casino !*"
-                couleur = discord.Color.gold()
-            elif r1 == "💨":
-                multiplicateur = 10
-                message_fin = "🔥 **SUPER COMBO !** Grosse latte en approche."
-                couleur = discord.Color.orange()
-            elif r1 == "🍇":
-                multiplicateur = 5
-                message_fin = "🍇 **Beau gain !**"
-                couleur = discord.Color.purple()
-            elif r1 == "🍋":
-                multiplicateur = 3
-                message_fin = "🍋 **Pas mal du tout !**"
-                couleur = discord.Color.yellow()
-            elif r1 == "🍒":
-                multiplicateur = 2
-                message_fin = "🍒 **Petite victoire !** La mise est doublée."
-                couleur = discord.Color.green()
-        elif r1 == r2 or r1 == r3 or r2 == r3: 
-            multiplicateur = 0.5
-            message_fin = "🤏 *Presque... 2 symboles identiques, on te rend la moitié pour l'effort.*"
-            couleur = discord.Color.light_grey()
-        else:
-            message_fin = "💥 **Perdu !** *La banque encaisse ton don avec le sourire.*"
+        try:
+            # On envoie le message de départ dans le casino
+            embed = discord.Embed(
+                title="🎰 MACHINE À SOUS KANAÉ...",
+                description=f"💸 **Mise :** `{mise}` points\n\n> ⬛ | ⬛ | ⬛ <\n\n*Les rouleaux se lancent...*",
+                color=discord.Color.dark_grey()
+            )
+            await interaction.followup.send("🎰 Ta machine tourne ! Va voir le résultat dans le salon Casino 🎰", ephemeral=True)
+            msg = await casino_channel.send(embed=embed)
 
-        gain_total = int(mise * multiplicateur)
+            embed_final = discord.Embed(
+                title="🎰 RÉSULTAT DE LA MACHINE",
+                description=f"**{interaction.user.mention}**\n\n{frames[-1]}\n\n{message_fin}\n\n💳 **Bénéfice :** `{gain_total - mise}` points",
+                color=couleur
+            )
+            embed_final.set_thumbnail(url=interaction.user.display_avatar.url)
+            embed_final.set_footer(text="Gains : 🍁x50 | 💨x10 | 🍇x5 | 🍋x3 | 🍒x2 | 2 identiques = moitié remboursée")
 
-        if gain_total > 0:
-            await database.add_points(database.db_pool, interaction.user.id, gain_total)
-        
-        active_slots_players.remove(interaction.user.id)
+            # 4. L'Animation (frames précalculées, edits espacés par l'éditeur)
+            await casino.play_slot_animation(msg, embed, frames, embed_final)
 
-        embed_final = discord.Embed(
-            title="🎰 RÉSULTAT DE LA MACHINE",
-            description=f"**{interaction.user.mention}**\n\n{desc}\n\n{message_fin}\n\n💳 **Bénéfice :** `{gain_total - mise}` points",
-            color=couleur
-        )
-        embed_final.set_thumbnail(url=interaction.user.display_avatar.url)
-        
-        embed_final.set_footer(text="Gains : 🍁x50 | 💨x10 | 🍇x5 | 🍋x3 | 🍒x2 | 2 identiques = moitié remboursée")
-        
-        await msg.edit(embed=embed_final)
-        
-        if multiplicateur == 50:
-            await casino_channel.send(f"🚨 **ALERTE JACKPOT !** 🚨\n{interaction.user.mention} vient de braquer le casino avec **3 🍁** et remporté **{gain_total} points** ! 🤑")
+            if multiplicateur == 50:
+                await casino_channel.send(f"🚨 **ALERTE JACKPOT !** 🚨\n{interaction.user.mention} vient de braquer le casino avec **3 🍁** et remporté **{gain_total} points** ! 🤑")
+        except Exception as e:
+            logger.error(f"Erreur animation machine420 pour {interaction.user.id} : {e}")
+        finally:
+            state.active_slot_spins.discard(interaction.user.id)
         
     # ---------------------------------------
     # /quiz (Admin)
@@ -2419,17 +2294,141 @@ def setup(bot: commands.Bot):
         else:
             logger.error(f"Erreur /remove_message : {error}")
 
+    # ---------------------------------------
+    # /requetes_lentes (diagnostic SQL)
+    # ---------------------------------------
+    @bot.tree.command(name="requetes_lentes", description="(Admin) Top des requêtes SQL lentes, avec EXPLAIN dans les logs modo")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        seuil_ms="Ne garder que les requêtes au-dessus de ce temps (minimum et défaut : seuil du bot)",
+        explain="Poste le plan EXPLAIN de chaque requête lente dans le salon de modération"
+    )
+    async def requetes_lentes(interaction: discord.Interaction, seuil_ms: int = None, explain: bool = False):
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ Admin uniquement.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        # Seules les requêtes au-dessus de SLOW_QUERY_MS sont conservées : un seuil plus bas ne verrait rien de plus
+        seuil = max(seuil_ms or 0, config.SLOW_QUERY_MS)
+        plancher = f" (seuil ramené au minimum conservé, {config.SLOW_QUERY_MS:.0f} ms)" if seuil_ms is not None and seuil_ms < seuil else ""
+        samples = query_trace.slowest(10, seuil)
+        if not samples:
+            busiest = query_trace.busiest(5)
+            lines = [f"✅ Aucune requête au-dessus de **{seuil:.0f} ms** sur les dernières 24h{plancher}."]
+            if busiest:
+                lines.append("\n**Plus gros consommateurs (temps cumulé) :**")
+                for statement, entry in busiest:
+                    lines.append(f"• `{entry.caller}` — {entry.count}× / {entry.total * 1000:.0f} ms — `{statement[:80]}`")
+            await interaction.followup.send("\n".join(lines), ephemeral=True)
+            return
+
+        lines = [f"🐢 **Requêtes SQL les plus lentes (24h, > {seuil:.0f} ms)**{plancher}"]
+        for sample in samples:
+            lines.append(f"• **{sample.duration * 1000:.0f} ms** `{sample.caller}` ({sample.rows} lignes) — `{sample.statement[:90]}`")
+
+        if explain:
+            mod_channel = interaction.client.get_channel(config.MOD_LOG_CHANNEL_ID)
+            if mod_channel:
+                posted = await query_trace.dump_explains(mod_channel, database.db_pool, threshold_ms=seuil)
+                lines.append(f"\n📋 {posted} plan(s) EXPLAIN posté(s) dans {mod_channel.mention}.")
+        await interaction.followup.send("\n".join(lines)[:2000], ephemeral=True)
+
+    # ---------------------------------------
+    # /restore-scores (restauration d'une sauvegarde nocturne)
+    # ---------------------------------------
+    class ConfirmRestoreView(discord.ui.View):
+        def __init__(self, path: str, tables: tuple):
+            super().__init__(timeout=300)
+            self.path = path
+            self.tables = tables
+
+        async def on_timeout(self):
+            await asyncio.to_thread(_remove_file, self.path)
+
+        @discord.ui.button(label="♻️ Restaurer", style=discord.ButtonStyle.danger)
+        async def confirm_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+            self.stop()
+            for child in self.children:
+                child.disabled = True
+            await interaction.response.edit_message(content="⏳ Sauvegarde de sécurité puis restauration en cours...", view=self)
+            try:
+                # Filet de sécurité : l'état actuel est sauvegardé avant d'être écrasé
+                safety_path, _ = await backups.write_backup(database.bg_pool)
+                created, counts = await backups.restore_backup(database.bg_pool, self.path, self.tables)
+            except Exception as e:
+                logger.exception(f"Erreur /restore-scores : {e}")
+                await interaction.edit_original_response(content=f"❌ Restauration annulée, rien n'a été modifié : {e}")
+                return
+            finally:
+                await asyncio.to_thread(_remove_file, self.path)
+
+            state.mp_targets_cache.clear()
+            if "user_pokeweeds" in self.tables:
+                # Collections remplacées : l'autocomplétion ne doit plus proposer les anciennes cartes
+                state.pokeweed_collection_cache.clear()
+            details = "\n".join(f"• `{table}` : **{count}** lignes" for table, count in counts.items())
+            await interaction.edit_original_response(
+                content=f"✅ Sauvegarde du **{created}** restaurée !\n{details}\n🛟 État précédent gardé dans `{safety_path}`."
+            )
+            mod_channel = interaction.client.get_channel(config.MOD_LOG_CHANNEL_ID)
+            if mod_channel:
+                await mod_channel.send(f"♻️ {interaction.user.mention} a restauré la sauvegarde du **{created}** :\n{details}")
+
+        @discord.ui.button(label="❌ Annuler", style=discord.ButtonStyle.secondary)
+        async def cancel_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+            self.stop()
+            for child in self.children:
+                child.disabled = True
+            await interaction.response.edit_message(content="🛑 Restauration annulée.", view=self)
+            await asyncio.to_thread(_remove_file, self.path)
+
+    @bot.tree.command(name="restore-scores", description="(Admin) Restaure une sauvegarde des scores (.jsonl.gz)")
+    @app_commands.default_permissions(administrator=True)
+    @app_commands.describe(
+        fichier="Fichier de sauvegarde posté par le bot (kanae-scores-....jsonl.gz)",
+        contenu="Scores seulement, ou tout (scores, streaks wake & bake et collections Pokéweed)"
+    )
+    @app_commands.choices(contenu=[
+        app_commands.Choice(name="Scores (à vie + mois)", value="scores"),
+        app_commands.Choice(name="Tout (scores, streaks, collections)", value="tout"),
+    ])
+    async def restore_scores(interaction: discord.Interaction, fichier: discord.Attachment, contenu: str = "scores"):
+        if not interaction.user.guild_permissions.administrator:
+            await interaction.response.send_message("❌ Admin uniquement.", ephemeral=True)
+            return
+        if not fichier.filename.endswith(".jsonl.gz"):
+            await interaction.response.send_message("❌ Il faut un fichier de sauvegarde `.jsonl.gz` posté par le bot.", ephemeral=True)
+            return
+
+        await interaction.response.defer(ephemeral=True)
+        path = os.path.join(config.BACKUP_DIR, f"restore-{interaction.id}.jsonl.gz")
+        await asyncio.to_thread(_write_file, path, await fichier.read())
+
+        tables = backups.RESTORE_SETS[contenu]
+        await interaction.followup.send(
+            f"⚠️ Les tables {', '.join(f'`{t}`' for t in tables)} vont être **entièrement remplacées** "
+            f"par `{fichier.filename}`. Une sauvegarde de sécurité est prise juste avant. On y va ?",
+            view=ConfirmRestoreView(path, tables), ephemeral=True
+        )
+
     # ===================================================================
     # 📩 SYSTÈME DE RELANCE DES INACTIFS (/mp_revient)
     # ===================================================================
 
+    @persistent_views.register_view
     class RevientRewardView(discord.ui.View):
-        def __init__(self, user_id: int):
+        # Envoyée en MP : seul le destinataire peut cliquer. Après un redémarrage, c'est l'instance
+        # partagée (sans user_id) qui reçoit le clic et le rejoue sur une vue propre au joueur.
+        def __init__(self, user_id: int = None):
             super().__init__(timeout=None)
             self.user_id = user_id
 
         @discord.ui.button(label="🎁 Réclamer mes 700 points !", style=discord.ButtonStyle.success, custom_id="claim_revient_700")
         async def claim_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+            if self.user_id is None:
+                await RevientRewardView(interaction.user.id).claim_btn.callback(interaction)
+                return
             if interaction.user.id != self.user_id:
                 return
             
@@ -2463,6 +2462,9 @@ def setup(bot: commands.Bot):
 
         @discord.ui.button(label="🛑 Ne plus recevoir de MP", style=discord.ButtonStyle.danger, custom_id="optout_revient")
         async def optout_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
+            if self.user_id is None:
+                await RevientRewardView(interaction.user.id).optout_btn.callback(interaction)
+                return
             if interaction.user.id != self.user_id:
                 return
                 
@@ -2486,13 +2488,9 @@ def setup(bot: commands.Bot):
                 )
                 await mod_channel.send(embed=log_embed)
                 
-    async def process_mp_revient_queue(interaction: discord.Interaction, members: list[discord.Member], message_perso: str):
-        logger.info(f"🚀 [Relance] Lancement de la campagne pour {len(members)} membres.")
-        success_count = 0
-        fail_count = 0
-        
+    async def build_events_text() -> str:
         try:
-            upcoming_events = await database.get_public_events(database.db_pool)
+            upcoming_events = await database.PlanningRepository(database.db_pool).reserved()
         except Exception as e:
             logger.error(f"❌ [Relance] Erreur récupération events : {e}")
             upcoming_events = []
@@ -2501,102 +2499,77 @@ def setup(bot: commands.Bot):
         events_text = ""
         if upcoming_events:
             events_text = "\n📅 **LES PROCHAINS EVENTS À NE PAS RATER :**\n"
-            for d, heure, anim_id, titre, desc, event_id in upcoming_events[:3]:
-                date_str = d.strftime("%d/%m")
-                titre_safe = titre[:45] + "..." if len(titre) > 45 else titre
-                events_text += f"🔹 **Le {date_str} à {heure}** - {titre_safe}\n"
+            for slot in upcoming_events[:3]:
+                date_str = slot.starts_at.strftime("%d/%m")
+                titre_safe = slot.titre[:45] + "..." if len(slot.titre) > 45 else slot.titre
+                events_text += f"🔹 **Le {date_str} à {slot.heure}** - {titre_safe}\n"
             
             # On ajoute juste la petite phrase de fin pour donner envie
             events_text += "🌟 *...et pleins d'autres !*\n"
+        return events_text
+
+    async def render_mp_revient(member, guild, payload):
+        """Construit le MP de relance d'un membre (appelé par le dispatcher au moment de l'envoi)."""
+        description = (
+            f"Salut {member.mention} ! Ça fait un moment qu'on ne t'a pas vu passer sur Kanaé. 💨\n\n"
+            f"{payload.get('message_perso', '')}\n"
+            f"{payload.get('events_text', '')}\n"
+            f"🎁 **CADEAU DE RETOUR :**\n"
+            f"Pour fêter tout ça, on t'offre **700 points** pour **le Kanaé d'Or ! 🪙** "
+            f"Clique simplement sur le bouton ci-dessous pour les récupérer et viens nous faire un coucou en vocal ou dans le chat ! 🌿"
+        )
         
-        for member in members:
-            logger.info(f"📩 [Relance] Tentative d'envoi à {member.name} ({member.id})...")
-            
-            description = (
-                f"Salut {member.mention} ! Ça fait un moment qu'on ne t'a pas vu passer sur Kanaé. 💨\n\n"
-                f"{message_perso}\n"
-                f"{events_text}\n"
-                f"🎁 **CADEAU DE RETOUR :**\n"
-                f"Pour fêter tout ça, on t'offre **700 points** pour **le Kanaé d'Or ! 🪙** "
-                f"Clique simplement sur le bouton ci-dessous pour les récupérer et viens nous faire un coucou en vocal ou dans le chat ! 🌿"
-            )
-            
-            if len(description) > 4000:
-                description = description[:4000] + "\n*(...)*"
+        if len(description) > 4000:
+            description = description[:4000] + "\n*(...)*"
 
-            embed = discord.Embed(
-                title="🌟 GROSSE MISE À JOUR DE KANAÉ ! 🌟",
-                description=description,
-                color=discord.Color.gold()
-            )
-            if interaction.guild.icon:
-                embed.set_thumbnail(url=interaction.guild.icon.url)
+        embed = discord.Embed(
+            title="🌟 GROSSE MISE À JOUR DE KANAÉ ! 🌟",
+            description=description,
+            color=discord.Color.gold()
+        )
+        if guild and guild.icon:
+            embed.set_thumbnail(url=guild.icon.url)
 
-            view = RevientRewardView(member.id)
-            
-            try:
-                await member.send(embed=embed, view=view)
-                await database.log_mp_revient(database.db_pool, member.id)
-                success_count += 1
-                logger.info(f"✅ [Relance] Succès pour {member.name}.")
-            except discord.Forbidden:
-                fail_count += 1
-                logger.warning(f"❌ [Relance] Échec : {member.name} a fermé ses MPs.")
-            except Exception as e:
-                fail_count += 1
-                logger.error(f"❌ [Relance] Erreur critique pour {member.name} : {e}")
-                
-            if member != members[-1]:
-                logger.info(f"⏳ [Relance] Pause de 30 secondes pour respecter l'API Discord...")
-                await asyncio.sleep(30)
-            
-        logger.info(f"🏁 [Relance] Campagne terminée. Succès: {success_count} | Échecs: {fail_count}")
-        
-        mod_channel = interaction.client.get_channel(config.MOD_LOG_CHANNEL_ID)
-        if mod_channel:
-            report_embed = discord.Embed(
-                title="📢 Rapport d'envoi : /mp_revient",
-                description="La campagne de relance est terminée !",
-                color=discord.Color.blue()
-            )
-            report_embed.add_field(name="✅ Réussis (MP Ouverts)", value=str(success_count), inline=True)
-            report_embed.add_field(name="❌ Échoués (MP Fermés)", value=str(fail_count), inline=True)
-            await mod_channel.send(embed=report_embed)
+        return {"embed": embed, "view": RevientRewardView(member.id)}
 
-    # --- NOUVEAU : Fonction de tri ultra puissante ---
-    async def get_sorted_mp_targets(interaction: discord.Interaction):
-        """Récupère tout le serveur et trie selon tes critères stricts."""
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT user_id, send_count, last_sent FROM mp_revient_tracking;")
-                tracking_data = {row[0]: (row[1], row[2]) for row in await cur.fetchall()}
-                
-                await cur.execute("SELECT user_id, points FROM scores;")
-                scores_data = {row[0]: row[1] for row in await cur.fetchall()}
-                
-                await cur.execute("SELECT user_id FROM mp_optout;")
-                opted_out = {row[0] for row in await cur.fetchall()}
+    async def on_mp_revient_sent(user_id: int):
+        await database.log_mp_revient(database.db_pool, user_id)
 
+    dm_dispatcher.register_kind(
+        "mp_revient", render_mp_revient, on_sent=on_mp_revient_sent,
+        report_title="📢 Rapport d'envoi : /mp_revient"
+    )
+
+    # --- Candidats de la campagne : 1 requête, gardés le temps de la session admin ---
+    MP_TARGETS_TTL = 300  # 5 min pour préparer sa campagne
+    MP_GROUP_SIZE = 10
+    MP_GROUPS_PER_PAGE = 10
+
+    async def get_sorted_mp_targets(interaction: discord.Interaction, refresh: bool = False):
+        """Membres relançables (hors bots et désabonnés), triés par priorité. Caché par admin."""
+        cached = state.mp_targets_cache.get(interaction.user.id)
+        if (not refresh and cached and cached[1] == interaction.guild_id
+                and time.monotonic() - cached[0] < MP_TARGETS_TTL):
+            return cached[2]
+
+        guild = interaction.guild
+        rows = await database.get_mp_revient_candidates(
+            database.db_pool,
+            [(m.id, m.joined_at.replace(tzinfo=None) if m.joined_at else None) for m in guild.members if not m.bot]
+        )
         members_with_stats = []
-        for member in interaction.guild.members:
-            if member.bot or member.id in opted_out:
+        for user_id, pts, monthly, count, last_sent in rows:
+            member = guild.get_member(user_id)
+            if member is None:
                 continue
-                
-            pts = scores_data.get(member.id, 0)
-            count, last_sent = tracking_data.get(member.id, (0, None))
-            joined = member.joined_at.timestamp() if member.joined_at else 0
-            
             members_with_stats.append({
                 'member': member,
                 'pts': pts,
+                'monthly': monthly,
                 'count': count,
-                'joined': joined,
                 'last_sent': last_sent
             })
-            
-        # On trie d'abord par ceux qui n'ont JAMAIS reçu de message (count == 0) 
-        # et qui n'ont AUCUN point (pts == 0).
-        members_with_stats.sort(key=lambda x: (x['count'] > 0, x['pts'] > 0, x['joined']))
+        state.mp_targets_cache[interaction.user.id] = (time.monotonic(), interaction.guild_id, members_with_stats)
         return members_with_stats
 
     # --- L'autocomplétion mise à jour ---
@@ -2616,30 +2589,35 @@ def setup(bot: commands.Bot):
 
         members_data = await get_sorted_mp_targets(interaction)
         
-        # 2. 📦 CRÉATION DES GROUPES (Exclusifs de 10 joueurs max)
-        num_groups = (len(members_data) + 9) // 10
-        for i in range(min(num_groups, 10)): # On affiche max 10 groupes pour ne pas bloquer Discord
-            start_idx = i * 10
-            end_idx = min(start_idx + 10, len(members_data))
-            taille = end_idx - start_idx
-            
-            nom_groupe = f"📦 GROUPE {i+1} ({taille} membres prioritaires)"
+        # 2. 📦 CRÉATION DES GROUPES (Exclusifs de 10 joueurs max), par pages de 10 groupes
+        # "groupe 14" affiche la page qui contient le groupe 14
+        num_groups = (len(members_data) + MP_GROUP_SIZE - 1) // MP_GROUP_SIZE
+        page_match = re.search(r'\d+', current_lower)
+        page = (int(page_match.group()) - 1) // MP_GROUPS_PER_PAGE if page_match and int(page_match.group()) > 0 else 0
+        first = page * MP_GROUPS_PER_PAGE
+        for i in range(first, min(num_groups, first + MP_GROUPS_PER_PAGE)):
+            start_idx = i * MP_GROUP_SIZE
+            taille = min(start_idx + MP_GROUP_SIZE, len(members_data)) - start_idx
+            
+            nom_groupe = f"📦 GROUPE {i+1}/{num_groups} ({taille} membres prioritaires)"
             # S'il tape "groupe", on lui affiche les groupes
-            if current_lower in nom_groupe.lower() or "groupe" in current_lower or current_lower == "":
+            if (current_lower in nom_groupe.lower() or "groupe" in current_lower or current_lower == ""
+                    or current_lower.strip().isdigit()):
                 choices.append(app_commands.Choice(name=nom_groupe, value=f"GROUP_{i+1}"))
                 
         # 3. 👤 Recherche individuelle 
-        for data in members_data:
-            if len(choices) >= 25:
-                break
+        # On n'affiche les mecs individuellement QUE s'il commence à taper un nom (pour que ce soit propre)
+        if current_lower != "" and "groupe" not in current_lower:
+            for data in members_data:
+                if len(choices) >= 25:
+                    break
+                    
+                m = data['member']
+                date_str = data['last_sent'].strftime("%d/%m/%y") if data['last_sent'] else "Jamais"
+                name_display = f"👤 {m.display_name} | {data['pts']} pts | Reçu: {data['count']}x | Dernier: {date_str}"
                 
-            m = data['member']
-            date_str = data['last_sent'].strftime("%d/%m/%y") if data['last_sent'] else "Jamais"
-            name_display = f"👤 {m.display_name} | {data['pts']} pts | Reçu: {data['count']}x | Dernier: {date_str}"
-            
-            # On n'affiche les mecs individuellement QUE s'il commence à taper un nom (pour que ce soit propre)
-            if current_lower in name_display.lower() and current_lower != "" and "groupe" not in current_lower:
-                choices.append(app_commands.Choice(name=name_display[:100], value=str(m.id)))
+                if current_lower in name_display.lower():
+                    choices.append(app_commands.Choice(name=name_display[:100], value=str(m.id)))
                 
         return choices[:25]
     
@@ -2660,11 +2638,17 @@ def setup(bot: commands.Bot):
             for child in self.children:
                 child.disabled = True
             await interaction.response.edit_message(
-                content=f"🚀 **Campagne lancée !** Envoi en arrière-plan à {len(self.members)} membres (Temps estimé : **{self.temps_estime:.1f} min**). Tu recevras un rapport à la fin !",
+                content=f"🚀 **Campagne lancée !** Envoi en arrière-plan à {len(self.members)} membres (Temps estimé : **{self.temps_estime:.1f} min**). Suivi en direct dans les logs de modération !",
                 embed=None, view=self
             )
-            # 🟢 C'EST SEULEMENT ICI QU'ON LANCE L'ENVOI RÉEL :
-            interaction.client.loop.create_task(process_mp_revient_queue(self.original_interaction, self.members, self.message_perso))
+            # 🟢 C'EST SEULEMENT ICI QU'ON LANCE L'ENVOI RÉEL (file persistée, reprise au redémarrage) :
+            payload = {"message_perso": self.message_perso, "events_text": await build_events_text()}
+            await dm_dispatcher.enqueue(
+                "mp_revient", self.original_interaction.guild_id,
+                [(m.id, None) for m in self.members], payload, created_by=interaction.user.id
+            )
+            # Les compteurs de relance vont bouger : la prochaine préparation repart de la base
+            state.mp_targets_cache.pop(interaction.user.id, None)
 
         @discord.ui.button(label="❌ Annuler", style=discord.ButtonStyle.danger)
         async def cancel_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -2689,89 +2673,56 @@ def setup(bot: commands.Bot):
             return
 
         await interaction.response.defer(ephemeral=True)
-        target_ids = []
+        # Candidats déjà triés (hors bots et désabonnés), calculés 1 fois pour la session
+        members_data = await get_sorted_mp_targets(interaction)
         
         # 🌟 GESTION DES GROUPES (GROUP_1, GROUP_2, etc.)
         if cible.startswith("GROUP_"):
             group_num = int(cible.split("_")[1])
-            members_data = await get_sorted_mp_targets(interaction)
             
             # On découpe la grosse liste pour prendre exactement les 10 mecs de ce groupe
-            start_idx = (group_num - 1) * 10
-            end_idx = start_idx + 10
-            group_members = members_data[start_idx:end_idx]
-            
-            target_ids = [data['member'].id for data in group_members]
+            start_idx = (group_num - 1) * MP_GROUP_SIZE
+            targets = members_data[start_idx:start_idx + MP_GROUP_SIZE]
 
-        if cible == "PRIO_NEW":
-            members_data = await get_sorted_mp_targets(interaction)
+        elif cible == "PRIO_NEW":
             # On ne garde que ceux qui remplissent les deux conditions : 0 pt et 0 message.
-            target_ids = [data['member'].id for data in members_data if data['pts'] == 0 and data['count'] == 0]    
+            targets = [data for data in members_data if data['pts'] == 0 and data['count'] == 0]
 
         # Options classiques
         elif cible == "ALL_VIE":
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute("SELECT user_id FROM scores WHERE points > 0;")
-                    active_ids = {row[0] for row in await cur.fetchall()}
-            target_ids = [m.id for m in interaction.guild.members if not m.bot and m.id not in active_ids]
+            targets = [data for data in members_data if data['pts'] <= 0]
             
         elif cible == "ALL_MOIS":
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute("SELECT user_id FROM monthly_scores WHERE points > 0;")
-                    active_ids = {row[0] for row in await cur.fetchall()}
-            target_ids = [m.id for m in interaction.guild.members if not m.bot and m.id not in active_ids]
+            targets = [data for data in members_data if data['monthly'] <= 0]
             
         # Mentions manuelles ou pseudo unique
         else:
-            import re
             mentions = re.findall(r'<@!?(\d+)>', cible)
             if mentions:
-                target_ids = [int(m) for m in mentions]
+                target_ids = {int(m) for m in mentions}
             else:
                 try:
-                    target_ids = [int(cible.strip())]
+                    target_ids = {int(cible.strip())}
                 except ValueError:
                     await interaction.followup.send("❌ Cible invalide. Utilise un groupe, la liste, ou mentionne (@joueur) !", ephemeral=True)
                     return
+            # Ceux qui ne sont pas dans les candidats ont quitté, sont des bots ou ont cliqué sur "Ne plus recevoir"
+            targets = [data for data in members_data if data['member'].id in target_ids]
 
-        # On nettoie les éventuels doublons si tu t'es amusé à ping 2 fois la même personne
-        target_ids = list(set(target_ids))
-
-        # On enlève ceux qui ont cliqué sur le bouton rouge "Ne plus recevoir"
-        opted_out_ids = await database.get_all_optouts(database.db_pool)
-
-        valid_members = []
-        for uid in target_ids:
-            if uid in opted_out_ids:
-                continue 
-            member = interaction.guild.get_member(uid)
-            if member and not member.bot:
-                valid_members.append(member)
-
-        if not valid_members:
+        if not targets:
             await interaction.followup.send("📭 Aucun membre valide trouvé dans cette cible (ils ont peut-être quitté ou sont sur liste noire).", ephemeral=True)
             return
 
-        temps_estime = (len(valid_members) * 30) / 60 
-        
-        # --- NOUVEAU : Récupération des stats en direct pour la prévisualisation ---
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT user_id, send_count FROM mp_revient_tracking;")
-                tracking_data = {row[0]: row[1] for row in await cur.fetchall()}
-                await cur.execute("SELECT user_id, points FROM scores;")
-                scores_data = {row[0]: row[1] for row in await cur.fetchall()}
+        valid_members = [data['member'] for data in targets]
+        temps_estime = dm_dispatcher.estimated_minutes(len(valid_members))
 
-        # Création de la belle liste pour l'affichage
+        # Création de la belle liste pour l'affichage (stats déjà dans les candidats)
         liste_cibles = ""
         compteur = 0
-        for m in valid_members:
-            pts = scores_data.get(m.id, 0)
-            count = tracking_data.get(m.id, 0)
+        for data in targets:
+            m = data['member']
             joined = m.joined_at.strftime("%d/%m/%y") if m.joined_at else "Inconnu"
-            ligne = f"• **{m.display_name}** | {pts} pts | Reçu: {count}x | Rejoint le: {joined}\n"
+            ligne = f"• **{m.display_name}** | {data['pts']} pts | Reçu: {data['count']}x | Rejoint le: {joined}\n"
             
             # Sécurité : Si le groupe est énorme, on coupe pour ne pas dépasser la limite Discord
             if len(liste_cibles) + len(ligne) > 1000:
@@ -2798,25 +2749,22 @@ def setup(bot: commands.Bot):
     # ---------------------------------------
     @bot.tree.command(name="jackpot", description="Lance un pot commun ! Le gagnant rafle TOUTES les mises. 🎰")
     async def jackpot(interaction: discord.Interaction):
-        global active_jackpot
-        
-        casino_channel_id = 1477651520878280914
-        
-        if interaction.channel_id != casino_channel_id:
-            await interaction.response.send_message(f"❌ Le jackpot, ça se passe exclusivement dans <#{casino_channel_id}> !", ephemeral=True)
+        if interaction.channel_id not in config.CASINO_JACKPOT_CHANNEL_IDS:
+            await interaction.response.send_message(f"❌ Le jackpot, ça se passe exclusivement dans <#{config.CASINO_CHANNEL_ID}> !", ephemeral=True)
             return
 
-        if active_jackpot:
-            await interaction.response.send_message("❌ Un Jackpot est déjà en cours ! Attends le tirage.", ephemeral=True)
+        # Sécurité : Un seul jackpot à la fois PAR salon (garanti par la base)
+        opened = await database.open_casino_round(
+            database.db_pool, "jackpot", interaction.channel_id, interaction.user.id, 0, casino.JACKPOT_DURATION
+        )
+        if opened is None:
+            await interaction.response.send_message("❌ Un Jackpot est déjà en cours dans ce salon ! Attends le tirage.", ephemeral=True)
             return
 
-        # Durée du jackpot : 15 minutes (soit 900 secondes). Modifie ici si tu veux 1h (3600)
-        duree_secondes = 900 
-        end_time = int(datetime.now(timezone.utc).timestamp() + duree_secondes)
-        
-        active_jackpot = True
-        view = JackpotView(end_time)
-        
+        round_id, ends_at = opened
+        end_time = casino.to_timestamp(ends_at)
+        view = casino.JackpotView(round_id, end_time)
+
         embed = discord.Embed(
             title="🎰 LE GROS POT DE KANAÉ EST OUVERT 🎰",
             description=(
@@ -2827,71 +2775,10 @@ def setup(bot: commands.Bot):
             color=discord.Color.gold()
         )
         embed.set_footer(text="Plus tu mises gros, plus tu as de chances... mais rien n'est garanti ! 💨")
-        
+
         await interaction.response.send_message("🚨 **UN NOUVEAU JACKPOT EST LANCÉ !** 🚨", embed=embed, view=view)
         msg = await interaction.original_response()
-        
-        # ⏳ On attend la fin du chrono !
-        await asyncio.sleep(duree_secondes)
-        
-        # --- FIN DU CHRONO ---
-        active_jackpot = False
-        
-        # On désactive le bouton
-        for child in view.children: 
-            child.disabled = True
-        try:
-            await msg.edit(view=view)
-        except:
-            pass
-
-        # 🛡️ SÉCURITÉ : Remboursement s'il y a moins de 2 joueurs
-        if len(view.bets) < 2:
-            for uid, bet in view.bets.items():
-                await database.add_points(database.db_pool, str(uid), bet)
-            
-            cancel_embed = discord.Embed(
-                title="🛑 JACKPOT ANNULÉ",
-                description="Il n'y avait pas assez de participants (minimum 2).\n💸 **Toutes les mises ont été remboursées.**",
-                color=discord.Color.red()
-            )
-            await interaction.channel.send(embed=cancel_embed)
-            return
 
-        # 🎲 TIRAGE AU SORT PONDÉRÉ
-        participants = list(view.bets.keys())
-        poids = list(view.bets.values())
-        total_pot = sum(poids)
-        
-        # Choix du gagnant en fonction du poids de sa mise
-        gagnant_id = random.choices(participants, weights=poids, k=1)[0]
-        
-        # Créditer le gagnant
-        new_total = await database.add_points(database.db_pool, str(gagnant_id), total_pot)
-        
-        # Vérification du rôle de prestige pour le gagnant
-        guild_member = interaction.guild.get_member(gagnant_id)
-        if guild_member:
-            await helpers.update_member_prestige_role(guild_member, new_total)
-
-        # 🥁 Animation de suspense
-        suspense_msg = await interaction.channel.send("🥁 *Le bot mélange les tickets de tout le monde...*")
-        await asyncio.sleep(2)
-        await suspense_msg.edit(content="🥁 *La main innocente de Kanaé pioche un ticket...*")
-        await asyncio.sleep(2)
-        await suspense_msg.delete()
-
-        # 🎉 Annonce du grand gagnant
-        res_embed = discord.Embed(
-            title="🎊 ET LE GRAND GAGNANT EST... 🎊",
-            description=(
-                f"🏆 **<@{gagnant_id}>** vient de braquer la banque et rafle **{total_pot} points** ! 🤑\n\n"
-                f"📊 *Statistiques du braquage :*\n"
-                f"Il avait misé **{view.bets[gagnant_id]} points**.\n"
-                f"Il avait **{(view.bets[gagnant_id] / total_pot) * 100:.1f}%** de chances de l'emporter."
-            ),
-            color=discord.Color.green()
-        )
-        res_embed.set_thumbnail(url="https://i.imgur.com/8Q5A40b.gif") # Un gif festif/casino si tu veux
-        
-        await interaction.channel.send(content=f"INCROYABLE <@{gagnant_id}> ! 🎉", embed=res_embed)
\ No newline at end of file
+        # ⏳ Plus de commande qui dort 15 minutes : la manche est en base et le scheduler fera le tirage
+        await database.set_casino_round_message(database.db_pool, round_id, msg.id)
+        casino.register_view(view)
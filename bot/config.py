@@ -11,6 +11,16 @@ TWITCH_CLIENT_SECRET = os.getenv('TWITCH_CLIENT_SECRET') # 👈 Ajoute ça
 TWITCH_BROADCASTER_ID = os.getenv('TWITCH_BROADCASTER_ID') # Ton ID numérique Twitch
 TWITCH_API_TOKEN = os.getenv('TWITCH_API_TOKEN')
 TWITCH_REFRESH_TOKEN = os.getenv('TWITCH_REFRESH_TOKEN')
+# Exporteur de métriques Prometheus (local uniquement ; METRICS_PORT=0 pour le couper)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', 9108))
+# Seuil (ms) au-delà duquel une requête SQL est journalisée et classée parmi les lentes
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', 200))
+# Chien de garde de la boucle : seuil de blocage (ms) et mode debug (E/S synchrones signalées)
+LOOP_LAG_WARN_MS = float(os.getenv('LOOP_LAG_WARN_MS', 250))
+LOOP_DEBUG = os.getenv('LOOP_DEBUG') == '1'
+# Dossier local des sauvegardes nocturnes (les 7 dernières sont gardées)
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
 
 NEWS_CHANNEL_ID = 1377605635365011496
 CHANNEL_REGLES_ID = 1372288019977212017
@@ -29,6 +39,10 @@ STAFF_NEWS_REVIEW_CHANNEL_ID = 1476162862937407518 #
 EVENT_CHANNEL_ID=1480542552632459386
 EVENT_MESSAGE_ID=1480543933132968127
 CASINO_CHANNEL_ID=1477651520878280914
+# Salons où /jackpot est autorisé (1 jackpot en cours max par salon)
+CASINO_JACKPOT_CHANNEL_IDS = {CASINO_CHANNEL_ID}
+# Salons où le Quiz Enfumé pose ses questions aléatoires (1 rotation de questions par salon)
+QUIZ_CHANNEL_IDS = [BLABLA_CHANNEL_ID]
 
 
 PRESTIGE_ROLES = {
@@ -90,6 +104,23 @@ else:
     MYSQLPASSWORD = os.getenv('MYSQLPASSWORD', '')
     MYSQLDATABASE = os.getenv('MYSQLDATABASE', 'kanaebot')
 
+# --- Pools MySQL ---
+# Pool principal (commandes, événements) et petit pool séparé pour les tâches de fond
+# (sauvegarde nocturne, campagnes de MP, flush des journaux) qui ne doivent pas l'affamer.
+DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 2))
+DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 15))
+DB_BG_POOL_MAX = int(os.getenv('DB_BG_POOL_MAX', 3))
+# Recyclage avant le wait_timeout du serveur (28800 s par défaut) ; -1 pour désactiver
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+# Ping avant de prêter une connexion restée inactive plus longtemps que ça (secondes)
+DB_PING_IDLE = float(os.getenv('DB_PING_IDLE', 30))
+DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+# Timeout des SELECT côté serveur (max_execution_time, MySQL 5.7.8+) ; 0 = pas de limite
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))
+# Reconnexion au démarrage : essais et attente max entre deux (backoff exponentiel)
+DB_CONNECT_RETRIES = int(os.getenv('DB_CONNECT_RETRIES', 5))
+DB_CONNECT_BACKOFF_MAX = float(os.getenv('DB_CONNECT_BACKOFF_MAX', 30))
+
 
 # --- Reaction roles (team)
 REACTION_ROLE_CHANNEL_ID = 1432728685353500913  # ← ton salon cible
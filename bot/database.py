@@ -1,28 +1,213 @@
+import asyncio
+import contextlib
+import contextvars
+import json
 import logging
+import random
+import re
+import zoneinfo
 import aiomysql
+import pymysql
 from datetime import date, datetime, timezone, timedelta
 
-from . import config
+from . import config, query_trace, state
 
 logger = logging.getLogger(__name__)
 
 db_pool = None
+bg_pool = None  # Petit pool des tâches de fond (sauvegardes, campagnes, flush)
 
-async def init_db_pool():
+
+class _CheckedAcquire:
+    """`pool.acquire()` avec pré-ping des connexions restées inactives (tuées par le wait_timeout ?)."""
+
+    def __init__(self, pool, acquire):
+        self._pool = pool
+        self._acquire = acquire
+        self._conn = None
+
+    async def __aenter__(self):
+        for attempt in range(2):
+            conn = await self._acquire()
+            if self._pool._loop.time() - conn.last_usage < config.DB_PING_IDLE:
+                self._conn = conn
+                return conn
+            try:
+                await conn.ping(reconnect=True)
+                self._conn = conn
+                return conn
+            except Exception as e:
+                logger.warning("🔌 Connexion MySQL morte au prêt (%s), on en reprend une", e)
+                conn.close()
+                self._pool.release(conn)
+                if attempt:
+                    raise
+
+    async def __aexit__(self, *exc):
+        await self._pool.release(self._conn)
+        return False
+
+async def init_db_pool(name: str = "main", minsize: int = None, maxsize: int = None):
+    """Crée un pool réglé par la config, en réessayant avec backoff si MySQL n'est pas (encore) joignable."""
+    init_command = None
+    if config.DB_STATEMENT_TIMEOUT_MS:
+        init_command = f"SET SESSION max_execution_time={int(config.DB_STATEMENT_TIMEOUT_MS)}"
+    delay = 1.0
+    for attempt in range(1, config.DB_CONNECT_RETRIES + 1):
+        try:
+            pool = await aiomysql.create_pool(
+                host=config.MYSQLHOST,
+                port=config.MYSQLPORT,
+                user=config.MYSQLUSER,
+                password=config.MYSQLPASSWORD,
+                db=config.MYSQLDATABASE,
+                autocommit=True,
+                minsize=config.DB_POOL_MIN if minsize is None else minsize,
+                maxsize=config.DB_POOL_MAX if maxsize is None else maxsize,
+                pool_recycle=config.DB_POOL_RECYCLE,
+                connect_timeout=config.DB_CONNECT_TIMEOUT,
+                init_command=init_command,
+                # Chaque requête est chronométrée (top des requêtes lentes, EXPLAIN à la demande)
+                cursorclass=query_trace.TracedCursor,
+            )
+            raw_acquire = pool._acquire
+            pool.acquire = lambda: _CheckedAcquire(pool, raw_acquire)
+            share_connections(pool)
+            logger.info("DB pool '%s' created (%s-%s): %s@%s:%s/%s", name, pool.minsize, pool.maxsize,
+                        config.MYSQLUSER, config.MYSQLHOST, config.MYSQLPORT, config.MYSQLDATABASE)
+            return pool
+        except Exception as e:
+            if attempt == config.DB_CONNECT_RETRIES:
+                logger.exception("Unable to create MySQL pool '%s': %s", name, e)
+                raise
+            logger.warning("MySQL injoignable (%s), essai %d/%d, nouvel essai dans %.0f s",
+                           e, attempt, config.DB_CONNECT_RETRIES, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, config.DB_CONNECT_BACKOFF_MAX)
+
+# --- Unité de travail : une connexion (et éventuellement une transaction) par tâche ---
+
+_uow = contextvars.ContextVar("db_unit_of_work", default=None)
+
+class _UnitOfWork:
+    __slots__ = ("pool", "conn", "task", "transaction", "rollback_only", "after_commit")
+
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+        self.task = asyncio.current_task()
+        self.transaction = False
+        self.rollback_only = False
+        self.after_commit = []
+
+    def handle(self):
+        return _TxConnection(self) if self.transaction else self.conn
+
+class _TxConnection:
+    """Connexion prêtée dans une transaction englobante : les begin/commit des fonctions appelées
+    deviennent des no-op, un rollback condamne toute la transaction (annulée à la sortie)."""
+
+    def __init__(self, uow: _UnitOfWork):
+        self._uow = uow
+
+    def __getattr__(self, name):
+        return getattr(self._uow.conn, name)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        self._uow.rollback_only = True
+
+class _ReusedAcquire:
+    reused = True  # Pas une vraie sortie du pool (ignoré par les métriques)
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    async def __aenter__(self):
+        return self._conn
+
+    async def __aexit__(self, *exc):
+        return False
+
+def _bound(pool):
+    uow = _uow.get()
+    # La tâche propriétaire seulement : une tâche créée dedans hérite du contexte mais pas de la connexion
+    if uow is not None and uow.pool is pool and uow.task is asyncio.current_task():
+        return uow
+    return None
+
+def share_connections(pool):
+    """Fait de `pool.acquire()` un prêt de la connexion de l'unité de travail en cours, s'il y en a une."""
+    acquire = pool.acquire
+
+    def shared_acquire():
+        uow = _bound(pool)
+        return _ReusedAcquire(uow.handle()) if uow is not None else acquire()
+
+    pool.acquire = shared_acquire
+    return pool
+
+def _on_commit(pool, func, *args):
+    """Appelle `func(*args)` une fois la transaction englobante validée (tout de suite s'il n'y en a pas)."""
+    uow = _bound(pool)
+    if uow is not None and uow.transaction:
+        uow.after_commit.append((func, args))
+    else:
+        func(*args)
+
+@contextlib.asynccontextmanager
+async def _transaction(uow: _UnitOfWork):
+    await uow.conn.begin()
+    uow.transaction, uow.rollback_only, uow.after_commit = True, False, []
     try:
-        pool = await aiomysql.create_pool(
-            host=config.MYSQLHOST,
-            port=config.MYSQLPORT,
-            user=config.MYSQLUSER,
-            password=config.MYSQLPASSWORD,
-            db=config.MYSQLDATABASE,
-            autocommit=True,
-        )
-        logger.info("DB pool created: %s@%s:%s/%s", config.MYSQLUSER, config.MYSQLHOST, config.MYSQLPORT, config.MYSQLDATABASE)
-        return pool
-    except Exception as e:
-        logger.exception("Unable to create MySQL pool: %s", e)
+        yield
+    except BaseException:
+        await uow.conn.rollback()
         raise
+    else:
+        if uow.rollback_only:
+            await uow.conn.rollback()
+        else:
+            await uow.conn.commit()
+            # Seulement maintenant : les autres connexions voient enfin les écritures
+            for func, args in uow.after_commit:
+                func(*args)
+    finally:
+        uow.transaction, uow.after_commit = False, []
+
+@contextlib.asynccontextmanager
+async def unit_of_work(pool, transaction: bool = False):
+    """Lie une seule connexion à la tâche courante : tous les `database.*` (et `pool.acquire()`)
+    appelés dedans la réutilisent au lieu d'en emprunter une autre.
+
+    Avec `transaction=True`, tout ce qui s'exécute dedans est validé ou annulé d'un bloc.
+    Imbriqué, le bloc interne réutilise la connexion (et la transaction) du bloc externe.
+    """
+    uow = _bound(pool)
+    if uow is not None:
+        if transaction and not uow.transaction:
+            async with _transaction(uow):
+                yield uow.handle()
+        else:
+            yield uow.handle()
+        return
+
+    async with pool.acquire() as conn:
+        uow = _UnitOfWork(pool, conn)
+        token = _uow.set(uow)
+        try:
+            if transaction:
+                async with _transaction(uow):
+                    yield uow.handle()
+            else:
+                yield uow.handle()
+        finally:
+            _uow.reset(token)
 
 async def ensure_tables(pool):
     async with pool.acquire() as conn:
@@ -163,13 +348,47 @@ async def ensure_tables(pool):
             """)
             await cur.execute("""
                 CREATE TABLE IF NOT EXISTS user_pokeweeds (
+                    copy_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
                     user_id BIGINT,
                     pokeweed_id INT,
                     capture_date DATETIME,
-                    PRIMARY KEY (user_id, pokeweed_id, capture_date),
+                    INDEX idx_owner_card (user_id, pokeweed_id),
                     FOREIGN KEY (pokeweed_id) REFERENCES pokeweeds(id)
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
             """)
+            # Migration : chaque copie de carte reçoit un identifiant unique (copy_id)
+            # (l'ancienne clé user_id/pokeweed_id/capture_date n'était pas unique à la seconde près)
+            await cur.execute("""
+                SELECT 1 FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'user_pokeweeds' AND COLUMN_NAME = 'copy_id';
+            """)
+            if not await cur.fetchone():
+                await cur.execute("""
+                    ALTER TABLE user_pokeweeds
+                        DROP PRIMARY KEY,
+                        ADD COLUMN copy_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY FIRST,
+                        ADD INDEX idx_owner_card (user_id, pokeweed_id);
+                """)
+                logger.info("user_pokeweeds migrated to copy_id primary key")
+            # Résumé dénormalisé du Pokédex (1 ligne par carte unique au lieu d'1 par copie)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS user_pokeweed_counts (
+                    user_id BIGINT NOT NULL,
+                    pokeweed_id INT NOT NULL,
+                    count INT NOT NULL DEFAULT 0,
+                    last_capture DATETIME,
+                    PRIMARY KEY (user_id, pokeweed_id)
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
+            # Premier lancement : on remplit le résumé à partir des copies existantes
+            await cur.execute("SELECT 1 FROM user_pokeweed_counts LIMIT 1;")
+            if not await cur.fetchone():
+                await cur.execute("""
+                    INSERT IGNORE INTO user_pokeweed_counts (user_id, pokeweed_id, count, last_capture)
+                    SELECT user_id, pokeweed_id, COUNT(*), MAX(capture_date)
+                    FROM user_pokeweeds
+                    GROUP BY user_id, pokeweed_id;
+                """)
             # Table pour l'historique des ventes de pokeweeds
             await cur.execute("""
                 CREATE TABLE IF NOT EXISTS pokeweed_sales (
@@ -180,15 +399,36 @@ async def ensure_tables(pool):
                     sale_date DATETIME
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
             """)
-            # Table pour les scores mensuels (pour le classement)
+            # Table pour les scores mensuels (pour le classement) : une partition par mois ('AAAA-MM')
             await cur.execute(
                 """
                 CREATE TABLE IF NOT EXISTS monthly_scores (
-                    user_id BIGINT PRIMARY KEY,
-                    points INT NOT NULL
+                    period CHAR(7) NOT NULL,
+                    user_id BIGINT NOT NULL,
+                    points INT NOT NULL,
+                    PRIMARY KEY (period, user_id),
+                    INDEX idx_period_points (period, points)
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
                 """
             )
+            # Migration : l'ancienne table (user_id seul, remise à zéro chaque mois) devient la période en cours
+            await cur.execute("""
+                SELECT 1 FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'monthly_scores' AND COLUMN_NAME = 'period';
+            """)
+            if not await cur.fetchone():
+                await cur.execute(
+                    """
+                    ALTER TABLE monthly_scores
+                        ADD COLUMN period CHAR(7) NOT NULL DEFAULT %s FIRST,
+                        DROP PRIMARY KEY,
+                        ADD PRIMARY KEY (period, user_id),
+                        ADD INDEX idx_period_points (period, points);
+                    """,
+                    (current_period(),)
+                )
+                await cur.execute("ALTER TABLE monthly_scores ALTER COLUMN period DROP DEFAULT;")
+                logger.info("monthly_scores migrated to (period, user_id) primary key")
             # Table pour limiter les annonces de live (3 par semaine)
             await cur.execute(
                 """
@@ -224,14 +464,81 @@ async def ensure_tables(pool):
                     id INT AUTO_INCREMENT PRIMARY KEY,
                     slot_date DATE NOT NULL,
                     heure VARCHAR(20) NOT NULL,
+                    starts_at DATETIME NOT NULL,
                     est_reserve BOOLEAN DEFAULT FALSE,
                     animateur_id BIGINT,
                     titre VARCHAR(100),
                     description TEXT,
-                    event_id BIGINT
+                    event_id BIGINT,
+                    INDEX idx_starts_reserve (starts_at, est_reserve)
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
                 """
             )
+            # Migration : date + heure libre ("21h30", "21:30", "21h") => vrai DATETIME (heure de Paris) indexé
+            # Chaque étape est vérifiée à part : un démarrage interrompu en plein milieu reprend là où il s'est arrêté
+            await cur.execute("""
+                SELECT IS_NULLABLE FROM information_schema.COLUMNS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'planning_pro' AND COLUMN_NAME = 'starts_at';
+            """)
+            column = await cur.fetchone()
+            if not column:
+                await cur.execute("ALTER TABLE planning_pro ADD COLUMN starts_at DATETIME NULL AFTER heure;")
+                column = ("YES",)
+            if column[0] == "YES":
+                await cur.execute("SELECT id, slot_date, heure FROM planning_pro WHERE starts_at IS NULL;")
+                rows = await cur.fetchall()
+                if rows:
+                    await cur.executemany(
+                        "UPDATE planning_pro SET starts_at = %s WHERE id = %s;",
+                        [(slot_start(slot_date, heure), slot_id) for slot_id, slot_date, heure in rows]
+                    )
+                    logger.info("planning_pro: starts_at backfilled for %d slots", len(rows))
+                await cur.execute("ALTER TABLE planning_pro MODIFY starts_at DATETIME NOT NULL;")
+            await cur.execute("""
+                SELECT 1 FROM information_schema.STATISTICS
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'planning_pro' AND INDEX_NAME = 'idx_starts_reserve'
+                LIMIT 1;
+            """)
+            if not await cur.fetchone():
+                await cur.execute("ALTER TABLE planning_pro ADD INDEX idx_starts_reserve (starts_at, est_reserve);")
+            # Casino : manches ouvertes (jackpot, douille) et mises déjà débitées
+            # open_key n'est rempli que pour un jackpot ouvert => 1 seul jackpot à la fois PAR salon
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS casino_rounds (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    game VARCHAR(20) NOT NULL,
+                    channel_id BIGINT NOT NULL,
+                    message_id BIGINT,
+                    host_id BIGINT,
+                    stake INT NOT NULL DEFAULT 0,
+                    status VARCHAR(10) NOT NULL DEFAULT 'open',
+                    ends_at DATETIME NOT NULL,
+                    created_at DATETIME NOT NULL,
+                    open_key BIGINT AS (IF(status = 'open' AND game = 'jackpot', channel_id, NULL)) STORED,
+                    UNIQUE KEY uniq_open_jackpot (open_key),
+                    INDEX idx_status_ends (status, ends_at)
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS casino_stakes (
+                    round_id INT NOT NULL,
+                    user_id BIGINT NOT NULL,
+                    amount INT NOT NULL,
+                    PRIMARY KEY (round_id, user_id)
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
+            # Journal des tirages du casino (graine + n° de tirage => rejouable pour vérifier l'équité)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS casino_draws (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    game VARCHAR(20) NOT NULL,
+                    seed BIGINT UNSIGNED NOT NULL,
+                    seq INT NOT NULL,
+                    outcome VARCHAR(100) NOT NULL,
+                    drawn_at DATETIME NOT NULL,
+                    INDEX idx_game_seed (game, seed)
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
             # Tables pour le système de relance des inactifs
             await cur.execute("""
                 CREATE TABLE IF NOT EXISTS mp_revient_tracking (
@@ -246,14 +553,71 @@ async def ensure_tables(pool):
                     claimed_at DATETIME
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
             """)
+            # File d'envoi des MPs (campagnes /mp_revient, rappels) : survit aux redémarrages
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS dm_campaigns (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    kind VARCHAR(30) NOT NULL,
+                    guild_id BIGINT,
+                    payload TEXT,
+                    total INT NOT NULL DEFAULT 0,
+                    created_by BIGINT,
+                    created_at DATETIME NOT NULL,
+                    finished_at DATETIME
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS dm_queue (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    campaign_id INT NOT NULL,
+                    user_id BIGINT NOT NULL,
+                    payload TEXT,
+                    status VARCHAR(10) NOT NULL DEFAULT 'pending',
+                    attempts INT NOT NULL DEFAULT 0,
+                    error VARCHAR(100),
+                    sent_at DATETIME,
+                    INDEX idx_status (status, id),
+                    INDEX idx_campaign (campaign_id, status)
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
             await cur.execute("""
                 CREATE TABLE IF NOT EXISTS mp_optout (
                     user_id BIGINT PRIMARY KEY,
                     opted_out_at DATETIME
                 ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
             """)
+            # Quiz Enfumé : questions restantes du cycle en cours, par salon
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS quiz_rotation (
+                    channel_id BIGINT PRIMARY KEY,
+                    bank_version BIGINT NOT NULL,
+                    remaining TEXT NOT NULL
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
+            await cur.execute("""
+                CREATE TABLE IF NOT EXISTS quiz_stats (
+                    user_id BIGINT PRIMARY KEY,
+                    correct INT NOT NULL DEFAULT 0,
+                    wrong INT NOT NULL DEFAULT 0,
+                    points INT NOT NULL DEFAULT 0,
+                    last_answer DATETIME
+                ) CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+            """)
     logger.info("Database tables checked/created")
 
+# --- Périodes des scores mensuels ---
+# Chaque mois a sa propre partition (period, user_id) : le changement de mois ne touche aucune ligne
+# et les mois passés restent consultables (/top mois:AAAA-MM).
+
+def current_period(now: datetime = None) -> str:
+    """Période mensuelle en cours, 'AAAA-MM' (UTC)."""
+    return (now or datetime.now(timezone.utc)).strftime("%Y-%m")
+
+def previous_period(now: datetime = None) -> str:
+    """Période du mois précédent, 'AAAA-MM' (UTC)."""
+    first = (now or datetime.now(timezone.utc)).replace(day=1)
+    return current_period(first - timedelta(days=1))
+
 async def get_user_points(pool, user_id):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
@@ -277,52 +641,364 @@ async def set_user_points(pool, user_id, pts, categorie="vie"):
                 # On modifie uniquement le score du mois
                 await cur.execute(
                     """
-                    INSERT INTO monthly_scores (user_id, points) VALUES (%s, %s)
+                    INSERT INTO monthly_scores (period, user_id, points) VALUES (%s, %s, %s)
                     ON DUPLICATE KEY UPDATE points = %s;
                     """,
-                    (int(user_id), pts, pts),
+                    (current_period(), int(user_id), pts, pts),
                 )
             return pts
 
+async def _apply_points(cur, user_id, pts):
+    # 1. Ajout/Soustraction dans les scores À VIE (Bloqué à 0 minimum)
+    await cur.execute(
+        """
+        INSERT INTO scores (user_id, points) VALUES (%s, GREATEST(0, %s))
+        ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(points AS SIGNED) + %s);
+        """,
+        (int(user_id), pts, pts),
+    )
+
+    # 2. Ajout/Soustraction dans les scores MENSUELS (Bloqué à 0 minimum)
+    await cur.execute(
+        """
+        INSERT INTO monthly_scores (period, user_id, points) VALUES (%s, %s, GREATEST(0, %s))
+        ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(points AS SIGNED) + %s);
+        """,
+        (current_period(), int(user_id), pts, pts),
+    )
+
 async def add_points(pool, user_id, pts):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            # 1. Ajout/Soustraction dans les scores À VIE (Bloqué à 0 minimum)
-            await cur.execute(
-                """
-                INSERT INTO scores (user_id, points) VALUES (%s, GREATEST(0, %s))
-                ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(points AS SIGNED) + %s);
-                """,
-                (int(user_id), pts, pts),
-            )
-            
-            # 2. Ajout/Soustraction dans les scores MENSUELS (Bloqué à 0 minimum)
-            await cur.execute(
-                """
-                INSERT INTO monthly_scores (user_id, points) VALUES (%s, GREATEST(0, %s))
-                ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(points AS SIGNED) + %s);
-                """,
-                (int(user_id), pts, pts),
-            )
+            await _apply_points(cur, user_id, pts)
             
             # On retourne toujours le score à vie pour les rôles de prestige
             await cur.execute("SELECT points FROM scores WHERE user_id=%s;", (int(user_id),))
             row = await cur.fetchone()
             return row[0]
 
-async def reset_monthly_scores(pool):
-    """Remet tous les compteurs du mois à zéro."""
+POINTS_BATCH = 500
+
+async def add_points_batch(pool, deltas):
+    """Applique plusieurs gains/pertes d'un coup : {user_id: points}. 1 requête par table et par lot."""
+    rows = [(int(uid), int(pts)) for uid, pts in deltas.items() if pts]
+    if not rows:
+        return
+    period = current_period()
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                for i in range(0, len(rows), POINTS_BATCH):
+                    chunk = rows[i:i + POINTS_BATCH]
+                    # Table dérivée : la clause UPDATE peut relire le delta brut (d.pts) de chaque ligne
+                    derived = " UNION ALL ".join(["SELECT %s AS user_id, %s AS pts"] * len(chunk))
+                    params = [value for row in chunk for value in row]
+                    await cur.execute(
+                        f"""
+                        INSERT INTO scores (user_id, points)
+                        SELECT d.user_id, GREATEST(0, d.pts) FROM ({derived}) AS d
+                        ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(scores.points AS SIGNED) + d.pts);
+                        """,
+                        params
+                    )
+                    await cur.execute(
+                        f"""
+                        INSERT INTO monthly_scores (period, user_id, points)
+                        SELECT %s, d.user_id, GREATEST(0, d.pts) FROM ({derived}) AS d
+                        ON DUPLICATE KEY UPDATE points = GREATEST(0, CAST(monthly_scores.points AS SIGNED) + d.pts);
+                        """,
+                        [period] + params
+                    )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def get_monthly_standings(pool, period: str = None):
+    """Classement d'une période, du meilleur au moins bon : [(user_id, points), ...].
+
+    Lu directement dans l'ordre de l'index (period, points) : pas de tri côté serveur.
+    Une période terminée ne reçoit plus d'écriture, c'est donc un instantané figé.
+    """
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("UPDATE monthly_scores SET points = 0;")
+            await cur.execute(
+                "SELECT user_id, points FROM monthly_scores WHERE period=%s ORDER BY points DESC;",
+                (period or current_period(),)
+            )
+            return await cur.fetchall()
+
+async def get_monthly_periods(pool, limit: int = 25):
+    """Périodes ayant des scores, de la plus récente à la plus ancienne."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT DISTINCT period FROM monthly_scores ORDER BY period DESC LIMIT %s;",
+                (int(limit),)
+            )
+            return [row[0] for row in await cur.fetchall()]
 
 async def get_user_monthly_points(pool, user_id):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("SELECT points FROM monthly_scores WHERE user_id=%s;", (int(user_id),))
+            await cur.execute(
+                "SELECT points FROM monthly_scores WHERE period=%s AND user_id=%s;",
+                (current_period(), int(user_id))
+            )
             row = await cur.fetchone()
             return row[0] if row else 0
 
+# --- Portefeuille Casino ---
+# Le solde jouable = min(points à vie, points du mois) : on ne mise que ce qu'on a sur les deux tableaux
+
+async def get_playable_balance(pool, user_id):
+    """Renvoie (solde jouable, points à vie, points du mois) en une seule requête."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT COALESCE(s.points, 0), COALESCE(m.points, 0)
+                FROM (SELECT %s AS user_id) u
+                LEFT JOIN scores s ON s.user_id = u.user_id
+                LEFT JOIN monthly_scores m ON m.period = %s AND m.user_id = u.user_id;
+                """,
+                (int(user_id), current_period())
+            )
+            lifetime, monthly = await cur.fetchone()
+            return min(lifetime, monthly), lifetime, monthly
+
+async def _debit_both(cur, user_id, stake):
+    """Débit conditionnel (à vie + mois) : les lignes ne sont modifiées que si le solde couvre la mise."""
+    await cur.execute(
+        "UPDATE scores SET points = points - %s WHERE user_id=%s AND points >= %s;",
+        (int(stake), int(user_id), int(stake))
+    )
+    if cur.rowcount != 1:
+        return False
+    await cur.execute(
+        "UPDATE monthly_scores SET points = points - %s WHERE period=%s AND user_id=%s AND points >= %s;",
+        (int(stake), current_period(), int(user_id), int(stake))
+    )
+    # Si le mois ne suit pas, l'appelant annule la transaction (et donc le premier débit)
+    return cur.rowcount == 1
+
+async def debit_stake(pool, user_id, stake, payout=0):
+    """Débite une mise sur les deux tableaux SEULEMENT si le solde jouable suffit (transaction unique).
+
+    `payout` : gain déjà connu (ex : machine à sous) crédité dans la même transaction.
+    Renvoie (succès, solde jouable, points à vie, points du mois) après l'opération.
+    """
+    uid = int(user_id)
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                if await _debit_both(cur, uid, stake):
+                    if payout:
+                        await _apply_points(cur, uid, payout)
+                    await cur.execute(
+                        """
+                        SELECT s.points, m.points FROM scores s
+                        JOIN monthly_scores m ON m.period = %s AND m.user_id = s.user_id
+                        WHERE s.user_id=%s;
+                        """,
+                        (current_period(), uid)
+                    )
+                    lifetime, monthly = await cur.fetchone()
+                    await conn.commit()
+                    return True, min(lifetime, monthly), lifetime, monthly
+
+            await conn.rollback()
+        except Exception:
+            await conn.rollback()
+            raise
+
+    # Solde insuffisant : on renvoie le solde actuel pour le message d'erreur
+    playable, lifetime, monthly = await get_playable_balance(pool, uid)
+    return False, playable, lifetime, monthly
+
+# --- Moteur Casino (manches persistées : jackpot, douille) ---
+
+async def open_casino_round(pool, game, channel_id, host_id, stake, duration_seconds):
+    """Ouvre une manche. Renvoie (round_id, ends_at) ou None si un jackpot tourne déjà dans ce salon.
+
+    Pour la douille, la mise du créateur est débitée dans la même transaction ("funds" si à sec).
+    """
+    ends_at = datetime.now(timezone.utc).replace(tzinfo=None, microsecond=0) + timedelta(seconds=int(duration_seconds))
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO casino_rounds (game, channel_id, host_id, stake, status, ends_at, created_at)
+                    VALUES (%s, %s, %s, %s, 'open', %s, UTC_TIMESTAMP());
+                    """,
+                    (game, int(channel_id), int(host_id), int(stake), ends_at)
+                )
+                round_id = cur.lastrowid
+                if stake:
+                    if not await _debit_both(cur, host_id, stake):
+                        await conn.rollback()
+                        return "funds"
+                    await cur.execute(
+                        "INSERT INTO casino_stakes (round_id, user_id, amount) VALUES (%s, %s, %s);",
+                        (round_id, int(host_id), int(stake))
+                    )
+            await conn.commit()
+            return round_id, ends_at
+        except pymysql.err.IntegrityError:
+            await conn.rollback()
+            return None
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def set_casino_round_message(pool, round_id, message_id):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("UPDATE casino_rounds SET message_id=%s WHERE id=%s;", (int(message_id), int(round_id)))
+
+async def place_casino_stake(pool, round_id, user_id, amount, max_players=None, single_entry=False):
+    """Débite une mise et l'ajoute à une manche ouverte, le tout dans une transaction.
+
+    Renvoie (statut, solde jouable ou None, {user_id: mise}) avec statut parmi
+    "ok", "funds", "closed", "full", "already".
+    """
+    uid = int(user_id)
+    # Unité de travail : get_playable_balance (cas "funds") réutilise cette connexion
+    async with unit_of_work(pool) as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                # La ligne de la manche sert de verrou : les mises d'une même manche passent une par une
+                await cur.execute(
+                    "SELECT status, ends_at > UTC_TIMESTAMP() FROM casino_rounds WHERE id=%s FOR UPDATE;",
+                    (int(round_id),)
+                )
+                row = await cur.fetchone()
+                if not row or row[0] != 'open' or not row[1]:
+                    await conn.rollback()
+                    return "closed", None, {}
+
+                await cur.execute("SELECT user_id, amount FROM casino_stakes WHERE round_id=%s;", (int(round_id),))
+                stakes = {r[0]: r[1] for r in await cur.fetchall()}
+                if single_entry and uid in stakes:
+                    await conn.rollback()
+                    return "already", None, stakes
+                if max_players and uid not in stakes and len(stakes) >= max_players:
+                    await conn.rollback()
+                    return "full", None, stakes
+
+                if not await _debit_both(cur, uid, amount):
+                    await conn.rollback()
+                    playable, _, _ = await get_playable_balance(pool, uid)
+                    return "funds", playable, stakes
+
+                await cur.execute(
+                    """
+                    INSERT INTO casino_stakes (round_id, user_id, amount) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE amount = amount + VALUES(amount);
+                    """,
+                    (int(round_id), uid, int(amount))
+                )
+                stakes[uid] = stakes.get(uid, 0) + int(amount)
+            await conn.commit()
+            return "ok", None, stakes
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def get_casino_stakes(pool, round_id):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT user_id, amount FROM casino_stakes WHERE round_id=%s;", (int(round_id),))
+            return {r[0]: r[1] for r in await cur.fetchall()}
+
+async def get_due_casino_rounds(pool):
+    """Manches ouvertes dont le chrono est écoulé (à résoudre par le scheduler)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                "SELECT id FROM casino_rounds WHERE status='open' AND ends_at <= UTC_TIMESTAMP() ORDER BY ends_at;"
+            )
+            return [r[0] for r in await cur.fetchall()]
+
+async def get_unfinished_casino_rounds(pool):
+    """Manches non terminées au démarrage : (id, game, channel_id, message_id, host_id, stake, status, ends_at)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT id, game, channel_id, message_id, host_id, stake, status, ends_at
+                FROM casino_rounds WHERE status IN ('open', 'resolving');
+                """
+            )
+            return await cur.fetchall()
+
+async def claim_casino_round(pool, round_id):
+    """Ferme une manche ouverte (une seule fois). Renvoie (game, channel_id, message_id, stake, {user_id: mise}) ou None."""
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT game, channel_id, message_id, stake FROM casino_rounds WHERE id=%s AND status='open' FOR UPDATE;",
+                    (int(round_id),)
+                )
+                row = await cur.fetchone()
+                if not row:
+                    await conn.rollback()
+                    return None
+                await cur.execute("UPDATE casino_rounds SET status='resolving' WHERE id=%s;", (int(round_id),))
+                await cur.execute("SELECT user_id, amount FROM casino_stakes WHERE round_id=%s;", (int(round_id),))
+                stakes = {r[0]: r[1] for r in await cur.fetchall()}
+            await conn.commit()
+            return (*row, stakes)
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def settle_casino_round(pool, round_id, payouts, status='resolved'):
+    """Verse les gains {user_id: points} et clôt la manche dans la même transaction.
+
+    Une manche restée en 'resolving' (crash entre claim et settle) sera remboursée au démarrage.
+    """
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "UPDATE casino_rounds SET status=%s WHERE id=%s AND status IN ('open', 'resolving');",
+                    (status, int(round_id))
+                )
+                if cur.rowcount != 1:
+                    # Déjà réglée ailleurs : on ne paie pas deux fois
+                    await conn.rollback()
+                    return False
+                for uid, pts in payouts.items():
+                    if pts:
+                        await _apply_points(cur, uid, pts)
+            await conn.commit()
+            return True
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def log_casino_draws(pool, draws):
+    """Enregistre un lot de tirages [(jeu, graine, n°, résultat), ...] en une requête."""
+    if not draws:
+        return
+    # Horodatage lié en paramètre : un VALUES 100 % %s est regroupé par aiomysql en 1 INSERT multi-lignes
+    drawn_at = datetime.now(timezone.utc).replace(tzinfo=None)
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                "INSERT INTO casino_draws (game, seed, seq, outcome, drawn_at) VALUES (%s, %s, %s, %s, %s);",
+                [(*draw, drawn_at) for draw in draws]
+            )
+
 async def has_daily_limit(pool, user_id, channel_id, date):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
@@ -561,6 +1237,14 @@ async def claim_wake_and_bake(pool, user_id):
             )
 
             return True, streak, final_reward, multiplicateur
+
+async def get_wake_and_bake_last_claim(pool, user_id):
+    """Date (UTC) du dernier /wakeandbake du joueur, ou None."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT last_claim FROM wake_and_bake WHERE user_id = %s;", (int(user_id),))
+            row = await cur.fetchone()
+            return row[0] if row else None
         
 async def get_recent_sales_count(pool, user_id, hours=5):
     """Compte combien de ventes l'utilisateur a fait dans les X dernières heures."""
@@ -573,38 +1257,145 @@ async def get_recent_sales_count(pool, user_id, hours=5):
             row = await cur.fetchone()
             return row[0] if row else 0
 
-async def sell_pokeweed(pool, user_id, pokeweed_id, points):
-    """Supprime UNE copie exacte de la carte et enregistre la vente pour limiter la fraude."""
+async def _incr_pokeweed_count(cur, user_id, pokeweed_id, qty=1):
+    """Met à jour le résumé du Pokédex après l'ajout de copies (à appeler dans la transaction)."""
+    await cur.execute(
+        """
+        INSERT INTO user_pokeweed_counts (user_id, pokeweed_id, count, last_capture)
+        VALUES (%s, %s, %s, NOW())
+        ON DUPLICATE KEY UPDATE count = count + VALUES(count), last_capture = NOW();
+        """,
+        (int(user_id), int(pokeweed_id), int(qty))
+    )
+
+async def _decr_pokeweed_count(cur, user_id, pokeweed_id, qty=1):
+    """Met à jour le résumé du Pokédex après le retrait de copies (à appeler dans la transaction)."""
+    await cur.execute(
+        "UPDATE user_pokeweed_counts SET count = count - %s WHERE user_id=%s AND pokeweed_id=%s;",
+        (int(qty), int(user_id), int(pokeweed_id))
+    )
+    await cur.execute(
+        "DELETE FROM user_pokeweed_counts WHERE user_id=%s AND pokeweed_id=%s AND count <= 0;",
+        (int(user_id), int(pokeweed_id))
+    )
+
+def _invalidate_collection(*user_ids):
+    """Vide le cache d'autocomplétion des joueurs dont la collection vient de changer."""
+    for uid in user_ids:
+        state.pokeweed_collection_cache.pop(int(uid), None)
+
+async def add_pokeweeds(pool, user_id, pokeweed_ids):
+    """Ajoute des cartes (capture, booster) à la collection d'un joueur, résumé compris."""
     async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            # 1. On cherche la date d'une copie pour être sûr de n'en supprimer qu'UNE seule
-            await cur.execute(
-                "SELECT capture_date FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s LIMIT 1;",
-                (int(user_id), int(pokeweed_id))
-            )
-            row = await cur.fetchone()
-            if not row:
-                return False # Il n'a pas (ou plus) la carte
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                for pid in pokeweed_ids:
+                    await cur.execute(
+                        "INSERT INTO user_pokeweeds (user_id, pokeweed_id, capture_date) VALUES (%s, %s, NOW());",
+                        (int(user_id), int(pid))
+                    )
+                    await _incr_pokeweed_count(cur, user_id, pid)
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            # Dans une transaction englobante (booster, capture), le cache n'est vidé qu'après son commit
+            _on_commit(pool, _invalidate_collection, user_id)
 
-            capture_date = row[0]
-            
-            # 2. On supprime cette copie précise
-            await cur.execute(
-                "DELETE FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s AND capture_date=%s LIMIT 1;",
-                (int(user_id), int(pokeweed_id), capture_date)
-            )
-            if cur.rowcount == 0:
-                return False
+# Limite anti-fraude : 10 ventes par tranche de 5 heures
+SALES_QUOTA = 10
+SALES_QUOTA_HOURS = 5
 
-            # 3. On enregistre la vente dans l'historique
-            await cur.execute(
-                "INSERT INTO pokeweed_sales (user_id, pokeweed_id, points_earned, sale_date) VALUES (%s, %s, %s, NOW());",
-                (int(user_id), int(pokeweed_id), int(points))
-            )
+async def sell_cards(pool, user_id, items, points=None):
+    """Vend des copies de cartes en UNE transaction : quota, suppression, historique et crédit des points.
 
-    # 4. On crédite les points via ta fonction existante
-    await add_points(pool, user_id, points)
-    return True
+    items : [(pokeweed_id, quantité), ...] dans l'ordre de priorité (coupé au quota restant).
+    points : prix unitaire, ou None pour utiliser la valeur de capture de chaque carte.
+    Renvoie (statut, cartes vendues, points gagnés, nouveau total, ventes restantes)
+    avec statut = "ok", "quota" ou "missing".
+    """
+    uid = int(user_id)
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                # 1. On verrouille la ligne du joueur : deux ventes simultanées passent l'une après l'autre
+                await cur.execute(
+                    "INSERT INTO scores (user_id, points) VALUES (%s, 0) ON DUPLICATE KEY UPDATE points = points;",
+                    (uid,)
+                )
+                await cur.execute("SELECT points FROM scores WHERE user_id=%s FOR UPDATE;", (uid,))
+                total = (await cur.fetchone())[0]
+
+                # 2. Quota glissant vérifié sous le verrou (plus de double-clic qui passe)
+                # NOW() relu ici : même horloge que le quota pour l'historique, lié en paramètre plus bas
+                await cur.execute(
+                    "SELECT COUNT(*), NOW() FROM pokeweed_sales WHERE user_id=%s AND sale_date >= DATE_SUB(NOW(), INTERVAL %s HOUR);",
+                    (uid, SALES_QUOTA_HOURS)
+                )
+                already_sold, sold_at = await cur.fetchone()
+                remaining = SALES_QUOTA - already_sold
+                if remaining <= 0:
+                    await conn.rollback()
+                    return "quota", 0, 0, total, 0
+
+                sold = 0
+                earned = 0
+                for pid, qty in items:
+                    qty = min(int(qty), remaining - sold)
+                    if qty <= 0:
+                        break
+
+                    # 3. On verrouille des copies précises (copy_id) puis on les supprime
+                    await cur.execute(
+                        "SELECT copy_id FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s ORDER BY copy_id LIMIT %s FOR UPDATE;",
+                        (uid, int(pid), qty)
+                    )
+                    copy_ids = [r[0] for r in await cur.fetchall()]
+                    if not copy_ids:
+                        continue # Il n'a pas (ou plus) la carte
+
+                    if points is None:
+                        await cur.execute("SELECT capture_points FROM pokeweeds WHERE id=%s;", (int(pid),))
+                        unit = (await cur.fetchone())[0]
+                    else:
+                        unit = int(points)
+
+                    placeholders = ", ".join(["%s"] * len(copy_ids))
+                    await cur.execute(f"DELETE FROM user_pokeweeds WHERE copy_id IN ({placeholders});", copy_ids)
+                    await _decr_pokeweed_count(cur, uid, pid, len(copy_ids))
+
+                    # 4. Historique des ventes (1 ligne par carte pour le quota), en 1 INSERT multi-lignes
+                    await cur.executemany(
+                        "INSERT INTO pokeweed_sales (user_id, pokeweed_id, points_earned, sale_date) VALUES (%s, %s, %s, %s);",
+                        [(uid, int(pid), unit, sold_at)] * len(copy_ids)
+                    )
+                    sold += len(copy_ids)
+                    earned += unit * len(copy_ids)
+
+                if sold == 0:
+                    await conn.rollback()
+                    return "missing", 0, 0, total, remaining
+
+                # 5. Crédit des points (à vie + mois) dans la même transaction
+                await cur.execute("UPDATE scores SET points = points + %s WHERE user_id=%s;", (earned, uid))
+                await cur.execute(
+                    """
+                    INSERT INTO monthly_scores (period, user_id, points) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE points = points + VALUES(points);
+                    """,
+                    (current_period(), uid, earned)
+                )
+            await conn.commit()
+        except Exception:
+            await conn.rollback()
+            raise
+        finally:
+            _on_commit(pool, _invalidate_collection, uid)
+
+    return "ok", sold, earned, total + earned, remaining - sold
 
 async def get_weekly_live_count(pool, user_id):
     """Vérifie combien de lives ont été annoncés dans les 7 derniers jours."""
@@ -630,13 +1421,25 @@ async def get_user_pokeweeds_unique(pool, user_id):
     """Récupère la liste des cartes uniques d'un joueur avec la rareté pour l'autocomplétion"""
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            # On ajoute p.rarity ici !
+            # Lecture directe du résumé (plus de GROUP BY sur toutes les copies)
+            await cur.execute("""
+                SELECT p.id, p.name, p.rarity, c.count
+                FROM user_pokeweed_counts c
+                JOIN pokeweeds p ON c.pokeweed_id = p.id
+                WHERE c.user_id=%s;
+            """, (int(user_id),))
+            return await cur.fetchall()
+
+async def get_user_pokedex(pool, user_id):
+    """Récupère le Pokédex complet d'un joueur (stats de chaque carte, quantité, dernière capture)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
             await cur.execute("""
-                SELECT p.id, p.name, p.rarity, COUNT(*) as total 
-                FROM user_pokeweeds up 
-                JOIN pokeweeds p ON up.pokeweed_id = p.id 
-                WHERE up.user_id=%s 
-                GROUP BY p.id;
+                SELECT p.id, p.name, p.hp, p.capture_points, p.power, p.rarity,
+                    c.count, c.last_capture
+                FROM user_pokeweed_counts c
+                JOIN pokeweeds p ON c.pokeweed_id = p.id
+                WHERE c.user_id=%s;
             """, (int(user_id),))
             return await cur.fetchall()
 
@@ -644,180 +1447,315 @@ async def get_specific_pokeweed_count(pool, user_id, pokeweed_id):
     """Compte combien d'exemplaires d'une carte possède un joueur"""
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
-            await cur.execute("SELECT COUNT(*) FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s;", (int(user_id), int(pokeweed_id)))
+            await cur.execute("SELECT count FROM user_pokeweed_counts WHERE user_id=%s AND pokeweed_id=%s;", (int(user_id), int(pokeweed_id)))
             row = await cur.fetchone()
             return row[0] if row else 0
 
-async def execute_trade(pool, u1_id, p1_id, u2_id, p2_id):
-    """Transaction SQL sécurisée : Échange les 2 cartes. Renvoie True si succès, False si triche."""
+async def get_pokeweed_names(pool, pokeweed_ids):
+    """Renvoie {pokeweed_id: nom} pour plusieurs cartes en une seule requête."""
+    ids = [int(pid) for pid in pokeweed_ids]
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(f"SELECT id, name FROM pokeweeds WHERE id IN ({placeholders});", ids)
+            return {row[0]: row[1] for row in await cur.fetchall()}
+
+async def get_pokeweed_counts(pool, user_id, pokeweed_ids):
+    """Renvoie {pokeweed_id: quantité} pour plusieurs cartes d'un joueur en une seule requête."""
+    ids = [int(pid) for pid in pokeweed_ids]
+    if not ids:
+        return {}
+    placeholders = ", ".join(["%s"] * len(ids))
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                f"SELECT pokeweed_id, count FROM user_pokeweed_counts WHERE user_id=%s AND pokeweed_id IN ({placeholders});",
+                (int(user_id), *ids)
+            )
+            found = {row[0]: row[1] for row in await cur.fetchall()}
+    return {pid: found.get(pid, 0) for pid in ids}
+
+# Codes MySQL sur lesquels une transaction peut simplement être rejouée
+# (1213 = deadlock détecté, 1205 = lock wait timeout)
+RETRYABLE_MYSQL_ERRORS = (1213, 1205)
+TRADE_MAX_ATTEMPTS = 3
+
+def _bundle(cards):
+    """Normalise un lot de cartes : liste d'ids (doublons = plusieurs copies) ou {pokeweed_id: quantité}."""
+    if isinstance(cards, dict):
+        items = cards.items()
+    else:
+        items = {}
+        for pid in cards:
+            items[int(pid)] = items.get(int(pid), 0) + 1
+        items = items.items()
+    return {int(pid): int(qty) for pid, qty in items if int(qty) > 0}
+
+async def _trade_once(pool, u1_id, cards1, u2_id, cards2):
     async with pool.acquire() as conn:
-        # On démarre une transaction stricte
         await conn.begin()
         try:
             async with conn.cursor() as cur:
-                # 1. On cherche la copie exacte (via sa date) du Joueur 1
-                await cur.execute("SELECT capture_date FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s LIMIT 1 FOR UPDATE;", (int(u1_id), int(p1_id)))
-                row1 = await cur.fetchone()
-                if not row1:
-                    await conn.rollback()
-                    return False
-                date1 = row1[0]
+                # 1. Verrouillage dans un ordre canonique (user_id puis pokeweed_id) :
+                #    deux échanges croisés prennent les verrous dans le même ordre => pas d'interblocage
+                wanted = [(int(u1_id), pid, qty) for pid, qty in cards1.items()]
+                wanted += [(int(u2_id), pid, qty) for pid, qty in cards2.items()]
+                wanted.sort()
 
-                # 2. On cherche la copie exacte du Joueur 2
-                await cur.execute("SELECT capture_date FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s LIMIT 1 FOR UPDATE;", (int(u2_id), int(p2_id)))
-                row2 = await cur.fetchone()
-                if not row2:
-                    await conn.rollback()
-                    return False
-                date2 = row2[0]
+                locked = {}
+                for uid, pid, qty in wanted:
+                    await cur.execute(
+                        "SELECT copy_id FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s ORDER BY copy_id LIMIT %s FOR UPDATE;",
+                        (uid, pid, qty)
+                    )
+                    rows = await cur.fetchall()
+                    if len(rows) < qty:
+                        # Quelqu'un n'a plus assez d'exemplaires
+                        await conn.rollback()
+                        return False
+                    locked[(uid, pid)] = [r[0] for r in rows]
 
-                # 3. On supprime les anciennes copies
-                await cur.execute("DELETE FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s AND capture_date=%s LIMIT 1;", (int(u1_id), int(p1_id), date1))
-                await cur.execute("DELETE FROM user_pokeweeds WHERE user_id=%s AND pokeweed_id=%s AND capture_date=%s LIMIT 1;", (int(u2_id), int(p2_id), date2))
-
-                # 4. On insère les nouvelles cartes en croisant les proprios
-                await cur.execute("INSERT INTO user_pokeweeds (user_id, pokeweed_id, capture_date) VALUES (%s, %s, NOW());", (int(u2_id), int(p1_id)))
-                await cur.execute("INSERT INTO user_pokeweeds (user_id, pokeweed_id, capture_date) VALUES (%s, %s, NOW());", (int(u1_id), int(p2_id)))
+                # 2. Les copies changent simplement de propriétaire (elles gardent leur copy_id)
+                for (uid, pid), copy_ids in locked.items():
+                    new_owner = int(u2_id) if uid == int(u1_id) else int(u1_id)
+                    placeholders = ", ".join(["%s"] * len(copy_ids))
+                    await cur.execute(
+                        f"UPDATE user_pokeweeds SET user_id=%s WHERE copy_id IN ({placeholders});",
+                        (new_owner, *copy_ids)
+                    )
+                    await _decr_pokeweed_count(cur, uid, pid, len(copy_ids))
+                    await _incr_pokeweed_count(cur, new_owner, pid, len(copy_ids))
 
             # Si on arrive ici sans erreur, on valide tout d'un coup !
             await conn.commit()
             return True
-        except Exception as e:
+        except Exception:
             await conn.rollback()
-            logger.error(f"Erreur transaction échange : {e}")
-            return False
+            raise
+
+async def execute_trade_bundle(pool, u1_id, cards1, u2_id, cards2):
+    """Échange atomique de deux lots de cartes. Renvoie True si succès, False si une carte manque ou erreur."""
+    cards1, cards2 = _bundle(cards1), _bundle(cards2)
+    if not cards1 or not cards2:
+        return False
+
+    try:
+        for attempt in range(1, TRADE_MAX_ATTEMPTS + 1):
+            try:
+                return await _trade_once(pool, u1_id, cards1, u2_id, cards2)
+            except pymysql.err.OperationalError as e:
+                if e.args and e.args[0] in RETRYABLE_MYSQL_ERRORS and attempt < TRADE_MAX_ATTEMPTS:
+                    logger.warning("Échange %s/%s : verrou en conflit (%s), nouvel essai %s", u1_id, u2_id, e.args[0], attempt + 1)
+                    await asyncio.sleep(random.uniform(0.05, 0.2) * attempt)
+                    continue
+                raise
+    except Exception as e:
+        logger.error(f"Erreur transaction échange : {e}")
+        return False
+    finally:
+        _invalidate_collection(u1_id, u2_id)
+
+async def execute_trade(pool, u1_id, p1_id, u2_id, p2_id, qty1=1, qty2=1):
+    """Transaction SQL sécurisée : Échange les cartes. Renvoie True si succès, False si triche."""
+    return await execute_trade_bundle(pool, u1_id, {p1_id: qty1}, u2_id, {p2_id: qty2})
         
 # Planning Pro functions
-        
-async def add_pro_slot(pool, date_obj, heure):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("INSERT INTO planning_pro (slot_date, heure) VALUES (%s, %s);", (date_obj, heure))
+# Les créneaux sont datés par `starts_at` (heure locale de Paris, sans fuseau) : tous les filtres
+# "à partir d'aujourd'hui" sont des plages sur l'index (starts_at, est_reserve).
 
-async def get_available_pro_slots(pool):
-    """Récupère les créneaux libres à partir d'aujourd'hui"""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT id, slot_date, heure FROM planning_pro WHERE est_reserve = FALSE AND slot_date >= CURDATE() ORDER BY slot_date ASC, heure ASC;")
-            return await cur.fetchall()
+try:
+    PLANNING_TZ = zoneinfo.ZoneInfo("Europe/Paris")
+except Exception:
+    # Plan B si le serveur hébergeur ne connaît pas l'heure de Paris (tzdata manquant)
+    PLANNING_TZ = timezone(timedelta(hours=1))
 
-async def get_reserved_pro_slots(pool, animateur_id=None):
-    """Récupère les créneaux réservés (pour pouvoir annuler)"""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            if animateur_id:
-                await cur.execute("SELECT id, slot_date, heure, titre FROM planning_pro WHERE est_reserve = TRUE AND slot_date >= CURDATE() AND animateur_id = %s ORDER BY slot_date ASC;", (int(animateur_id),))
-            else:
-                await cur.execute("SELECT id, slot_date, heure, titre FROM planning_pro WHERE est_reserve = TRUE AND slot_date >= CURDATE() ORDER BY slot_date ASC;")
-            return await cur.fetchall()
+_SLOT_TIME = re.compile(r"(\d{1,2})(?:[hH:](\d{2}))?")
 
-async def reserve_pro_slot(pool, slot_id, animateur_id, titre, description):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE planning_pro SET est_reserve = TRUE, animateur_id = %s, titre = %s, description = %s WHERE id = %s;",
-                (int(animateur_id), titre, description, int(slot_id))
-            )
+def parse_slot_time(heure):
+    """(heure, minute) d'une saisie libre ("21h30", "21:30", "21h"), None si illisible."""
+    match = _SLOT_TIME.search(heure or "")
+    if not match:
+        return None
+    h, m = int(match.group(1)), int(match.group(2) or 0)
+    if h > 23 or m > 59:
+        return None
+    return h, m
 
-async def cancel_pro_slot(pool, slot_id):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE planning_pro SET est_reserve = FALSE, animateur_id = NULL, titre = NULL, description = NULL WHERE id = %s;",
-                (int(slot_id),)
-            )
+def slot_start(slot_date, heure) -> datetime:
+    """Début du créneau (naïf, heure de Paris). Une heure illisible tombe à minuit, comme avant."""
+    h, m = parse_slot_time(heure) or (0, 0)
+    return datetime.combine(slot_date, datetime.min.time()).replace(hour=h, minute=m)
 
-async def get_rolling_planning(pool):
-    """Récupère tout ce qui est prévu (ou libre) à partir d'aujourd'hui"""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT id, slot_date, heure, est_reserve, animateur_id, titre, description FROM planning_pro WHERE slot_date >= CURDATE() ORDER BY slot_date ASC, heure ASC;")
-            return await cur.fetchall()
+def planning_today() -> datetime:
+    """Minuit aujourd'hui (heure de Paris) : borne basse des requêtes "à partir d'aujourd'hui"."""
+    return datetime.combine(datetime.now(PLANNING_TZ).date(), datetime.min.time())
 
-async def get_pro_slot_by_id(pool, slot_id):
-    """Récupère les infos d'un créneau précis pour les annonces"""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT slot_date, heure, titre FROM planning_pro WHERE id = %s;", (int(slot_id),))
-            return await cur.fetchone()
-        
-async def delete_pro_slot(pool, slot_id):
-    """Supprime définitivement un créneau de la base de données."""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("DELETE FROM planning_pro WHERE id = %s;", (int(slot_id),))
 
-async def get_all_future_pro_slots(pool):
-    """Récupère tous les créneaux futurs (libres ET réservés) pour l'autocomplétion de suppression."""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "SELECT id, slot_date, heure, est_reserve, titre FROM planning_pro WHERE slot_date >= CURDATE() ORDER BY slot_date ASC, heure ASC;"
-            )
-            return await cur.fetchall()
-        
-async def get_public_events(pool):
-    """Récupère les événements réservés à venir pour le panneau public."""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT slot_date, heure, animateur_id, titre, description 
-                FROM planning_pro 
-                WHERE est_reserve = TRUE AND slot_date >= CURDATE() 
-                ORDER BY slot_date ASC, heure ASC;
-            """)
-            return await cur.fetchall()
-        
+class PlanningSlot:
+    """Un créneau du planning (ligne légère : attributs fixes, pas de __dict__ par ligne)."""
 
-async def reserve_pro_slot(pool, slot_id, animateur_id, titre, description, event_id=None):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE planning_pro SET est_reserve = TRUE, animateur_id = %s, titre = %s, description = %s, event_id = %s WHERE id = %s;",
-                (int(animateur_id), titre, description, event_id, int(slot_id))
-            )
+    __slots__ = ("id", "starts_at", "heure", "est_reserve", "animateur_id", "titre", "description", "event_id")
 
-async def cancel_pro_slot(pool, slot_id):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute(
-                "UPDATE planning_pro SET est_reserve = FALSE, animateur_id = NULL, titre = NULL, description = NULL, event_id = NULL WHERE id = %s;",
-                (int(slot_id),)
-            )
+    def __init__(self, id, starts_at, heure, est_reserve, animateur_id, titre, description, event_id):
+        self.id = id
+        self.starts_at = starts_at
+        self.heure = heure
+        self.est_reserve = bool(est_reserve)
+        self.animateur_id = animateur_id
+        self.titre = titre
+        self.description = description
+        self.event_id = event_id
 
-async def get_pro_slot_by_id(pool, slot_id):
-    """Récupère les infos d'un créneau précis pour les annonces"""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT slot_date, heure, titre, event_id FROM planning_pro WHERE id = %s;", (int(slot_id),))
-            return await cur.fetchone()
+    def __repr__(self):
+        return f"<PlanningSlot {self.id} {self.starts_at:%d/%m %H:%M} {'réservé' if self.est_reserve else 'libre'}>"
+
+
+class PlanningRepository:
+    """Toutes les requêtes du planning staff (table planning_pro), rendues en `PlanningSlot`.
+
+    Les SELECT sont construits une seule fois au chargement du module (cache d'instructions) ;
+    c'est aussi l'endroit unique où brancher un cache de résultats plus tard.
+    """
+
+    __slots__ = ("pool",)
+
+    # Filtres des lectures (toutes triées par starts_at, sur l'index (starts_at, est_reserve))
+    _WHERE = {
+        "by_id": "id = %s",
+        "upcoming": "starts_at >= %s",
+        "available": "starts_at >= %s AND est_reserve = FALSE",
+        "reserved": "starts_at >= %s AND est_reserve = TRUE",
+        "reserved_by": "starts_at >= %s AND est_reserve = TRUE AND animateur_id = %s",
+        "window": "starts_at >= %s AND starts_at < %s",
+    }
+    _STATEMENTS = {
+        name: f"SELECT {', '.join(PlanningSlot.__slots__)} FROM planning_pro WHERE {where} ORDER BY starts_at ASC;"
+        for name, where in _WHERE.items()
+    }
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def _select(self, statement, params):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(self._STATEMENTS[statement], params)
+                return [PlanningSlot(*row) for row in await cur.fetchall()]
+
+    async def _write(self, sql, params):
+        async with self.pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+
+    # --- Lectures ---
+
+    async def get(self, slot_id):
+        """Un créneau précis (ou None)."""
+        rows = await self._select("by_id", (int(slot_id),))
+        return rows[0] if rows else None
+
+    async def upcoming(self):
+        """Tout ce qui est prévu (ou libre) à partir d'aujourd'hui."""
+        return await self._select("upcoming", (planning_today(),))
+
+    async def available(self):
+        """Créneaux libres à partir d'aujourd'hui."""
+        return await self._select("available", (planning_today(),))
+
+    async def reserved(self, animateur_id=None):
+        """Créneaux réservés à partir d'aujourd'hui (ceux d'un animateur si précisé) : panneau public, annulations."""
+        if animateur_id:
+            return await self._select("reserved_by", (planning_today(), int(animateur_id)))
+        return await self._select("reserved", (planning_today(),))
+
+    async def window(self, start: datetime, end: datetime):
+        """Tous les créneaux de [start, end[, en une seule lecture de plage."""
+        return await self._select("window", (start, end))
+
+    # --- Écritures ---
+
+    async def add(self, date_obj, heure):
+        await self._write(
+            "INSERT INTO planning_pro (slot_date, heure, starts_at) VALUES (%s, %s, %s);",
+            (date_obj, heure, slot_start(date_obj, heure))
+        )
+
+    async def reserve(self, slot_id, animateur_id, titre, description, event_id=None):
+        await self._write(
+            "UPDATE planning_pro SET est_reserve = TRUE, animateur_id = %s, titre = %s, description = %s, event_id = %s WHERE id = %s;",
+            (int(animateur_id), titre, description, event_id, int(slot_id))
+        )
+
+    async def cancel(self, slot_id):
+        await self._write(
+            "UPDATE planning_pro SET est_reserve = FALSE, animateur_id = NULL, titre = NULL, description = NULL, event_id = NULL WHERE id = %s;",
+            (int(slot_id),)
+        )
+
+    async def delete(self, slot_id):
+        """Supprime définitivement un créneau."""
+        await self._write("DELETE FROM planning_pro WHERE id = %s;", (int(slot_id),))
 
-async def get_public_events(pool):
-    """Récupère les événements réservés à venir pour le panneau public."""
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("""
-                SELECT slot_date, heure, animateur_id, titre, description, event_id 
-                FROM planning_pro 
-                WHERE est_reserve = TRUE AND slot_date >= CURDATE() 
-                ORDER BY slot_date ASC, heure ASC;
-            """)
-            return await cur.fetchall()
-        
 # --- FONCTIONS POUR LE SYSTÈME DE RELANCE ---
 async def get_inactive_users_stats(pool, categorie="vie"):
     """Récupère les joueurs à 0 point avec leurs stats de relance."""
-    table = "scores" if categorie == "vie" else "monthly_scores"
+    # Mois : tous les joueurs déjà classés, à 0 ou absents de la période en cours
+    scores = "scores s" if categorie == "vie" else (
+        "(SELECT a.user_id, COALESCE(m.points, 0) AS points FROM scores a "
+        "LEFT JOIN monthly_scores m ON m.period = %s AND m.user_id = a.user_id) s"
+    )
+    params = () if categorie == "vie" else (current_period(),)
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
             await cur.execute(f"""
                 SELECT s.user_id, t.send_count, t.last_sent 
-                FROM {table} s
+                FROM {scores}
                 LEFT JOIN mp_revient_tracking t ON s.user_id = t.user_id
                 WHERE s.points = 0;
-            """)
+            """, params)
             return await cur.fetchall()
 
+async def get_mp_revient_candidates(pool, members):
+    """Candidats d'une campagne, triés, en 1 requête : [(user_id, pts vie, pts mois, envois, dernier envoi), ...].
+
+    members : [(user_id, joined_at), ...] des membres (non bots) du serveur.
+    Ordre : jamais relancés d'abord, puis à 0 pt, puis les plus anciens arrivés. Les désabonnés sont exclus.
+    """
+    if not members:
+        return []
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            # Les membres du serveur ne vivent que dans le cache Discord : on les pose dans une table temporaire
+            await cur.execute("""
+                CREATE TEMPORARY TABLE IF NOT EXISTS tmp_mp_members (
+                    user_id BIGINT PRIMARY KEY,
+                    joined_at DATETIME
+                ) ENGINE=MEMORY;
+            """)
+            try:
+                await cur.execute("DELETE FROM tmp_mp_members;")
+                await cur.executemany(
+                    "INSERT IGNORE INTO tmp_mp_members (user_id, joined_at) VALUES (%s, %s);",
+                    [(int(uid), joined) for uid, joined in members]
+                )
+                await cur.execute("""
+                    SELECT m.user_id, COALESCE(s.points, 0), COALESCE(ms.points, 0),
+                           COALESCE(t.send_count, 0), t.last_sent
+                    FROM tmp_mp_members m
+                    LEFT JOIN mp_optout o ON o.user_id = m.user_id
+                    LEFT JOIN scores s ON s.user_id = m.user_id
+                    LEFT JOIN monthly_scores ms ON ms.period = %s AND ms.user_id = m.user_id
+                    LEFT JOIN mp_revient_tracking t ON t.user_id = m.user_id
+                    WHERE o.user_id IS NULL
+                    ORDER BY COALESCE(t.send_count, 0) > 0, COALESCE(s.points, 0) > 0, m.joined_at IS NOT NULL, m.joined_at;
+                """, (current_period(),))
+                return await cur.fetchall()
+            finally:
+                # La connexion retourne au pool : on ne laisse rien traîner
+                await cur.execute("DROP TEMPORARY TABLE IF EXISTS tmp_mp_members;")
+
 async def log_mp_revient(pool, user_id):
     """Enregistre qu'on vient d'envoyer un MP de relance à ce joueur."""
     async with pool.acquire() as conn:
@@ -850,4 +1788,202 @@ async def get_all_optouts(pool):
     async with pool.acquire() as conn:
         async with conn.cursor() as cur:
             await cur.execute("SELECT user_id FROM mp_optout;")
-            return {row[0] for row in await cur.fetchall()}
\ No newline at end of file
+            return {row[0] for row in await cur.fetchall()}
+
+# --- FILE D'ENVOI DES MPs (campagnes persistées, reprises au redémarrage) ---
+async def create_dm_campaign(pool, kind, guild_id, payload, targets, created_by=None):
+    """Crée une campagne et sa file d'envoi. targets : [(user_id, payload perso ou None), ...]. Renvoie l'id."""
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    INSERT INTO dm_campaigns (kind, guild_id, payload, total, created_by, created_at)
+                    VALUES (%s, %s, %s, %s, %s, NOW());
+                    """,
+                    (kind, int(guild_id) if guild_id else None, json.dumps(payload or {}), len(targets),
+                     int(created_by) if created_by else None)
+                )
+                campaign_id = cur.lastrowid
+                # VALUES uniquement en %s : aiomysql regroupe alors tout le lot en un seul INSERT multi-lignes
+                # (status 'pending' et attempts 0 viennent des valeurs par défaut de la table)
+                await cur.executemany(
+                    "INSERT INTO dm_queue (campaign_id, user_id, payload) VALUES (%s, %s, %s);",
+                    [(campaign_id, int(uid), json.dumps(extra) if extra else None) for uid, extra in targets]
+                )
+            await conn.commit()
+            return campaign_id
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def fetch_pending_dms(pool, limit=50):
+    """Prochains MPs à envoyer : (queue_id, campaign_id, kind, guild_id, payload campagne, user_id, payload perso, essais)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT q.id, q.campaign_id, c.kind, c.guild_id, c.payload, q.user_id, q.payload, q.attempts
+                FROM dm_queue q
+                JOIN dm_campaigns c ON c.id = q.campaign_id
+                WHERE q.status = 'pending'
+                ORDER BY q.id
+                LIMIT %s;
+                """,
+                (int(limit),)
+            )
+            return await cur.fetchall()
+
+async def mark_dm_results(pool, results):
+    """Enregistre un lot de résultats [(statut, erreur, queue_id), ...] en une requête."""
+    if not results:
+        return
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                """
+                UPDATE dm_queue SET status=%s, error=%s, attempts = attempts + 1,
+                    sent_at = IF(%s = 'sent', NOW(), sent_at)
+                WHERE id=%s;
+                """,
+                [(status, error, status, qid) for status, error, qid in results]
+            )
+
+async def get_dm_campaign_progress(pool, campaign_id):
+    """Renvoie (kind, total, {statut: nombre}, {erreur: nombre}) d'une campagne."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT kind, total FROM dm_campaigns WHERE id=%s;", (int(campaign_id),))
+            kind, total = await cur.fetchone()
+            await cur.execute(
+                "SELECT status, error, COUNT(*) FROM dm_queue WHERE campaign_id=%s GROUP BY status, error;",
+                (int(campaign_id),)
+            )
+            by_status, by_error = {}, {}
+            for status, error, count in await cur.fetchall():
+                by_status[status] = by_status.get(status, 0) + count
+                if error:
+                    by_error[error] = by_error.get(error, 0) + count
+            return kind, total, by_status, by_error
+
+async def finish_dm_campaigns(pool):
+    """Clôt les campagnes qui n'ont plus rien en attente. Renvoie leurs ids."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT c.id FROM dm_campaigns c
+                WHERE c.finished_at IS NULL
+                AND NOT EXISTS (SELECT 1 FROM dm_queue q WHERE q.campaign_id = c.id AND q.status = 'pending');
+                """
+            )
+            ids = [r[0] for r in await cur.fetchall()]
+            if ids:
+                placeholders = ", ".join(["%s"] * len(ids))
+                await cur.execute(f"UPDATE dm_campaigns SET finished_at = NOW() WHERE id IN ({placeholders});", ids)
+            return ids
+
+# --- QUIZ ENFUMÉ ---
+async def pop_quiz_question(pool, channel_id, bank_version, new_cycle):
+    """Tire la prochaine question du cycle de ce salon (verrouillé : 2 quiz simultanés ne tirent pas la même).
+
+    new_cycle() renvoie une nouvelle liste mélangée d'index quand le cycle est fini
+    ou que la banque de questions a changé (bank_version).
+    """
+    async with pool.acquire() as conn:
+        await conn.begin()
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT bank_version, remaining FROM quiz_rotation WHERE channel_id=%s FOR UPDATE;",
+                    (int(channel_id),)
+                )
+                row = await cur.fetchone()
+                remaining = json.loads(row[1]) if row and row[0] == bank_version else []
+                if not remaining:
+                    remaining = new_cycle()
+                q_index = remaining.pop()
+                await cur.execute(
+                    """
+                    INSERT INTO quiz_rotation (channel_id, bank_version, remaining) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE bank_version = VALUES(bank_version), remaining = VALUES(remaining);
+                    """,
+                    (int(channel_id), bank_version, json.dumps(remaining))
+                )
+            await conn.commit()
+            return q_index
+        except Exception:
+            await conn.rollback()
+            raise
+
+async def record_quiz_stats(pool, stats):
+    """Cumule les réponses au quiz : {user_id: (bonnes, mauvaises, points)}, en 1 requête."""
+    if not stats:
+        return
+    answered_at = datetime.now(timezone.utc).replace(tzinfo=None)  # UTC naïf, comme log_casino_draws
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                """
+                INSERT INTO quiz_stats (user_id, correct, wrong, points, last_answer) VALUES (%s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE correct = correct + VALUES(correct), wrong = wrong + VALUES(wrong),
+                    points = points + VALUES(points), last_answer = VALUES(last_answer);
+                """,
+                # last_answer lié en paramètre (pas de NOW()) : aiomysql peut regrouper le lot en 1 requête
+                [(int(uid), correct, wrong, pts, answered_at) for uid, (correct, wrong, pts) in stats.items()]
+            )
+
+# --- SAUVEGARDES / RESTAURATION ---
+
+# Tables sauvegardées chaque nuit et leurs colonnes (ordre = ordre des lignes dans le fichier)
+BACKUP_TABLES = {
+    "scores": ("user_id", "points"),
+    "monthly_scores": ("period", "user_id", "points"),
+    "wake_and_bake": ("user_id", "last_claim", "streak"),
+    "user_pokeweeds": ("copy_id", "user_id", "pokeweed_id", "capture_date"),
+}
+
+async def stream_backup_rows(pool, table, batch=1000):
+    """Lit une table par paquets via un curseur serveur non bufferisé (mémoire constante)."""
+    columns = ", ".join(BACKUP_TABLES[table])
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(f"SELECT {columns} FROM {table};")
+            while True:
+                rows = await cur.fetchmany(batch)
+                if not rows:
+                    break
+                yield rows
+
+async def clear_backup_tables(pool, tables):
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            for table in tables:
+                if table not in BACKUP_TABLES:
+                    raise ValueError(f"Table non sauvegardée : {table}")
+                await cur.execute(f"DELETE FROM {table};")
+            if "user_pokeweeds" in tables:
+                await cur.execute("DELETE FROM user_pokeweed_counts;")
+
+async def insert_backup_rows(pool, table, rows):
+    """Chargement en masse : executemany regroupe les lignes en INSERT multi-valeurs."""
+    columns = BACKUP_TABLES[table]
+    placeholders = ", ".join(["%s"] * len(columns))
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.executemany(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders});",
+                rows
+            )
+
+async def rebuild_pokeweed_counts(pool):
+    """Recalcule le résumé du Pokédex à partir des copies (après une restauration)."""
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute("""
+                INSERT INTO user_pokeweed_counts (user_id, pokeweed_id, count, last_capture)
+                SELECT user_id, pokeweed_id, COUNT(*), MAX(capture_date)
+                FROM user_pokeweeds
+                GROUP BY user_id, pokeweed_id;
+            """)
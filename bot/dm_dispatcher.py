@@ -0,0 +1,244 @@
+"""File d'envoi des MPs en masse (campagnes /mp_revient, rappels Wake & Bake).
+
+La file est en base (dm_campaigns / dm_queue) : un redémarrage reprend là où on s'était arrêté.
+Les envois passent par quelques workers, espacés par un rythme global qui ralentit
+tout seul quand Discord renvoie un 429 (en-têtes Retry-After / X-RateLimit-Reset-After).
+"""
+import asyncio
+import json
+import logging
+import time
+
+import discord
+
+from . import config, database, helpers
+
+logger = logging.getLogger(__name__)
+
+DM_WORKERS = 3          # Envois en parallèle max
+DM_MIN_INTERVAL = 1.0   # 1 MP par seconde max, tous workers confondus
+DM_MAX_ATTEMPTS = 3
+DM_BATCH = 50
+DM_RETRY_MAX = 60.0     # Attente max entre deux essais quand la base ne répond pas (secondes)
+
+# kind -> (render, on_sent, titre du rapport ou None)
+_kinds = {}
+_bot = None
+_runner = None
+_rerun = False  # Réveil reçu pendant que le runner tournait : il relit la file avant de s'arrêter
+_next_slot = 0.0
+_progress = {}  # {campaign_id: (CoalescingEditor, {"embed": ...})} pour les campagnes avec rapport
+
+
+def register_kind(kind: str, render, on_sent=None, report_title: str = None):
+    """Déclare un type de MP.
+
+    render(target, guild, payload) -> kwargs de `send` (payload = campagne + perso fusionnés),
+    ou None si le MP n'a plus lieu d'être (il est alors abandonné sans rien envoyer).
+    on_sent(user_id) est appelé après un envoi réussi. Avec report_title, la progression
+    et le rapport final sont postés dans le salon de modération.
+    """
+    _kinds[kind] = (render, on_sent, report_title)
+
+def estimated_minutes(count: int) -> float:
+    return count * DM_MIN_INTERVAL / 60
+
+async def enqueue(kind: str, guild_id, targets, payload=None, created_by=None) -> int:
+    """Ajoute une campagne à la file (targets : [(user_id, payload perso ou None), ...]) et lance l'envoi."""
+    campaign_id = await database.create_dm_campaign(database.db_pool, kind, guild_id, payload, targets, created_by)
+    logger.info(f"🚀 [MP] Campagne {campaign_id} ({kind}) : {len(targets)} membres en file.")
+    if _kinds.get(kind, (None, None, None))[2]:
+        await _start_progress(campaign_id)
+    _wake()
+    return campaign_id
+
+async def start(bot: discord.Client):
+    """Au démarrage : reprend les campagnes non terminées."""
+    global _bot
+    _bot = bot
+    _wake()
+
+def _wake():
+    global _runner, _rerun
+    if _bot is None:
+        return
+    _rerun = True
+    if _runner is None or _runner.done():
+        _runner = asyncio.create_task(_run())
+
+
+# --- Rythme global (adapté aux limites Discord) ---
+
+async def _pace():
+    """Réserve le prochain créneau d'envoi et attend qu'il arrive."""
+    global _next_slot
+    now = time.monotonic()
+    slot = max(now, _next_slot)
+    _next_slot = slot + DM_MIN_INTERVAL
+    if slot > now:
+        await asyncio.sleep(slot - now)
+
+def _retry_after(e: discord.HTTPException) -> float:
+    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+    for key in ("Retry-After", "X-RateLimit-Reset-After"):
+        try:
+            return float(headers[key])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return 5.0
+
+def _pause(seconds: float):
+    """Repousse TOUS les envois (limite atteinte)."""
+    global _next_slot
+    _next_slot = max(_next_slot, time.monotonic() + seconds)
+
+
+# --- Envoi ---
+
+async def _resolve_target(guild, user_id):
+    # Cache des membres d'abord (intent members), l'API seulement en dernier recours
+    target = guild.get_member(user_id) if guild else None
+    if target is None:
+        target = _bot.get_user(user_id)
+    if target is None:
+        try:
+            target = await _bot.fetch_user(user_id)
+        except discord.HTTPException:
+            return None
+    return target
+
+async def _send_one(row, sem: asyncio.Semaphore):
+    qid, campaign_id, kind, guild_id, campaign_payload, user_id, extra, attempts = row
+    render, on_sent, _ = _kinds.get(kind, (None, None, None))
+    if render is None:
+        return ("failed", "type inconnu", qid)
+
+    async with sem:
+        guild = _bot.get_guild(guild_id) if guild_id else None
+        target = await _resolve_target(guild, user_id)
+        if target is None:
+            return ("failed", "membre introuvable", qid)
+
+        payload = json.loads(campaign_payload or "{}")
+        if extra:
+            payload.update(json.loads(extra))
+
+        await _pace()
+        try:
+            # Rendu au dernier moment : une file reprise tard peut contenir des MPs périmés
+            message = await render(target, guild, payload)
+            if message is None:
+                return ("failed", "plus d'actualité", qid)
+            await target.send(**message)
+        except discord.Forbidden:
+            return ("failed", "MP fermés", qid)
+        except discord.HTTPException as e:
+            if e.status == 429:
+                _pause(_retry_after(e))
+                return ("pending", "rate limit", qid)
+            if attempts + 1 >= DM_MAX_ATTEMPTS:
+                return ("failed", f"HTTP {e.status}", qid)
+            return ("pending", f"HTTP {e.status}", qid)
+        except Exception as e:
+            logger.error(f"❌ [MP] Erreur critique pour {user_id} : {e}")
+            return ("failed", "erreur interne", qid)
+
+    if on_sent:
+        try:
+            await on_sent(user_id)
+        except Exception as e:
+            logger.warning(f"[MP] Suivi après envoi impossible pour {user_id} : {e}")
+    return ("sent", None, qid)
+
+async def _retrying(what: str, func, *args):
+    """Appel base de données réessayé avec backoff : le runner ne meurt jamais sur une erreur passagère."""
+    delay = 1.0
+    while True:
+        try:
+            return await func(*args)
+        except Exception as e:
+            logger.error(f"❌ [MP] {what} impossible ({e}), nouvel essai dans {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, DM_RETRY_MAX)
+
+async def _run():
+    global _rerun
+    sem = asyncio.Semaphore(DM_WORKERS)
+    # Un enqueue arrivé pendant la fin du tour (rapports...) relève _rerun : on relit la file
+    while _rerun:
+        _rerun = False
+        await _drain(sem)
+
+async def _drain(sem: asyncio.Semaphore):
+    while True:
+        rows = await _retrying("Lecture de la file", database.fetch_pending_dms, database.bg_pool, DM_BATCH)
+        if not rows:
+            break
+
+        results = await asyncio.gather(*(_send_one(row, sem) for row in rows))
+        # Réessayé jusqu'au bout : sinon les MPs déjà partis seraient renvoyés au prochain tour
+        await _retrying("Enregistrement des résultats", database.mark_dm_results, database.bg_pool, results)
+
+        for campaign_id in {row[1] for row in rows}:
+            if campaign_id in _progress:
+                try:
+                    await _update_progress(campaign_id)
+                except Exception as e:
+                    logger.warning(f"[MP] Progression de la campagne {campaign_id} non mise à jour : {e}")
+        # On laisse aux 429 le temps de retomber avant de relire la file
+        if any(status == "pending" for status, _, _ in results):
+            await asyncio.sleep(max(0.0, _next_slot - time.monotonic()))
+
+    for campaign_id in await _retrying("Clôture des campagnes", database.finish_dm_campaigns, database.bg_pool):
+        try:
+            await _send_report(campaign_id)
+        except Exception as e:
+            logger.warning(f"[MP] Rapport de la campagne {campaign_id} non envoyé : {e}")
+
+
+# --- Rapports (salon de modération) ---
+
+def _report_embed(title, kind, total, by_status, by_error, done: bool) -> discord.Embed:
+    sent = by_status.get("sent", 0)
+    failed = by_status.get("failed", 0)
+    embed = discord.Embed(
+        title=title,
+        description="La campagne est terminée !" if done else f"⏳ Envoi en cours... **{sent + failed}/{total}**",
+        color=discord.Color.blue() if done else discord.Color.light_grey()
+    )
+    embed.add_field(name="✅ Réussis", value=str(sent), inline=True)
+    embed.add_field(name="❌ Échoués", value=str(failed), inline=True)
+    if by_error:
+        details = "\n".join(f"• {err} : {count}" for err, count in sorted(by_error.items(), key=lambda x: -x[1]))
+        embed.add_field(name="Détail des échecs", value=details[:1024], inline=False)
+    return embed
+
+async def _start_progress(campaign_id):
+    channel = _bot.get_channel(config.MOD_LOG_CHANNEL_ID) if _bot else None
+    if not channel:
+        return
+    kind, total, by_status, by_error = await database.get_dm_campaign_progress(database.bg_pool, campaign_id)
+    embed = _report_embed(_kinds[kind][2], kind, total, by_status, by_error, done=False)
+    message = await channel.send(embed=embed)
+    box = {"embed": embed}
+    # 1 edit toutes les 10s max, même si les lots s'enchaînent plus vite
+    _progress[campaign_id] = (helpers.CoalescingEditor(message, lambda: {"embed": box["embed"]}, interval=10.0), box)
+
+async def _update_progress(campaign_id):
+    editor, box = _progress[campaign_id]
+    kind, total, by_status, by_error = await database.get_dm_campaign_progress(database.bg_pool, campaign_id)
+    box["embed"] = _report_embed(_kinds[kind][2], kind, total, by_status, by_error, done=False)
+    editor.mark_dirty()
+
+async def _send_report(campaign_id):
+    kind, total, by_status, by_error = await database.get_dm_campaign_progress(database.bg_pool, campaign_id)
+    logger.info(f"🏁 [MP] Campagne {campaign_id} terminée. Succès: {by_status.get('sent', 0)} | Échecs: {by_status.get('failed', 0)}")
+    progress = _progress.pop(campaign_id, None)
+    if progress is not None:
+        progress[0].cancel()
+
+    title = _kinds.get(kind, (None, None, None))[2]
+    channel = _bot.get_channel(config.MOD_LOG_CHANNEL_ID)
+    if not title or not channel:
+        return
+    await channel.send(embed=_report_embed(title, kind, total, by_status, by_error, done=True))
@@ -5,7 +5,7 @@ from datetime import datetime, timezone
 import discord
 from discord.ext import commands
 
-from . import config, database, helpers, state, tasks
+from . import casino, config, database, dm_dispatcher, helpers, loop_monitor, metrics, state, tasks
 
 logger = logging.getLogger(__name__)
 
@@ -109,8 +109,17 @@ def setup(bot: commands.Bot):
     @bot.event
     async def on_ready():
         logger.info("Bot ready, initializing database")
+        # Chien de garde de la boucle : un blocage ici fait sauter les heartbeats du gateway
+        loop_monitor.start(bot)
         try:
-            database.db_pool = await database.init_db_pool()
+            # on_ready revient à chaque reconnexion au gateway : les pools existants sont gardés (pas de fuite)
+            if database.db_pool is None:
+                database.db_pool = metrics.instrument_pool(await database.init_db_pool())
+            if database.bg_pool is None:
+                # Pool séparé pour les tâches de fond : une sauvegarde ou une campagne ne bloque pas les commandes
+                database.bg_pool = metrics.instrument_pool(
+                    await database.init_db_pool("background", minsize=1, maxsize=config.DB_BG_POOL_MAX), "background"
+                )
             await database.ensure_tables(database.db_pool)
         except Exception as e:
             logger.error("Failed to init DB: %s", e)
@@ -118,7 +127,7 @@ def setup(bot: commands.Bot):
 
         for guild in bot.guilds:
             try:
-                state.invite_cache[guild.id] = await guild.invites()
+                helpers.cache_invites(guild.id, await guild.invites())
             except Exception as e:
                 logger.warning("Failed to fetch invites for %s: %s", guild.name, e)
         logger.info("KanaéBot prêt en tant que %s", bot.user)
@@ -127,6 +136,22 @@ def setup(bot: commands.Bot):
             logger.info("%d slash commands synced", len(synced))
         except Exception as e:
             logger.error("Slash command sync failed: %s", e)
+        # Métriques : toutes les commandes sont chargées, on peut les mesurer
+        metrics.instrument_commands(bot.tree)
+        try:
+            await metrics.start_exporter()
+        except OSError as e:
+            logger.warning("Metrics exporter not started: %s", e)
+        # Casino : on reprend (ou rembourse) les manches coupées par un redémarrage
+        try:
+            await casino.resume_rounds(bot)
+        except Exception as e:
+            logger.error("Failed to resume casino rounds: %s", e)
+        # MPs en masse : on reprend les campagnes interrompues
+        await dm_dispatcher.start(bot)
+        tasks.casino_rounds_scheduler.start(bot)
+        tasks.flush_rng_draws.start(bot)
+        tasks.flush_quiz_answers.start(bot)
         tasks.weekly_recap.start(bot)
         tasks.monthly_winner_announcement.start(bot)
         tasks.daily_scores_backup.start(bot)
@@ -205,33 +230,24 @@ def setup(bot: commands.Bot):
             logger.error("⛔ Je n'ai pas la permission de donner le rôle. Mon rôle de Bot doit être placé AU-DESSUS du rôle Membre dans les paramètres Discord !")
         except Exception as e:
             logger.warning("Erreur lors de l'attribution du rôle à %s : %s", member.name, e)
-        try:
-            guild = member.guild
-            invites_before = state.invite_cache.get(guild.id, [])
-            invites_after = await guild.invites()
-            used_invite = None
-            for invite in invites_after:
-                for old_invite in invites_before:
-                    if invite.code == old_invite.code and invite.uses > old_invite.uses:
-                        used_invite = invite
-                        break
-                if used_invite:
-                    break
-            state.invite_cache[guild.id] = invites_after
-            if used_invite and used_invite.inviter:
-                inviter = used_invite.inviter
+        # Détection du parrain en tâche de fond (le fetch d'invitations est regroupé par rafale)
+        async def award_after_2h():
+            try:
+                guild = member.guild
+                inviter = await helpers.find_invite_inviter(guild)
+                if not inviter:
+                    return
                 inviter_id = str(inviter.id)
-                async def award_after_2h():
-                    await asyncio.sleep(7200)
-                    if member.id in [m.id for m in guild.members]:
-                        # 🌿 On passe le parrainage à 250 points !
-                        new_total = await database.add_points(database.db_pool, inviter_id, 250)
-                        await helpers.safe_send_dm(inviter,
-                            f"🎉 Bravo frérot ! +250 points pour ton parrainage de `{member.name}`, "
-                            f"il est resté 2 h sur le serveur ! Total : {new_total} points. Continue comme ça 🚀")
-                asyncio.create_task(award_after_2h())
-        except Exception as e:
-            logger.warning("Parrainage detection failed: %s", e)
+                await asyncio.sleep(7200)
+                if guild.get_member(member.id):
+                    # 🌿 On passe le parrainage à 250 points !
+                    new_total = await database.add_points(database.db_pool, inviter_id, 250)
+                    await helpers.safe_send_dm(inviter,
+                        f"🎉 Bravo frérot ! +250 points pour ton parrainage de `{member.name}`, "
+                        f"il est resté 2 h sur le serveur ! Total : {new_total} points. Continue comme ça 🚀")
+            except Exception as e:
+                logger.warning("Parrainage detection failed: %s", e)
+        asyncio.create_task(award_after_2h())
 
         # --- 2. MESSAGE PUBLIC DANS LE SALON BIENVENUE ---
         try:
@@ -368,6 +384,36 @@ def setup(bot: commands.Bot):
         except Exception as e:
             logger.warning("Erreur lors de l'envoi du log de départ : %s", e)
 
+    @bot.event
+    async def on_invite_create(invite: discord.Invite):
+        # On garde le cache à jour sans refaire de guild.invites()
+        helpers.track_invite_created(invite)
+
+    @bot.event
+    async def on_invite_delete(invite: discord.Invite):
+        helpers.track_invite_deleted(invite)
+
+    # 📅 Événements programmés (cache de discord.py déjà à jour) : on rafraîchit le panneau d'agenda
+    async def _refresh_agenda():
+        if database.db_pool is None:
+            return
+        try:
+            await helpers.refresh_event_message(bot)
+        except Exception as e:
+            logger.warning("Rafraîchissement de l'agenda impossible : %s", e)
+
+    @bot.event
+    async def on_scheduled_event_create(event: discord.ScheduledEvent):
+        await _refresh_agenda()
+
+    @bot.event
+    async def on_scheduled_event_update(before: discord.ScheduledEvent, after: discord.ScheduledEvent):
+        await _refresh_agenda()
+
+    @bot.event
+    async def on_scheduled_event_delete(event: discord.ScheduledEvent):
+        await _refresh_agenda()
+
     @bot.event
     async def on_message(message: discord.Message):
         if message.author.bot:
@@ -407,9 +453,12 @@ def setup(bot: commands.Bot):
                     for attachment in message.attachments
                 )
                 if has_media:
-                    if not await database.has_daily_limit(database.db_pool, user_id, channel_id, date_str):
-                        await database.set_daily_limit(database.db_pool, user_id, channel_id, date_str)
-                        new_total = await database.add_points(database.db_pool, user_id, config.SPECIAL_CHANNEL_IDS[channel_id])
+                    new_total = None
+                    async with database.unit_of_work(database.db_pool):
+                        if not await database.has_daily_limit(database.db_pool, user_id, channel_id, date_str):
+                            await database.set_daily_limit(database.db_pool, user_id, channel_id, date_str)
+                            new_total = await database.add_points(database.db_pool, user_id, config.SPECIAL_CHANNEL_IDS[channel_id])
+                    if new_total is not None:
                         await helpers.update_member_prestige_role(message.author, new_total)
 
         # --- ✅ NOUVEAU : gestion des messages dans les THREADS (Forum)
@@ -418,7 +467,8 @@ def setup(bot: commands.Bot):
             thread_id = thread.id
             responder_id = message.author.id
 
-            async with database.db_pool.acquire() as conn:
+            # Une seule connexion : les add_points ci-dessous la réutilisent au lieu d'en emprunter une 2e
+            async with database.unit_of_work(database.db_pool) as conn:
                 async with conn.cursor() as cur:
                     # Check si le mec a déjà posté dans ce thread (pour éviter multiple +5)
                     await cur.execute(
@@ -452,10 +502,11 @@ def setup(bot: commands.Bot):
         author_id = str(author.id)
         if reactor_id == author_id:
             return
-        if await database.has_reaction_been_counted(database.db_pool, message.id, reactor_id):
-            return
-        await database.set_reaction_counted(database.db_pool, message.id, reactor_id)
-        new_total = await database.add_points(database.db_pool, author_id, 2)
+        async with database.unit_of_work(database.db_pool):
+            if await database.has_reaction_been_counted(database.db_pool, message.id, reactor_id):
+                return
+            await database.set_reaction_counted(database.db_pool, message.id, reactor_id)
+            new_total = await database.add_points(database.db_pool, author_id, 2)
         await helpers.update_member_prestige_role(author, new_total)
 
     @bot.event
@@ -466,7 +517,7 @@ def setup(bot: commands.Bot):
         user_id = thread.owner.id
         today = datetime.now(timezone.utc).date()
 
-        async with database.db_pool.acquire() as conn:
+        async with database.unit_of_work(database.db_pool) as conn:
             async with conn.cursor() as cur:
                 # Vérifie s'il a déjà eu son bonus aujourd'hui
                 await cur.execute(
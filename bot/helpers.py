@@ -1,16 +1,172 @@
+import asyncio
+import bisect
+import hashlib
+import json
 import logging
 import time
 import discord
 import aiohttp
 
-import re
-import zoneinfo
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timedelta
 
-from . import config, database
+from . import config, database, state
 
 logger = logging.getLogger(__name__)
 
+# Fenêtre de regroupement des joins : une rafale (raid, shoutout) = 1 seul guild.invites()
+INVITE_COALESCE_DELAY = 2.0
+
+def cache_invites(guild_id: int, invites):
+    """Remplace le cache d'invitations d'un serveur par un simple {code: uses}."""
+    state.invite_cache[guild_id] = {inv.code: inv.uses or 0 for inv in invites}
+    state.invite_inviters[guild_id] = {inv.code: inv.inviter for inv in invites}
+
+def track_invite_created(invite: discord.Invite):
+    if invite.guild is None:
+        return
+    state.invite_cache.setdefault(invite.guild.id, {})[invite.code] = invite.uses or 0
+    state.invite_inviters.setdefault(invite.guild.id, {})[invite.code] = invite.inviter
+
+def track_invite_deleted(invite: discord.Invite):
+    if invite.guild is None:
+        return
+    state.invite_cache.get(invite.guild.id, {}).pop(invite.code, None)
+    state.invite_inviters.get(invite.guild.id, {}).pop(invite.code, None)
+
+async def _fetch_invite_deltas(guild: discord.Guild) -> dict:
+    """Attend la fin de la rafale, refait UN fetch et calcule les deltas {code: +uses} en une passe."""
+    await asyncio.sleep(INVITE_COALESCE_DELAY)
+    # Les joins suivants déclencheront un nouveau fetch (celui-ci peut ne pas les voir)
+    state.invite_fetches.pop(guild.id, None)
+
+    lock = state.invite_locks.setdefault(guild.id, asyncio.Lock())
+    async with lock:
+        invites = await guild.invites()
+        before = state.invite_cache.get(guild.id, {})
+        deltas = {}
+        for inv in invites:
+            delta = (inv.uses or 0) - before.get(inv.code, 0)
+            if delta > 0:
+                deltas[inv.code] = delta
+        cache_invites(guild.id, invites)
+    return deltas
+
+async def find_invite_inviter(guild: discord.Guild):
+    """Renvoie l'auteur de l'invitation utilisée par le dernier arrivant (ou None)."""
+    task = state.invite_fetches.get(guild.id)
+    if task is None:
+        task = asyncio.create_task(_fetch_invite_deltas(guild))
+        state.invite_fetches[guild.id] = task
+    deltas = await task
+
+    # Le dict de deltas est partagé par tous les joins de la rafale : chacun consomme 1 utilisation
+    for code, remaining in deltas.items():
+        if remaining > 0:
+            deltas[code] = remaining - 1
+            return state.invite_inviters.get(guild.id, {}).get(code)
+    return None
+
+# Durée de vie du cache des collections pour l'autocomplétion (en secondes)
+POKEWEED_AUTOCOMPLETE_TTL = 30
+
+async def get_cached_collection(user_id: int):
+    """Collection d'un joueur pour l'autocomplétion : (clés triées, entrées), gardée quelques secondes en mémoire."""
+    user_id = int(user_id)
+    now = time.monotonic()
+    cached = state.pokeweed_collection_cache.get(user_id)
+    if cached and now - cached[0] < POKEWEED_AUTOCOMPLETE_TTL:
+        return cached[1], cached[2]
+
+    rows = await database.get_user_pokeweeds_unique(database.db_pool, user_id)
+    # Triées par nom en minuscules pour la recherche par préfixe (bisect)
+    entries = sorted(
+        (name.lower(), rarity.lower(), pid, f"{name} ✨ {rarity} (x{count})")
+        for pid, name, rarity, count in rows
+    )
+    keys = [e[0] for e in entries]
+
+    # Petit ménage des entrées expirées pour que le cache ne grossisse pas indéfiniment
+    if len(state.pokeweed_collection_cache) > 500:
+        for uid, (ts, _, _) in list(state.pokeweed_collection_cache.items()):
+            if now - ts >= POKEWEED_AUTOCOMPLETE_TTL:
+                del state.pokeweed_collection_cache[uid]
+
+    state.pokeweed_collection_cache[user_id] = (now, keys, entries)
+    return keys, entries
+
+def filter_collection(keys, entries, current: str, limit: int = 25):
+    """Filtre une collection en mémoire : d'abord les noms qui commencent par la saisie, puis nom/rareté qui la contiennent."""
+    current = current.lower()
+    results = []
+    seen = set()
+
+    i = bisect.bisect_left(keys, current)
+    while i < len(keys) and keys[i].startswith(current) and len(results) < limit:
+        results.append(entries[i])
+        seen.add(i)
+        i += 1
+
+    if current and len(results) < limit:
+        for idx, entry in enumerate(entries):
+            if idx in seen:
+                continue
+            if current in entry[0] or current in entry[1]:
+                results.append(entry)
+                if len(results) >= limit:
+                    break
+
+    # (pokeweed_id, libellé affiché)
+    return [(e[2], e[3]) for e in results]
+
+# Intervalle minimum entre deux edits d'un même message "live" (lobbies, pots...)
+LIVE_EDIT_INTERVAL = 0.75
+
+class CoalescingEditor:
+    """Regroupe les mises à jour d'un message : au plus 1 edit par intervalle, toujours avec le dernier état.
+
+    `render` est appelé juste avant chaque edit et renvoie les kwargs de `message.edit`.
+    """
+
+    def __init__(self, message, render, interval: float = LIVE_EDIT_INTERVAL):
+        self.message = message
+        self.render = render
+        self.interval = interval
+        self._dirty = False
+        self._last_edit = 0.0
+        self._task = None
+
+    def mark_dirty(self):
+        """Signale un changement d'état ; l'edit part tout de suite ou au prochain créneau libre."""
+        self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._dirty:
+            wait = self._last_edit + self.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # Tout ce qui arrive pendant l'edit sera pris au tour suivant
+            self._dirty = False
+            try:
+                await self.message.edit(**self.render())
+            except discord.NotFound:
+                return
+            except discord.HTTPException as e:
+                logger.warning("Live edit failed for message %s: %s", getattr(self.message, "id", "?"), e)
+            self._last_edit = time.monotonic()
+
+    async def flush(self):
+        """Attend que le dernier état soit affiché."""
+        if self._task and not self._task.done():
+            await self._task
+
+    def cancel(self):
+        """Abandonne les edits en attente (ex : le message va être remplacé par le résultat)."""
+        self._dirty = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+
 async def safe_send_dm(user: discord.User, content: str):
     if len(content) > 2000:
         content = content[:1990] + "…"
@@ -202,8 +358,16 @@ async def update_member_prestige_role(member: discord.Member, points: int):
         logger.error(f"❌ [Prestige] Erreur inattendue pour {member.display_name} : {e}")
 
     
+def _embeds_digest(embeds) -> str:
+    payload = json.dumps([e.to_dict() for e in embeds], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
 async def refresh_event_message(bot: discord.Client):
-    """Met à jour le panneau d'affichage avec une vision stricte sur 2 semaines."""
+    """Met à jour le panneau d'affichage avec une vision stricte sur 2 semaines.
+
+    Le panneau n'est édité que si son contenu a changé (empreinte des embeds) :
+    un rafraîchissement sans nouveauté ne coûte aucun appel à l'API Discord.
+    """
 
     event_channel_id = getattr(config, "EVENT_CHANNEL_ID", None)
     event_message_id = getattr(config, "EVENT_MESSAGE_ID", None)
@@ -215,37 +379,22 @@ async def refresh_event_message(bot: discord.Client):
     if not channel:
         return
         
-    try:
-        msg = await channel.fetch_message(event_message_id)
-    except discord.NotFound:
-        return 
-        
-    db_events = await database.get_public_events(database.db_pool)
-    try:
-        discord_events = await msg.guild.fetch_scheduled_events()
-    except Exception:
-        discord_events = []
+    # Message partiel : pas de fetch, un message disparu se voit au moment de l'édition
+    msg = channel.get_partial_message(event_message_id)
+
+    db_events = await database.PlanningRepository(database.db_pool).reserved()
+    # Cache de discord.py, tenu à jour par le gateway : aucun appel HTTP
+    discord_events = channel.guild.scheduled_events
 
     unified_events = []
     db_event_ids = set()
-    
-    try:
-        tz = zoneinfo.ZoneInfo("Europe/Paris")
-    except Exception:
-        tz = timezone(timedelta(hours=1))
+    tz = database.PLANNING_TZ
 
-    # A) Traitement BDD
-    for d, heure_str, anim_id, titre, desc, event_id in db_events:
-        if event_id: db_event_ids.add(event_id)
-        
-        h, m = 0, 0
-        match = re.search(r"(\d{1,2})(?:[hH:](\d{2}))?", heure_str)
-        if match:
-            h = int(match.group(1))
-            m = int(match.group(2)) if match.group(2) else 0
-            
-        start_dt = datetime.combine(d, datetime.min.time()).replace(hour=h, minute=m, tzinfo=tz)
-        unified_events.append({"titre": titre, "desc": desc, "anim_id": anim_id, "start_dt": start_dt, "event_id": event_id})
+    # A) Traitement BDD (starts_at est déjà l'heure de Paris, plus rien à parser)
+    for slot in db_events:
+        if slot.event_id: db_event_ids.add(slot.event_id)
+        start_dt = slot.starts_at.replace(tzinfo=tz)
+        unified_events.append({"titre": slot.titre, "desc": slot.description, "anim_id": slot.animateur_id, "start_dt": start_dt, "event_id": slot.event_id})
 
     # B) Traitement Discord Manuel
     for e in discord_events:
@@ -256,7 +405,6 @@ async def refresh_event_message(bot: discord.Client):
     unified_events.sort(key=lambda x: x["start_dt"])
 
     # 🕒 Préparation des dates
-    now_ts = int(time.time())
     now_dt = datetime.now(tz)
     today = now_dt.date()
     today_iso = today.isocalendar()[:2]
@@ -301,17 +449,18 @@ async def refresh_event_message(bot: discord.Client):
 
     embeds = []
 
-    # Le Header Principal
-    desc_header = "*Vision sur les 14 prochains jours de l'agenda Kanaé.* 💨\n\n" f"📡 **Synchro :** <t:{now_ts}:R>"
+    # Le Header Principal (l'heure de mise à jour est ajoutée après le calcul de l'empreinte)
+    desc_header = "*Vision sur les 14 prochains jours de l'agenda Kanaé.* 💨"
+    hidden_note = ""
     
     # On indique combien d'événements sont cachés car prévus dans + de 2 semaines
     if hidden_count > 0:
         s = "s" if hidden_count > 1 else ""
-        desc_header += f"\n*(+{hidden_count} autre{s} événement{s} prévu{s} plus tard)*"
+        hidden_note = f"\n*(+{hidden_count} autre{s} événement{s} prévu{s} plus tard)*"
 
     main_embed = discord.Embed(
         title="📅 L'AGENDA DES EVENTS KANAÉ", 
-        description=desc_header,
+        description=desc_header + hidden_note,
         color=discord.Color.dark_theme()
     )
     main_embed.set_thumbnail(url=bot.user.display_avatar.url)
@@ -331,7 +480,7 @@ async def refresh_event_message(bot: discord.Client):
                 anim_text = f"🎤 **Animé par :** <@{ev['anim_id']}>\n" if ev['anim_id'] else ""
                 event_link = ""
                 if ev["event_id"]:
-                    url = f"https://discord.com/events/{msg.guild.id}/{ev['event_id']}"
+                    url = f"https://discord.com/events/{channel.guild.id}/{ev['event_id']}"
                     event_link = f"\n\n> 📥 **[REJOINDRE L'ÉVÉNEMENT (CLIQUE ICI)]({url})**"
 
                 # Sécurité taille : description tronquée (E4)
@@ -362,4 +511,14 @@ async def refresh_event_message(bot: discord.Client):
             
         embeds[-1].set_footer(text="🟢 Mis à jour automatiquement", icon_url="https://i.imgur.com/8Q5A40b.gif")
 
-    await msg.edit(content="", embeds=embeds[:10], view=None)
\ No newline at end of file
+    embeds = embeds[:10]
+    digest = _embeds_digest(embeds)
+    if state.event_board_hash == (event_message_id, digest):
+        return
+
+    main_embed.description = f"{desc_header}\n\n📡 **Mis à jour :** <t:{int(time.time())}:R>{hidden_note}"
+    try:
+        await msg.edit(content="", embeds=embeds, view=None)
+    except discord.NotFound:
+        return
+    state.event_board_hash = (event_message_id, digest)
\ No newline at end of file
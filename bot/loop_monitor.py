@@ -0,0 +1,172 @@
+"""Chien de garde de la boucle asyncio.
+
+- Un battement (`_heartbeat`) mesure en continu le retard d'ordonnancement de la boucle.
+- Un thread de surveillance détecte quand la boucle ne bat plus depuis `config.LOOP_LAG_WARN_MS` :
+  il capture alors la pile du thread de la boucle (le code synchrone qui la bloque) et la tâche
+  en cours, puis le rapport part dans les logs et le salon de modération quand la boucle repart.
+- En mode debug (`LOOP_DEBUG=1`), un audit hook signale chaque ouverture de fichier ou socket
+  bloquante faite depuis le thread de la boucle, avec la ligne du bot responsable.
+"""
+import asyncio
+import collections
+import logging
+import socket
+import sys
+import threading
+import time
+import traceback
+
+import discord
+
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+BEAT_INTERVAL = 0.1         # Période du battement (secondes)
+REPORT_COOLDOWN = 600       # Un rapport de blocage max toutes les 10 min dans le salon modo
+
+LOOP_LAG_SECONDS = metrics.Histogram(
+    "kanae_event_loop_lag_seconds", "Retard d'ordonnancement de la boucle asyncio",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+LOOP_STALLS = metrics.Counter("kanae_event_loop_stalls_total", "Blocages de la boucle au-dessus du seuil", ("task",))
+BLOCKING_CALLS = metrics.Counter("kanae_blocking_io_calls_total", "E/S synchrones détectées sur la boucle (mode debug)", ("event", "site"))
+
+stalls = collections.deque(maxlen=20)  # Derniers blocages : {"at", "duration", "task", "stack"}
+
+_loop = None
+_loop_thread = None
+_last_beat = 0.0
+_stall = None               # Blocage en cours, rempli par le thread de surveillance
+_bot = None
+_last_report = 0.0
+_debug_sites = set()
+
+
+# --- Battement (côté boucle) ---
+
+async def _heartbeat():
+    global _last_beat, _stall
+    while True:
+        expected = time.monotonic() + BEAT_INTERVAL
+        await asyncio.sleep(BEAT_INTERVAL)
+        now = time.monotonic()
+        _last_beat = now
+        LOOP_LAG_SECONDS.observe(max(0.0, now - expected))
+
+        stall, _stall = _stall, None
+        if stall is not None:
+            stall["duration"] = now - stall["started"]
+            _report(stall)
+
+
+def _report(stall):
+    global _last_report
+    stalls.append(stall)
+    LOOP_STALLS.inc(stall["task"])
+    logger.warning(
+        "🧊 Boucle bloquée %.0f ms (tâche %s). Pile au moment du blocage :\n%s",
+        stall["duration"] * 1000, stall["task"], stall["stack"],
+    )
+    if _bot is None or time.monotonic() - _last_report < REPORT_COOLDOWN:
+        return
+    channel = _bot.get_channel(config.MOD_LOG_CHANNEL_ID)
+    if channel:
+        _last_report = time.monotonic()
+        embed = discord.Embed(
+            title=f"🧊 Boucle bloquée {stall['duration'] * 1000:.0f} ms",
+            description=f"Tâche : `{stall['task']}`\n```py\n{stall['stack'][-3500:]}\n```",
+            color=discord.Color.dark_blue(),
+        )
+        _loop.create_task(channel.send(embed=embed))
+
+
+# --- Surveillance (thread séparé, tourne même quand la boucle est bloquée) ---
+
+def _describe_task() -> str:
+    task = asyncio.current_task(_loop)
+    if task is None:
+        return "callback hors tâche"
+    coro = task.get_coro()
+    return f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+def _watch():
+    global _stall
+    threshold = config.LOOP_LAG_WARN_MS / 1000
+    while True:
+        time.sleep(BEAT_INTERVAL)
+        silent = time.monotonic() - _last_beat
+        if silent < threshold or _stall is not None:
+            continue
+        frame = sys._current_frames().get(_loop_thread)
+        if frame is None:
+            continue
+        # Capturée pendant le blocage : c'est bien le code synchrone fautif qui est au sommet
+        _stall = {
+            "at": time.time(),
+            "started": _last_beat,
+            "duration": silent,
+            "task": _describe_task(),
+            "stack": "".join(traceback.format_stack(frame, limit=25)),
+        }
+
+
+# --- Mode debug : E/S synchrones sur la boucle ---
+
+def _bot_site():
+    """Première ligne du bot dans la pile courante (None si l'appel ne vient pas du bot)."""
+    frame = sys._getframe(2)
+    package = __package__ + "."
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module.startswith(package) and module != __name__:
+            return f"{module}:{frame.f_lineno} ({frame.f_code.co_name})"
+        frame = frame.f_back
+    return None
+
+def _audit(event, args):
+    if threading.get_ident() != _loop_thread:
+        return
+    if event == "open":
+        path = args[0]
+        if isinstance(path, int) or str(path).endswith((".py", ".pyc")):
+            return
+        detail = str(path)
+    elif event == "socket.connect":
+        sock = args[0]
+        if isinstance(sock, socket.socket) and sock.gettimeout() == 0.0:
+            return  # socket non bloquante (asyncio/aiohttp)
+        detail = str(args[1])
+    elif event == "socket.getaddrinfo":
+        detail = str(args[0])
+    else:
+        return
+    site = _bot_site()
+    if site is None or (event, site) in _debug_sites:
+        return
+    _debug_sites.add((event, site))
+    BLOCKING_CALLS.inc(event, site)
+    logger.warning("🐌 E/S bloquante sur la boucle : %s(%s) depuis %s", event, detail, site)
+
+
+# --- Démarrage ---
+
+def start(bot: discord.Client = None):
+    """À appeler depuis la boucle (on_ready). Idempotent."""
+    global _loop, _loop_thread, _last_beat, _bot
+    _bot = bot or _bot
+    if _loop is not None:
+        return
+    _loop = asyncio.get_running_loop()
+    _loop_thread = threading.get_ident()
+    _last_beat = time.monotonic()
+    _loop.create_task(_heartbeat(), name="loop-monitor")
+    threading.Thread(target=_watch, name="loop-watchdog", daemon=True).start()
+
+    if config.LOOP_DEBUG:
+        # Les audit hooks ne se retirent pas : le mode debug est réservé au diagnostic
+        sys.addaudithook(_audit)
+        _loop.set_debug(True)
+        _loop.slow_callback_duration = config.LOOP_LAG_WARN_MS / 1000
+        logger.info("🔬 Mode debug boucle actif : E/S synchrones signalées")
+    logger.info("🩺 Surveillance de la boucle active (seuil %s ms)", config.LOOP_LAG_WARN_MS)
@@ -4,6 +4,8 @@ from discord.ext import commands
 import random
 import logging
 
+from . import helpers
+
 logger = logging.getLogger(__name__)
 
 # --- INFOS SUR LES RÔLES (Pour styliser les Messages Privés) ---
@@ -36,6 +38,12 @@ class LGStartView(discord.ui.View):
     def __init__(self, game: LGGameState):
         super().__init__(timeout=None)
         self.game = game
+        self.editor = None
+
+    def render(self, embed: discord.Embed) -> dict:
+        mentions = " ".join([p.mention for p in self.game.players.values()])
+        embed.description = f"**Joueurs inscrits ({len(self.game.players)}) :**\n{mentions}\n\n*Cliquez sur le bouton vert pour participer !*"
+        return {"embed": embed}
 
     @discord.ui.button(label="Rejoindre le village 🐺", style=discord.ButtonStyle.success)
     async def join_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -50,12 +58,12 @@ class LGStartView(discord.ui.View):
         self.game.players[interaction.user.id] = interaction.user
         self.game.alive.append(interaction.user.id)
         
-        # Mise à jour de l'affichage
-        embed = interaction.message.embeds[0]
-        mentions = " ".join([p.mention for p in self.game.players.values()])
-        embed.description = f"**Joueurs inscrits ({len(self.game.players)}) :**\n{mentions}\n\n*Cliquez sur le bouton vert pour participer !*"
-        
-        await interaction.response.edit_message(embed=embed)
+        # On acquitte tout de suite, l'affichage suit (edits regroupés si 20 joueurs cliquent en même temps)
+        await interaction.response.defer()
+        if self.editor is None:
+            embed = interaction.message.embeds[0]
+            self.editor = helpers.CoalescingEditor(interaction.message, lambda: self.render(embed))
+        self.editor.mark_dirty()
 
     @discord.ui.button(label="🔒 Fermer & Lancer", style=discord.ButtonStyle.danger)
     async def lock_btn(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -66,8 +74,13 @@ class LGStartView(discord.ui.View):
         self.game.lobby_open = False
         for child in self.children:
             child.disabled = True
-            
-        await interaction.response.edit_message(view=self)
+
+        # On affiche la liste finale des inscrits en même temps que la fermeture
+        if self.editor is not None:
+            self.editor.cancel()
+            await interaction.response.edit_message(view=self, **self.render(interaction.message.embeds[0]))
+        else:
+            await interaction.response.edit_message(view=self)
         await interaction.followup.send("🔒 **Les inscriptions sont fermées !**\nLe Maître du Jeu peut maintenant distribuer les rôles avec `/lg-roles`.")
 
 class LoupGarouCog(commands.Cog):
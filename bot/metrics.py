@@ -0,0 +1,245 @@
+"""Métriques du bot au format texte Prometheus, servies en local sur http://127.0.0.1:<METRICS_PORT>/metrics.
+
+Instrumenté sans toucher au code métier :
+- commandes slash (latence + erreurs par commande),
+- toutes les fonctions async publiques de `database` et l'attente d'une connexion du pool,
+- requêtes HTTP sortantes (Discord via `http_trace`, sessions aiohttp via `HTTP_TRACE`),
+- itérations des `tasks.loop`.
+"""
+import bisect
+import functools
+import inspect
+import logging
+import time
+
+import aiohttp
+from aiohttp import web
+from discord import app_commands
+from discord.ext import tasks as ext_tasks
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra="") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.values = {}
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1.0):
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def render(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_labels(self.label_names, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels):
+        self.values[labels] = value
+
+    def dec(self, *labels, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # {labels: [compteurs par bucket (+Inf inclus), somme]}
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self):
+        for labels, (counts, total) in self.series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = 'le="%s"' % bound
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {total}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+COMMAND_SECONDS = Histogram("kanae_command_seconds", "Durée des commandes slash", ("command", "status"))
+DB_SECONDS = Histogram("kanae_db_call_seconds", "Durée des fonctions du module database", ("function", "status"))
+POOL_WAIT_SECONDS = Histogram("kanae_db_pool_acquire_seconds", "Attente d'une connexion MySQL libre", ("pool",))
+POOL_IN_USE = Gauge("kanae_db_pool_in_use", "Connexions MySQL empruntées en ce moment", ("pool",))
+POOL_WAITING = Gauge("kanae_db_pool_waiting", "Tâches en attente d'une connexion MySQL", ("pool",))
+POOL_SIZE = Gauge("kanae_db_pool_size", "Connexions MySQL ouvertes (libres + empruntées)", ("pool",))
+POOL_MAX = Gauge("kanae_db_pool_max", "Taille max du pool MySQL", ("pool",))
+HTTP_SECONDS = Histogram("kanae_http_request_seconds", "Requêtes HTTP sortantes", ("host", "method", "status"))
+LOOP_SECONDS = Histogram("kanae_loop_iteration_seconds", "Durée d'une itération de tasks.loop", ("loop", "status"))
+
+
+# --- Enrobage des coroutines ---
+
+def timed(fn, histogram: Histogram, name: str):
+    """Enrobe une coroutine : chaque appel est mesuré dans `histogram` avec les labels (name, ok|error)."""
+    if getattr(fn, "__metrics_wrapped__", False):
+        return fn
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        status = "ok"
+        try:
+            return await fn(*args, **kwargs)
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start, name, status)
+
+    wrapper.__metrics_wrapped__ = True
+    return wrapper
+
+def instrument_module(module, histogram: Histogram = DB_SECONDS):
+    """Mesure toutes les fonctions async publiques définies dans `module` (les appels passent par l'attribut),
+    ainsi que les méthodes async publiques de ses classes (ex : `PlanningRepository.upcoming`)."""
+    for name, obj in list(vars(module).items()):
+        if name.startswith("_") or getattr(obj, "__module__", None) != module.__name__:
+            continue
+        if inspect.iscoroutinefunction(obj):
+            setattr(module, name, timed(obj, histogram, name))
+        elif inspect.isclass(obj):
+            for attr, fn in list(vars(obj).items()):
+                if not attr.startswith("_") and inspect.iscoroutinefunction(fn):
+                    setattr(obj, attr, timed(fn, histogram, f"{name}.{attr}"))
+
+def instrument_loops(module):
+    for obj in vars(module).values():
+        if isinstance(obj, ext_tasks.Loop):
+            obj.coro = timed(obj.coro, LOOP_SECONDS, obj.coro.__name__)
+
+def instrument_commands(tree: app_commands.CommandTree):
+    """À appeler une fois toutes les commandes chargées (cogs compris)."""
+    for command in tree.walk_commands():
+        if isinstance(command, app_commands.Command):
+            command._callback = timed(command._callback, COMMAND_SECONDS, command.qualified_name)
+
+class _TimedAcquire:
+    """Remplace `pool.acquire()` : mesure l'attente, compte les tâches en file et les connexions en cours d'usage."""
+
+    def __init__(self, pool, acquire, name: str):
+        self._pool = pool
+        self._acquire = acquire
+        self._name = name
+        self._ctx = None
+
+    async def __aenter__(self):
+        self._ctx = self._acquire()
+        if getattr(self._ctx, "reused", False):
+            # Connexion déjà tenue par l'unité de travail de la tâche : rien à mesurer
+            return await self._ctx.__aenter__()
+        start = time.perf_counter()
+        POOL_WAITING.inc(self._name)
+        try:
+            conn = await self._ctx.__aenter__()
+        finally:
+            POOL_WAITING.dec(self._name)
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - start, self._name)
+        POOL_IN_USE.inc(self._name)
+        POOL_SIZE.set(getattr(self._pool, "size", 0), self._name)
+        return conn
+
+    async def __aexit__(self, *exc):
+        if not getattr(self._ctx, "reused", False):
+            POOL_IN_USE.dec(self._name)
+        return await self._ctx.__aexit__(*exc)
+
+def instrument_pool(pool, name: str = "main"):
+    if getattr(pool, "__metrics_wrapped__", False):
+        return pool
+    acquire = pool.acquire
+    pool.acquire = lambda: _TimedAcquire(pool, acquire, name)
+    pool.__metrics_wrapped__ = True
+    POOL_MAX.set(getattr(pool, "maxsize", 0), name)
+    return pool
+
+
+# --- HTTP sortant ---
+
+async def _on_request_start(session, ctx, params):
+    ctx.start = time.perf_counter()
+
+async def _on_request_end(session, ctx, params):
+    HTTP_SECONDS.observe(time.perf_counter() - ctx.start, params.url.host, params.method, str(params.response.status))
+
+async def _on_request_exception(session, ctx, params):
+    HTTP_SECONDS.observe(time.perf_counter() - ctx.start, params.url.host, params.method, "error")
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(_on_request_start)
+    trace.on_request_end.append(_on_request_end)
+    trace.on_request_exception.append(_on_request_exception)
+    return trace
+
+# À passer aux `aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE])`
+HTTP_TRACE = http_trace_config()
+
+
+# --- Exporteur ---
+
+_runner = None
+
+async def _handle_metrics(request):
+    return web.Response(text=render(), content_type="text/plain", charset="utf-8")
+
+async def start_exporter(host: str = None, port: int = None):
+    """Démarre l'endpoint /metrics (une seule fois, même si on_ready est rappelé)."""
+    global _runner
+    if _runner is not None or not config.METRICS_PORT:
+        return
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    _runner = web.AppRunner(app, access_log=None)
+    await _runner.setup()
+    site = web.TCPSite(_runner, host or config.METRICS_HOST, port or config.METRICS_PORT)
+    await site.start()
+    logger.info("📈 Métriques exposées sur http://%s:%s/metrics", host or config.METRICS_HOST, port or config.METRICS_PORT)
@@ -0,0 +1,49 @@
+"""Registre des vues persistantes : leurs boutons marchent encore après un redémarrage.
+
+Deux familles :
+- boutons dynamiques (`discord.ui.DynamicItem`) : tout l'état utile est encodé dans le custom_id
+  et relu au clic (quiz, vente de carte, échange) ;
+- vues à custom_id fixes, enregistrées une fois avec `bot.add_view` (ex : cadeau /mp_revient).
+Les manches casino (DouilleView, JackpotView) sont, elles, reprises depuis leur ligne en base
+par `casino.resume_rounds`.
+
+⚠️ Une vue qui contient un bouton dynamique doit rester sans timeout et ne jamais être `stop()` :
+discord.py retirerait le motif du registre pour TOUS les messages.
+"""
+import logging
+from datetime import datetime, timezone
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+_dynamic_items = []
+_static_views = []
+
+
+def dynamic(cls):
+    """Décorateur : enregistre une classe DynamicItem au démarrage."""
+    _dynamic_items.append(cls)
+    return cls
+
+def register_view(factory):
+    """Enregistre une vue à custom_id fixes (factory sans argument → instance avec timeout=None)."""
+    _static_views.append(factory)
+    return factory
+
+def setup(bot: discord.Client):
+    bot.add_dynamic_items(*_dynamic_items)
+    for factory in _static_views:
+        bot.add_view(factory())
+    logger.info("🔁 Vues persistantes : %d boutons dynamiques, %d vues fixes", len(_dynamic_items), len(_static_views))
+
+
+def message_age(message: discord.Message) -> float:
+    """Âge du message en secondes (sert d'expiration sans garder de minuteur en mémoire)."""
+    if message is None:
+        return 0.0
+    return (datetime.now(timezone.utc) - message.created_at).total_seconds()
+
+def disable_all(view: discord.ui.View):
+    for child in view.children:
+        child.disabled = True
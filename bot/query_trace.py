@@ -0,0 +1,174 @@
+"""Traçage requête par requête du pool MySQL (curseur `TracedCursor` branché dans `init_db_pool`).
+
+Pour chaque instruction SQL : durée, lignes renvoyées/modifiées et fonction appelante
+(la fonction publique de `database`, sinon `module.fonction` du code qui a ouvert le curseur).
+Les requêtes au-dessus de `config.SLOW_QUERY_MS` sont gardées sur une fenêtre glissante
+pour le classement des plus lentes et le dump EXPLAIN vers le salon de modération.
+"""
+import collections
+import logging
+import re
+import sys
+import time
+from dataclasses import dataclass
+
+import aiomysql
+import discord
+
+from . import config, metrics
+
+logger = logging.getLogger(__name__)
+
+SLOW_WINDOW = 24 * 3600   # Fenêtre glissante du classement (secondes)
+SLOW_KEEP = 500           # Échantillons lents conservés au maximum
+EXPLAINABLE = ("SELECT", "UPDATE", "DELETE", "INSERT", "REPLACE")
+
+SLOW_QUERIES = metrics.Counter("kanae_db_slow_queries_total", "Requêtes SQL au-dessus du seuil de lenteur", ("caller",))
+
+_DB_MODULE = f"{__package__}.database"
+_SKIP_MODULES = {__name__, metrics.__name__, "aiomysql.cursors", "aiomysql.utils"}
+
+
+@dataclass
+class StatementStats:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    rows: int = 0
+    caller: str = "?"
+
+@dataclass
+class SlowQuery:
+    at: float
+    duration: float
+    statement: str
+    sql: str
+    params: object
+    rows: int
+    caller: str
+
+
+stats = {}  # {instruction normalisée: StatementStats}
+_slow = collections.deque(maxlen=SLOW_KEEP)
+
+
+# --- Normalisation ---
+
+_SPACES = re.compile(r"\s+")
+_UNION_ROWS = re.compile(r"(?: UNION ALL SELECT %s(?:, ?%s)*)+")
+_IN_LIST = re.compile(r"IN \(%s(?:, ?%s)+\)")
+_VALUES = re.compile(r"\bVALUES\s*\(.*\)", re.S)
+
+def normalize(sql) -> str:
+    """Même clé pour toutes les variantes d'une instruction (listes IN, lots UNION ALL, INSERT multi-lignes)."""
+    if isinstance(sql, (bytes, bytearray)):
+        # executemany déplie les lignes en littéraux : on ne garde que la forme
+        sql = _VALUES.sub("VALUES (…)", bytes(sql).decode("utf-8", "replace"))
+    sql = _SPACES.sub(" ", sql).strip()
+    sql = _UNION_ROWS.sub(" UNION ALL …", sql)
+    return _IN_LIST.sub("IN (%s…)", sql)
+
+def _caller() -> str:
+    """Fonction publique de `database` la plus proche dans la pile, sinon le premier appelant hors pilote."""
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        name = frame.f_code.co_name
+        if module == _DB_MODULE and not name.startswith("_"):
+            return name
+        if fallback is None and module not in _SKIP_MODULES:
+            fallback = f"{module.rsplit('.', 1)[-1]}.{name}"
+        frame = frame.f_back
+    return fallback or "?"
+
+
+def _record(sql, params, duration: float, rows: int, caller: str):
+    statement = normalize(sql)
+    entry = stats.get(statement)
+    if entry is None:
+        entry = stats[statement] = StatementStats(caller=caller)
+    entry.count += 1
+    entry.total += duration
+    entry.max = max(entry.max, duration)
+    entry.rows += max(rows, 0)
+
+    if duration * 1000 >= config.SLOW_QUERY_MS:
+        _slow.append(SlowQuery(time.time(), duration, statement, sql, params, rows, caller))
+        SLOW_QUERIES.inc(caller)
+        logger.warning("🐢 Requête lente (%.0f ms, %s lignes) dans %s : %s", duration * 1000, rows, caller, statement[:200])
+
+
+class TracedCursor(aiomysql.Cursor):
+    """Curseur par défaut du pool : chaque `execute` (executemany compris) est mesuré."""
+
+    async def execute(self, query, args=None):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, args)
+        finally:
+            _record(query, args, time.perf_counter() - start, self._rowcount, _caller())
+
+
+# --- Classements ---
+
+def slowest(limit: int = 10, threshold_ms: float = None):
+    """Pire exécution de chaque instruction lente sur la fenêtre glissante, de la plus lente à la moins lente."""
+    cutoff = time.time() - SLOW_WINDOW
+    threshold = (threshold_ms if threshold_ms is not None else config.SLOW_QUERY_MS) / 1000
+    worst = {}
+    for sample in _slow:
+        if sample.at < cutoff or sample.duration < threshold:
+            continue
+        if sample.statement not in worst or sample.duration > worst[sample.statement].duration:
+            worst[sample.statement] = sample
+    return sorted(worst.values(), key=lambda s: s.duration, reverse=True)[:limit]
+
+def busiest(limit: int = 10):
+    """Instructions qui coûtent le plus en temps cumulé depuis le démarrage."""
+    return sorted(stats.items(), key=lambda item: item[1].total, reverse=True)[:limit]
+
+
+# --- EXPLAIN ---
+
+async def explain(pool, sample: SlowQuery):
+    """EXPLAIN (sans exécuter) de l'échantillon, via un curseur non tracé."""
+    if not isinstance(sample.sql, str) or not sample.sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None, None
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.Cursor) as cur:
+            await cur.execute("EXPLAIN " + sample.sql, sample.params)
+            columns = [col[0] for col in cur.description]
+            return columns, await cur.fetchall()
+
+def _explain_table(columns, rows) -> str:
+    keep = [c for c in ("table", "type", "possible_keys", "key", "rows", "Extra") if c in columns]
+    indexes = [columns.index(c) for c in keep]
+    lines = [" | ".join(keep)]
+    for row in rows:
+        lines.append(" | ".join(str(row[i]) for i in indexes))
+    return "\n".join(lines)
+
+async def dump_explains(channel, pool, limit: int = 5, threshold_ms: float = None) -> int:
+    """Poste un embed par requête lente (stats + plan EXPLAIN) dans `channel`. Renvoie le nombre posté."""
+    posted = 0
+    for sample in slowest(limit, threshold_ms):
+        entry = stats.get(sample.statement)
+        embed = discord.Embed(
+            title=f"🐢 {sample.caller} — {sample.duration * 1000:.0f} ms",
+            description=f"```sql\n{sample.statement[:1500]}\n```",
+            color=discord.Color.orange(),
+        )
+        if entry:
+            embed.add_field(name="Exécutions", value=str(entry.count))
+            embed.add_field(name="Moyenne", value=f"{entry.total / entry.count * 1000:.1f} ms")
+            embed.add_field(name="Lignes (pire cas)", value=str(sample.rows))
+        try:
+            columns, rows = await explain(pool, sample)
+            plan = _explain_table(columns, rows) if columns else "EXPLAIN indisponible pour cette instruction."
+        except Exception as e:
+            plan = f"EXPLAIN impossible : {e}"
+        embed.add_field(name="Plan", value=f"```\n{plan[:1000]}\n```", inline=False)
+        await channel.send(embed=embed)
+        posted += 1
+    return posted
@@ -0,0 +1,195 @@
+"""Quiz Enfumé : banque de questions compilée, rotation par salon en base, points en lots."""
+import asyncio
+import logging
+import zlib
+from typing import NamedTuple
+
+import discord
+
+from . import database, persistent_views, rng, state
+from .quiz_data import QUIZ_QUESTIONS
+
+logger = logging.getLogger(__name__)
+
+PTS_WIN = 50
+PTS_LOSS = 10
+QUIZ_TIMEOUT = 3600  # Le quiz expire au bout d'1 heure
+
+
+class QuizQuestion(NamedTuple):
+    text: str
+    options: tuple
+    answer: int
+    category: str
+
+
+def compile_questions(raw) -> tuple:
+    """Transforme les dicts de quiz_data en tuples immuables (1 seule fois, à l'import)."""
+    return tuple(
+        QuizQuestion(q["question"], tuple(q["options"]), q["answer"], q.get("category", "Culture G"))
+        for q in raw
+    )
+
+QUESTIONS = compile_questions(QUIZ_QUESTIONS)
+# Empreinte de la banque : si on ajoute/modifie des questions, les rotations en base repartent de zéro
+BANK_VERSION = zlib.crc32("\n".join(q.text for q in QUESTIONS).encode("utf-8"))
+
+
+def _new_cycle() -> list:
+    # On stocke juste les NUMÉROS des questions, mélangés
+    cycle = list(range(len(QUESTIONS)))
+    gen = rng.get("quiz")
+    gen.shuffle(cycle)
+    gen.record("nouveau cycle")
+    logger.info("🧠 Nouveau cycle de quiz généré et mélangé !")
+    return cycle
+
+async def next_question(channel_id: int) -> int:
+    """Numéro de la question suivante du cycle de ce salon (sans répétition avant la fin du cycle)."""
+    return await database.pop_quiz_question(database.db_pool, channel_id, BANK_VERSION, _new_cycle)
+
+
+# --- Points et stats en attente (écrits par lots par tasks.flush_quiz_answers) ---
+_pending_points = {}  # {user_id: delta}
+_pending_stats = {}   # {user_id: [bonnes, mauvaises, points]}
+
+def record_answer(user_id: int, correct: bool):
+    pts = PTS_WIN if correct else -PTS_LOSS
+    _pending_points[user_id] = _pending_points.get(user_id, 0) + pts
+    stats = _pending_stats.setdefault(user_id, [0, 0, 0])
+    stats[0 if correct else 1] += 1
+    stats[2] += pts
+
+async def flush_answers(pool):
+    """Applique les points et stats accumulés depuis le dernier passage."""
+    global _pending_points, _pending_stats
+    if not _pending_points and not _pending_stats:
+        return
+    points, stats = _pending_points, _pending_stats
+    _pending_points, _pending_stats = {}, {}
+    try:
+        await database.add_points_batch(pool, points)
+    except Exception as e:
+        # On remet tout pour le prochain passage
+        for uid, pts in points.items():
+            _pending_points[uid] = _pending_points.get(uid, 0) + pts
+        for uid, values in stats.items():
+            current = _pending_stats.setdefault(uid, [0, 0, 0])
+            for i, value in enumerate(values):
+                current[i] += value
+        logger.error(f"Erreur écriture des points du quiz : {e}")
+        return
+    try:
+        await database.record_quiz_stats(pool, stats)
+    except Exception as e:
+        logger.warning(f"Stats du quiz perdues pour ce lot : {e}")
+
+
+def _round(message: discord.Message, view: discord.ui.View) -> dict:
+    """État d'une question en cours ; recréé depuis le message si le bot a redémarré entre-temps."""
+    quiz_round = state.quiz_rounds.get(message.id)
+    if quiz_round is None:
+        if any(child.disabled for child in view.children) or persistent_views.message_age(message) > QUIZ_TIMEOUT:
+            return {"answered": True, "wrong": set()}
+        quiz_round = state.quiz_rounds[message.id] = {"answered": False, "wrong": set()}
+    return quiz_round
+
+async def _close(message: discord.Message, view: discord.ui.View, note: str):
+    persistent_views.disable_all(view)
+    embed = message.embeds[0]
+    embed.color = discord.Color.light_grey()
+    embed.description += note
+    await message.edit(embed=embed, view=view)
+
+
+@persistent_views.dynamic
+class QuizAnswerButton(discord.ui.DynamicItem[discord.ui.Button], template=r"quiz:(?P<bank>\d+):(?P<q>\d+):(?P<opt>\d+)"):
+    """Bouton de réponse : custom_id = quiz:<version banque>:<n° question>:<n° option>."""
+
+    def __init__(self, q_index: int, option: int, label: str = None, bank: int = BANK_VERSION):
+        super().__init__(discord.ui.Button(
+            label=label, style=discord.ButtonStyle.primary, custom_id=f"quiz:{bank}:{q_index}:{option}"
+        ))
+        self.bank = bank
+        self.q_index = q_index
+        self.option = option
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match["q"]), int(match["opt"]), item.label, int(match["bank"]))
+
+    async def callback(self, interaction: discord.Interaction):
+        # ⬅️ 1. ON DEFER TOUT DE SUITE POUR ÉVITER LE TIMEOUT DE 3 SECONDES
+        await interaction.response.defer()
+        message = interaction.message
+        quiz_round = _round(message, self.view)
+
+        if self.bank != BANK_VERSION and not quiz_round["answered"]:
+            # La banque de questions a changé depuis : on ne peut plus vérifier la réponse
+            quiz_round["answered"] = True
+            await _close(message, self.view, "\n\n⏰ *Ce quiz a expiré.*")
+            return
+
+        if quiz_round["answered"]:
+            await interaction.followup.send("⏳ Trop tard, ce quiz est terminé !", ephemeral=True)
+            return
+
+        if interaction.user.id in quiz_round["wrong"]:
+            await interaction.followup.send("❌ Tu as déjà répondu faux ! Laisse les autres essayer.", ephemeral=True)
+            return
+
+        question = QUESTIONS[self.q_index]
+        if self.option == question.answer:
+            quiz_round["answered"] = True
+            # 🏆 Il a gagné ! Les points partent au prochain lot
+            record_answer(interaction.user.id, True)
+
+            # On désactive et on colorie les boutons
+            for i, child in enumerate(self.view.children):
+                child.disabled = True
+                child.style = discord.ButtonStyle.success if i == question.answer else discord.ButtonStyle.secondary
+
+            embed = message.embeds[0]
+            embed.color = discord.Color.green()
+            embed.description += f"\n\n🎉 **BINGO !** {interaction.user.mention} a trouvé la bonne réponse et rafle **+{PTS_WIN} points** !"
+            await interaction.edit_original_response(embed=embed, view=self.view)
+        else:
+            # ❌ Il s'est trompé ! On retire des points
+            quiz_round["wrong"].add(interaction.user.id)
+            record_answer(interaction.user.id, False)
+            await interaction.followup.send(f"❌ Faux ! C'est pas ça frérot. Tu perds **{PTS_LOSS} points**. Kof Kof...", ephemeral=True)
+
+
+class QuizView(discord.ui.View):
+    def __init__(self, q_index: int):
+        # Pas de timeout : l'expiration est gérée par _expire (et par l'âge du message après un redémarrage)
+        super().__init__(timeout=None)
+        for i, opt in enumerate(QUESTIONS[q_index].options):
+            self.add_item(QuizAnswerButton(q_index, i, opt))
+
+async def _expire(message: discord.Message, view: QuizView):
+    # Si personne ne trouve après 1h, on désactive les boutons
+    await asyncio.sleep(QUIZ_TIMEOUT)
+    quiz_round = state.quiz_rounds.pop(message.id, None)
+    if quiz_round is None or quiz_round["answered"]:
+        return
+    try:
+        await _close(message, view, "\n\n⏰ *Temps écoulé ! Personne n'a eu la bonne réponse...*")
+    except discord.HTTPException:
+        pass
+
+
+async def post_quiz(channel: discord.abc.Messageable):
+    """Pose la question suivante de la rotation de ce salon."""
+    q_index = await next_question(channel.id)
+    question = QUESTIONS[q_index]
+    embed = discord.Embed(
+        title=f"🧠 LE QUIZ ENFUMÉ - {question.category}",
+        description=f"**{question.text}**\n\n*Le premier à cliquer sur la bonne réponse gagne {PTS_WIN} points ! (Attention : -{PTS_LOSS} pts si tu te trompes !)*",
+        color=discord.Color.orange()
+    )
+    view = QuizView(q_index)
+    message = await channel.send(embed=embed, view=view)
+    state.quiz_rounds[message.id] = {"answered": False, "wrong": set()}
+    asyncio.create_task(_expire(message, view))
+    return message
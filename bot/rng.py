@@ -0,0 +1,169 @@
+"""Service de hasard du casino : 1 générateur par jeu, graines `secrets`, journal des tirages.
+
+Chaque tirage enregistré = (jeu, graine, numéro du tirage depuis la graine, résultat).
+Avec la graine, n'importe qui peut rejouer la séquence et vérifier les résultats publiés.
+
+Simulation hors-ligne (aucune connexion Discord / MySQL) :
+    python -m bot.rng --games 1000000
+"""
+import argparse
+import bisect
+import itertools
+import logging
+import random
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# On change de graine tous les N tirages journalisés (ou au bout d'une heure)
+RESEED_EVERY = 1000
+RESEED_SECONDS = 3600
+# Taille max d'un lot d'écriture du journal
+DRAW_LOG_BATCH = 500
+
+# Règle du /bet : on gagne (mise doublée) si le jet 1-100 est <= 46
+BET_WIN_THRESHOLD = 46
+
+
+class GameRNG(random.Random):
+    """Générateur rapide (Mersenne Twister) propre à un jeu, regraîné via `secrets`."""
+
+    def __init__(self, game: str):
+        self.game = game
+        self.seed_value = 0
+        self.seq = 0
+        self.seeded_at = 0.0
+        super().__init__()
+        self.reseed()
+
+    def reseed(self):
+        self.seed_value = secrets.randbits(64)
+        self.seed(self.seed_value)
+        self.seq = 0
+        self.seeded_at = time.monotonic()
+
+    def claim(self):
+        """Réserve (graine, n°) de la manche qui vient d'être tirée, pour la journaliser plus tard.
+
+        Le numéro suit l'ordre des tirages, même si les manches sont journalisées dans le désordre.
+        """
+        self.seq += 1
+        ticket = (self.seed_value, self.seq)
+        if self.seq >= RESEED_EVERY or time.monotonic() - self.seeded_at >= RESEED_SECONDS:
+            self.reseed()
+        return ticket
+
+    def record(self, outcome, ticket=None):
+        """Journalise le résultat d'une manche (à appeler après les tirages de la manche, ou avec son ticket)."""
+        seed, seq = ticket or self.claim()
+        _pending_draws.append((self.game, seed, seq, str(outcome)[:100]))
+
+
+_generators = {}
+_pending_draws = []
+
+def get(game: str) -> GameRNG:
+    gen = _generators.get(game)
+    if gen is None:
+        gen = _generators[game] = GameRNG(game)
+    return gen
+
+async def flush_draws(pool):
+    """Écrit le journal en attente par lots (1 requête multi-lignes par lot)."""
+    from . import database
+
+    while _pending_draws:
+        batch = _pending_draws[:DRAW_LOG_BATCH]
+        del _pending_draws[:DRAW_LOG_BATCH]
+        try:
+            await database.log_casino_draws(pool, batch)
+        except Exception as e:
+            # On remet le lot en tête pour le prochain passage
+            _pending_draws[:0] = batch
+            logger.error(f"Erreur écriture journal RNG : {e}")
+            return
+
+
+# ===================================================================
+# 🧪 SIMULATION HORS-LIGNE (preuve d'équité)
+# ===================================================================
+
+def bet_expected_value(threshold: int = BET_WIN_THRESHOLD) -> float:
+    """EV exacte d'1 point misé au /bet (gain = mise doublée)."""
+    p = threshold / 100
+    return p * 1 - (1 - p) * 1
+
+def slot_expected_value(weights=None) -> float:
+    """EV exacte d'1 point misé à la machine (toutes les combinaisons pondérées)."""
+    from . import casino
+
+    weights = weights or casino.SLOT_WEIGHTS
+    total = sum(weights)
+    ev = 0.0
+    for combo in itertools.product(range(len(weights)), repeat=3):
+        p = weights[combo[0]] * weights[combo[1]] * weights[combo[2]] / total ** 3
+        multiplicateur = casino.slot_payout(tuple(casino.SLOT_SYMBOLS[i] for i in combo))[0]
+        ev += p * (multiplicateur - 1)
+    return ev
+
+def simulate_bet(games: int, threshold: int = BET_WIN_THRESHOLD, rng=None):
+    """Renvoie (taux de victoire, EV par point misé) sur `games` parties simulées."""
+    rng = rng or GameRNG("sim-bet")
+    randint = rng.randint
+    wins = sum(1 for _ in range(games) if randint(1, 100) <= threshold)
+    rate = wins / games
+    return rate, rate - (1 - rate)
+
+def simulate_slots(games: int, weights=None, rng=None):
+    """Renvoie (fréquence des brelans, EV par point misé) sur `games` tours simulés."""
+    from . import casino
+
+    rng = rng or GameRNG("sim-slots")
+    weights = weights or casino.SLOT_WEIGHTS
+    cumulative = tuple(itertools.accumulate(weights))
+    total = cumulative[-1]
+    symbols = casino.SLOT_SYMBOLS
+    rand = rng.random
+    payout = casino.slot_payout
+
+    returned = 0.0
+    triples = 0
+    for _ in range(games):
+        reels = (
+            symbols[bisect.bisect_right(cumulative, rand() * total)],
+            symbols[bisect.bisect_right(cumulative, rand() * total)],
+            symbols[bisect.bisect_right(cumulative, rand() * total)],
+        )
+        multiplicateur = payout(reels)[0]
+        returned += multiplicateur
+        if reels[0] == reels[1] == reels[2]:
+            triples += 1
+    return triples / games, returned / games - 1
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulation des jeux du casino Kanaé")
+    parser.add_argument("--games", type=int, default=1_000_000, help="Parties simulées par configuration")
+    parser.add_argument("--bet-threshold", type=int, action="append", help="Seuil de victoire du /bet (répétable)")
+    parser.add_argument("--slot-weights", action="append", help="Poids des symboles, ex : 65,20,10,4,1 (répétable)")
+    args = parser.parse_args(argv)
+
+    from . import casino
+
+    for threshold in args.bet_threshold or [BET_WIN_THRESHOLD]:
+        start = time.perf_counter()
+        rate, ev = simulate_bet(args.games, threshold)
+        elapsed = time.perf_counter() - start
+        print(f"/bet seuil {threshold}/{100 - threshold} : victoire {rate:.4%} | EV simulée {ev:+.4f} "
+              f"| EV exacte {bet_expected_value(threshold):+.4f} | {args.games / elapsed:,.0f} parties/s")
+
+    for raw in args.slot_weights or [",".join(map(str, casino.SLOT_WEIGHTS))]:
+        weights = tuple(int(w) for w in raw.split(","))
+        start = time.perf_counter()
+        triple_rate, ev = simulate_slots(args.games, weights)
+        elapsed = time.perf_counter() - start
+        print(f"/machine420 poids {raw} : brelans {triple_rate:.4%} | EV simulée {ev:+.4f} "
+              f"| EV exacte {slot_expected_value(weights):+.4f} | {args.games / elapsed:,.0f} tours/s")
+
+if __name__ == "__main__":
+    main()
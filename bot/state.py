@@ -3,10 +3,27 @@ import asyncio
 # Global runtime state for the bot
 voice_times = {}
 user_dm_counts = {}
+# Invitations : {guild_id: {code: uses}} + {guild_id: {code: inviter}}
 invite_cache = {}
+invite_inviters = {}
+# Fetch d'invitations en attente par serveur (coalescing des rafales de joins)
+invite_fetches = {}
+invite_locks = {}
+# Collections Pokéweed pour l'autocomplétion : {user_id: (timestamp, clés triées, entrées)}
+pokeweed_collection_cache = {}
+# Vues des manches casino en cours : {round_id: JackpotView | DouilleView}
+casino_views = {}
+# Questions du quiz en cours : {message_id: {"answered": bool, "wrong": set(user_id)}}
+quiz_rounds = {}
+# Joueurs dont la machine à sous est en pleine animation
+active_slot_spins = set()
+# Candidats /mp_revient par admin (session de préparation) : {admin_id: (timestamp, guild_id, candidats)}
+mp_targets_cache = {}
+# Dernier contenu posté sur le panneau d'agenda : (message_id, empreinte des embeds)
+event_board_hash = None
 current_spawn = None
 capture_winner = None
 weed_shit_message_id = 0
 
 # Verrou pour éviter la double-capture simultanée (C2)
-capture_lock = asyncio.Lock()
\ No newline at end of file
+capture_lock = asyncio.Lock()
@@ -1,7 +1,7 @@
 import asyncio
 import logging
-from datetime import datetime, date, timezone, timedelta
 import os
+from datetime import datetime, date, timezone, timedelta
 import random
 import feedparser
 import socket
@@ -9,10 +9,37 @@ import socket
 import discord
 from discord.ext import tasks
 
-from . import config, database, helpers, state
+from . import backups, casino, config, database, dm_dispatcher, helpers, quiz, rng, state
 
 logger = logging.getLogger(__name__)
 
+_resolving_rounds = set()  # Références fortes : sinon une tâche de résolution peut être ramassée en cours
+
+@tasks.loop(seconds=5)
+async def casino_rounds_scheduler(bot: discord.Client):
+    # Les manches (jackpot, douille) sont en base : on tire celles dont le chrono est écoulé
+    try:
+        round_ids = await database.get_due_casino_rounds(database.db_pool)
+    except Exception as e:
+        logger.error(f"Erreur scheduler casino : {e}")
+        return
+    # Une tâche par manche : une manche lente (édition, API Discord) ne retarde plus les autres.
+    # claim_casino_round garantit qu'une manche n'est réglée qu'une fois, même si le tick suivant la revoit.
+    for round_id in round_ids:
+        task = asyncio.create_task(casino.resolve_round(bot, round_id))
+        _resolving_rounds.add(task)
+        task.add_done_callback(_round_resolved)
+
+def _round_resolved(task: asyncio.Task):
+    _resolving_rounds.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Erreur scheduler casino : {task.exception()}")
+
+@tasks.loop(seconds=30)
+async def flush_rng_draws(bot: discord.Client):
+    # Journal des tirages écrit par lots (pas d'INSERT pendant les parties)
+    await rng.flush_draws(database.bg_pool)
+
 @tasks.loop(minutes=1)
 async def weekly_recap(bot: discord.Client):
     now = datetime.now(timezone.utc)
@@ -25,13 +52,8 @@ async def weekly_recap(bot: discord.Client):
         
         guild = channel.guild
         
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                # On récupère le classement du mois en cours !
-                await cur.execute(
-                    "SELECT user_id, points FROM monthly_scores ORDER BY points DESC;"
-                )
-                all_rows = await cur.fetchall()
+        # On récupère le classement du mois en cours !
+        all_rows = await database.get_monthly_standings(database.db_pool)
         
         top_filtered = []
         for uid, pts in all_rows:
@@ -92,29 +114,28 @@ async def daily_scores_backup(bot: discord.Client):
         if not channel:
             return
             
-        filename = "scores_backup.txt"
-        with open(filename, "w") as f:
-            f.write("--- SCORES A VIE ---\n")
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute("SELECT user_id, points FROM scores;")
-                    for user_id, points in await cur.fetchall():
-                        f.write(f"{user_id},{points}\n")
-                        
-            f.write("\n--- SCORES DU MOIS ---\n")
-            async with database.db_pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute("SELECT user_id, points FROM monthly_scores;")
-                    for user_id, points in await cur.fetchall():
-                        f.write(f"{user_id},{points}\n")
+        # Flux par paquets → gzip dans un thread : mémoire constante quel que soit le nombre de membres
+        try:
+            path, counts = await backups.write_backup(database.bg_pool)
+        except Exception as e:
+            logger.error("Score backup failed: %s", e)
+            return
 
+        summary = " | ".join(f"{table} : {count}" for table, count in counts.items())
         try:
-            await channel.send("🗂️ **Voici le fichier de sauvegarde des DEUX scores :**", file=discord.File(filename))
-            logger.info("Score backup uploaded (Vie + Mois)")
+            data = await backups.open_for_upload(path)
+            try:
+                await channel.send(
+                    f"🗂️ **Sauvegarde nocturne** (scores, streaks, collections) — {summary}\n"
+                    f"♻️ Restaurable avec `/restore-scores`.",
+                    file=discord.File(data, filename=os.path.basename(path))
+                )
+            finally:
+                data.close()
+            logger.info("Score backup uploaded: %s", path)
         except Exception as e:
-            logger.warning("Failed to send score backup: %s", e)
-        finally:
-            os.remove(filename)
+            # Trop gros pour Discord ou API indisponible : le fichier reste dans le dossier local
+            logger.warning("Failed to send score backup (kept at %s): %s", path, e)
 
 @tasks.loop(minutes=5)
 async def update_voice_points(bot: discord.Client):
@@ -179,7 +200,8 @@ async def fetch_and_send_news(bot: discord.Client):
 
     for feed_url in config.RSS_FEEDS:
         try:
-            feed = feedparser.parse(feed_url)
+            # feedparser télécharge en synchrone : dans un thread pour ne pas geler la boucle
+            feed = await asyncio.to_thread(feedparser.parse, feed_url)
             if feed.bozo:
                 logger.warning("⚠️ Flux corrompu : %s → %s", feed_url, feed.bozo_exception)
                 continue
@@ -343,6 +365,23 @@ class ConcoursHelpView(discord.ui.View):
         )
         await interaction.response.send_message(message, ephemeral=True)
 
+async def render_wake_and_bake_reminder(user, guild, payload):
+    # File reprise après minuit (UTC) ou série déjà sauvée entre-temps : le rappel n'a plus de sens
+    today = datetime.now(timezone.utc).date()
+    if payload.get("day") != today.isoformat():
+        return None
+    if await database.get_wake_and_bake_last_claim(database.bg_pool, user.id) == today:
+        return None
+    msg = (
+        f"🚨 **ALERTE WAKEANDBAKE FRÉROT !** 🚨\n\n"
+        f"Il te reste moins de **4 heures** pour faire ton `/wakeandbake` aujourd'hui !\n"
+        f"Si tu ne le fais pas, tu vas perdre ta série actuelle de **{payload['streak']} jours** 🔥 et ton multiplicateur retombera à zéro.\n\n"
+        f"Fonce sur le serveur sauver ton bonus ! 💨"
+    )
+    return {"content": msg}
+
+dm_dispatcher.register_kind("wake_and_bake", render_wake_and_bake_reminder)
+
 @tasks.loop(minutes=1)
 async def wake_and_bake_reminder(bot: discord.Client):
     now = datetime.now(timezone.utc)
@@ -361,25 +400,13 @@ async def wake_and_bake_reminder(bot: discord.Client):
                 )
                 users_at_risk = await cur.fetchall()
         
-        for user_id, streak in users_at_risk:
-            try:
-                user = await bot.fetch_user(int(user_id))
-                if user:
-                    msg = (
-                        f"🚨 **ALERTE WAKEANDBAKE FRÉROT !** 🚨\n\n"
-                        f"Il te reste moins de **4 heures** pour faire ton `/wakeandbake` aujourd'hui !\n"
-                        f"Si tu ne le fais pas, tu vas perdre ta série actuelle de **{streak} jours** 🔥 et ton multiplicateur retombera à zéro.\n\n"
-                        f"Fonce sur le serveur sauver ton bonus ! 💨"
-                    )
-                    await helpers.safe_send_dm(user, msg)
-                
-                # 🛑 LA SÉCURITÉ ANTI-BAN DISCORD EST ICI 🛑
-                # Le bot attend 2 secondes avant d'envoyer le prochain message.
-                # Si tu as 30 joueurs à prévenir, ça prendra 1 minute, ce qui est très "safe" pour Discord.
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                logger.warning(f"Impossible d'envoyer le rappel W&B à {user_id}: {e}")
+        if users_at_risk:
+            # Envoi via la file des MPs (rythme global + reprise si le bot redémarre)
+            await dm_dispatcher.enqueue(
+                "wake_and_bake", None,
+                [(user_id, {"streak": streak}) for user_id, streak in users_at_risk],
+                payload={"day": today.isoformat()}
+            )
 
 @tasks.loop(minutes=1)
 async def monthly_winner_announcement(bot: discord.Client):
@@ -393,12 +420,9 @@ async def monthly_winner_announcement(bot: discord.Client):
             
         guild = channel.guild
         
-        # Récupérer les scores DU MOIS uniquement
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute("SELECT user_id, points FROM monthly_scores ORDER BY points DESC;")
-                all_rows = await cur.fetchall()
-                
+        # Classement figé du mois qui vient de se terminer (les points d'aujourd'hui comptent déjà pour le nouveau)
+        all_rows = await database.get_monthly_standings(database.db_pool, database.previous_period(now))
+
         # Filtrer les exclus (rôles ignorés, admins...)
         top_filtered = []
         for uid, pts in all_rows:
@@ -408,8 +432,7 @@ async def monthly_winner_announcement(bot: discord.Client):
             top_filtered.append((uid, pts))
                 
         if not top_filtered:
-            # Si personne n'a joué, on remet juste à zéro
-            await database.reset_monthly_scores(database.db_pool)
+            # Personne n'a joué : rien à annoncer, le nouveau mois a déjà démarré
             return
 
         # Le vainqueur
@@ -446,12 +469,9 @@ async def monthly_winner_announcement(bot: discord.Client):
             f"<@&{config.ROLE_MEMBRE_ID}>"
         )
         
-        # On envoie le message texte
+        # On envoie le message texte (pas de remise à zéro : le nouveau mois a sa propre partition)
         await channel.send(content=msg)
-        
-        # Remise à zéro mensuelle
-        await database.reset_monthly_scores(database.db_pool)
-        logger.info("Annonce mensuelle envoyée, rôle distribué et scores du mois remis à zéro.")
+        logger.info("Annonce mensuelle envoyée et rôle distribué.")
 
 @tasks.loop(minutes=1)
 async def daily_staff_briefing(bot: discord.Client):
@@ -463,19 +483,15 @@ async def daily_staff_briefing(bot: discord.Client):
         if not channel:
             return
 
-        async with database.db_pool.acquire() as conn:
-            async with conn.cursor() as cur:
-                # 1. Événements d'AUJOURD'HUI
-                await cur.execute("SELECT heure, animateur_id, titre FROM planning_pro WHERE slot_date = CURDATE() AND est_reserve = TRUE ORDER BY heure ASC;")
-                events_today = await cur.fetchall()
-                
-                # 2. Événements des 7 PROCHAINS JOURS
-                await cur.execute("SELECT slot_date, heure, animateur_id, titre FROM planning_pro WHERE slot_date > CURDATE() AND slot_date <= DATE_ADD(CURDATE(), INTERVAL 7 DAY) AND est_reserve = TRUE ORDER BY slot_date ASC;")
-                events_week = await cur.fetchall()
-                
-                # 3. Créneaux LIBRES dans les 7 PROCHAINS JOURS
-                await cur.execute("SELECT slot_date, heure FROM planning_pro WHERE slot_date >= CURDATE() AND slot_date <= DATE_ADD(CURDATE(), INTERVAL 7 DAY) AND est_reserve = FALSE ORDER BY slot_date ASC;")
-                free_slots = await cur.fetchall()
+        # Une seule lecture de plage (aujourd'hui + 7 jours), répartie ensuite en mémoire
+        today = database.planning_today()
+        window = await database.PlanningRepository(database.db_pool).window(today, today + timedelta(days=8))
+        tomorrow = today + timedelta(days=1)
+
+        # 1. Événements d'AUJOURD'HUI / 2. des 7 PROCHAINS JOURS / 3. Créneaux LIBRES
+        events_today = [(s.heure, s.animateur_id, s.titre) for s in window if s.est_reserve and s.starts_at < tomorrow]
+        events_week = [(s.starts_at, s.heure, s.animateur_id, s.titre) for s in window if s.est_reserve and s.starts_at >= tomorrow]
+        free_slots = [(s.starts_at, s.heure) for s in window if not s.est_reserve]
 
         # Construction du message
         lines = ["☀️ **BRIEFING STAFF DU JOUR !** ☀️\n"]
@@ -513,140 +529,21 @@ async def auto_refresh_planning(bot: discord.Client):
     await bot.wait_until_ready()
     await helpers.refresh_event_message(bot)
 
-class QuizView(discord.ui.View):
-    def __init__(self, question_data):
-        super().__init__(timeout=3600) # Le quiz expire au bout d'1 heure
-        self.q_data = question_data
-        self.answered = False
-        self.wrong_users = set()
-
-        # On crée les 4 boutons avec les options
-        for i, opt in enumerate(question_data["options"]):
-            btn = discord.ui.Button(label=opt, style=discord.ButtonStyle.primary, custom_id=f"quiz_opt_{i}")
-            btn.callback = self.make_callback(i)
-            self.add_item(btn)
-
-    def make_callback(self, index):
-        async def callback(interaction: discord.Interaction):
-            # ⬅️ 1. ON DEFER TOUT DE SUITE POUR ÉVITER LE TIMEOUT DE 3 SECONDES
-            await interaction.response.defer() 
-            
-            if self.answered:
-                # ⬅️ 2. ON UTILISE followup.send() AU LIEU DE response.send_message()
-                await interaction.followup.send("⏳ Trop tard, quelqu'un a déjà trouvé la bonne réponse !", ephemeral=True)
-                return
-                
-            if interaction.user.id in self.wrong_users:
-                await interaction.followup.send("❌ Tu as déjà répondu faux ! Laisse les autres essayer.", ephemeral=True)
-                return
-
-            if index == self.q_data["answer"]:
-                self.answered = True
-                pts_win = 50
-                
-                # 🏆 Il a gagné ! On donne les points
-                await database.add_points(database.db_pool, str(interaction.user.id), pts_win)
-                
-                # On désactive et on colorie les boutons
-                for i, child in enumerate(self.children):
-                    child.disabled = True
-                    if i == self.q_data["answer"]:
-                        child.style = discord.ButtonStyle.success
-                    else:
-                        child.style = discord.ButtonStyle.secondary
-                        
-                embed = interaction.message.embeds[0]
-                embed.color = discord.Color.green()
-                embed.description += f"\n\n🎉 **BINGO !** {interaction.user.mention} a trouvé la bonne réponse et rafle **+{pts_win} points** !"
-                
-                # ⬅️ 3. ON UTILISE edit_original_response() CAR ON A DÉJÀ DEFER
-                await interaction.edit_original_response(embed=embed, view=self)
-            else:
-                # ❌ Il s'est trompé ! On retire des points
-                self.wrong_users.add(interaction.user.id)
-                pts_loss = 10
-                await database.add_points(database.db_pool, str(interaction.user.id), -pts_loss)
-                await interaction.followup.send(f"❌ Faux ! C'est pas ça frérot. Tu perds **{pts_loss} points**. Kof Kof...", ephemeral=True)
-                
-        return callback
-
-    async def on_timeout(self):
-        # Si personne ne trouve après 1h, on désactive les boutons
-        if not self.answered and hasattr(self, 'message'):
-            for child in self.children:
-                child.disabled = True
-            try:
-                embed = self.message.embeds[0]
-                embed.color = discord.Color.light_grey()
-                embed.description += "\n\n⏰ *Temps écoulé ! Personne n'a eu la bonne réponse...*"
-                await self.message.edit(embed=embed, view=self)
-            except:
-                pass
-
-
-# --- AJOUT EN HAUT DE TES FONCTIONS QUIZ ---
-# On prépare notre liste en mémoire pour l'ordre WTF sans répétition
-_questions_disponibles = []
-
 async def trigger_quiz(bot: discord.Client, forced_channel=None):
-    from .quiz_data import QUIZ_QUESTIONS
-    import random
-    import json
-    import os
-    
-    # Le nom de notre petit fichier post-it
-    STATE_FILE = "quiz_state.json"
-    
     if forced_channel:
         channel = forced_channel
     else:
         # Salons où le bot a le droit de poser ses questions aléatoires
-        possible_channels = [
-            config.BLABLA_CHANNEL_ID,
-        ]
-        channel = bot.get_channel(random.choice(possible_channels))
-    
+        channel = bot.get_channel(rng.get("quiz").choice(config.QUIZ_CHANNEL_IDS))
+
     if not channel:
         return
-        
-    # --- 1. CHARGEMENT DE L'ÉTAT (LE POST-IT) ---
-    questions_disponibles = []
-    if os.path.exists(STATE_FILE):
-        try:
-            with open(STATE_FILE, "r") as f:
-                questions_disponibles = json.load(f)
-        except Exception as e:
-            logger.error(f"Erreur de lecture du fichier quiz: {e}")
-            
-    # --- 2. SI LE POST-IT EST VIDE (Ou premier lancement) ---
-    if not questions_disponibles:
-        # Au lieu de copier toutes les questions, on stocke juste leurs NUMÉROS (de 0 à 149)
-        questions_disponibles = list(range(len(QUIZ_QUESTIONS)))
-        random.shuffle(questions_disponibles) # On mélange les numéros
-        logger.info("🧠 Nouveau cycle de quiz généré et mélangé !")
-        
-    # --- 3. ON TIRE LE NUMÉRO ET ON LE RETIRE DE LA LISTE ---
-    q_index = questions_disponibles.pop()
-    q_data = QUIZ_QUESTIONS[q_index]
-    
-    # --- 4. ON SAUVEGARDE LE NOUVEAU POST-IT ---
-    try:
-        with open(STATE_FILE, "w") as f:
-            json.dump(questions_disponibles, f)
-    except Exception as e:
-        logger.error(f"Erreur de sauvegarde du fichier quiz: {e}")
-    
-    # --- 5. ON ENVOIE LA QUESTION ---
-    embed = discord.Embed(
-        title=f"🧠 LE QUIZ ENFUMÉ - {q_data.get('category', 'Culture G')}",
-        description=f"**{q_data['question']}**\n\n*Le premier à cliquer sur la bonne réponse gagne 50 points ! (Attention : -10 pts si tu te trompes !)*",
-        color=discord.Color.orange()
-    )
-    
-    # Assure-toi que la classe QuizView est bien définie plus haut dans ton fichier !
-    view = QuizView(q_data)
-    msg = await channel.send(embed=embed, view=view)
-    view.message = msg # On sauvegarde le message pour le timeout
+    await quiz.post_quiz(channel)
+
+@tasks.loop(seconds=10)
+async def flush_quiz_answers(bot: discord.Client):
+    # Points du quiz appliqués par lots (pas d'écriture par clic)
+    await quiz.flush_answers(database.bg_pool)
 
 
 async def random_quiz_loop(bot: discord.Client):
@@ -659,13 +556,9 @@ async def random_quiz_loop(bot: discord.Client):
         import zoneinfo
         tz = zoneinfo.ZoneInfo("Europe/Paris")
     except Exception:
-        from datetime import timezone, timedelta
         tz = timezone(timedelta(hours=1))
 
     while True:
-        import random
-        from datetime import datetime
-        
         # Tirage aléatoire entre 3h (10800 sec) et 6h (21600 sec)
         delay = random.randint(3 * 3600, 6 * 3600)
         logger.info(f"⏳ Prochain Quiz dans {delay // 3600}h et {(delay % 3600)//60}m.")
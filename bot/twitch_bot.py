@@ -2,7 +2,7 @@ import logging
 import time
 import aiohttp
 from twitchio.ext import commands
-from . import config, database
+from . import config, database, metrics
 
 logger = logging.getLogger(__name__)
 
@@ -27,7 +27,7 @@ class KanaeTwitchBot(commands.Bot):
         # 🌿 ÉCO-FRIENDLY : On vérifie l'état du live toutes les 5 minutes (300 secondes) max
         if now - last_live_check > 300:
             try:
-                async with aiohttp.ClientSession() as session:
+                async with aiohttp.ClientSession(trace_configs=[metrics.HTTP_TRACE]) as session:
                     # Appel à DecAPI pour voir ton uptime
                     url = f"https://decapi.me/twitch/uptime/{config.TWITCH_CHANNEL}"
                     async with session.get(url) as resp:
@@ -68,11 +68,13 @@ class KanaeTwitchBot(commands.Bot):
             return
 
         # On regarde si ce pseudo Twitch est relié à un compte Kanaé
-        discord_id = await database.get_discord_by_social(database.db_pool, twitch_user, "twitch")
-        
+        async with database.unit_of_work(database.db_pool):
+            discord_id = await database.get_discord_by_social(database.db_pool, twitch_user, "twitch")
+
+            if discord_id:
+                # Bingo ! On lui donne 1 point sur Discord
+                await database.add_points(database.db_pool, discord_id, 1)
         if discord_id:
-            # Bingo ! On lui donne 1 point sur Discord
-            await database.add_points(database.db_pool, discord_id, 1)
             twitch_cooldowns[twitch_user] = now
             logger.info(f"✨ +1 point Discord pour {twitch_user} via le chat Twitch (LIVE ON) !")
 
@@ -4,7 +4,7 @@ import logging
 import discord
 from discord.ext import commands
 
-from bot import config, events, commands as bot_commands, tasks, loup_garou
+from bot import config, database, events, commands as bot_commands, tasks, loup_garou, metrics, persistent_views
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
 
@@ -15,11 +15,16 @@ intents.guilds = True
 intents.dm_messages = True
 intents.reactions = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+bot = commands.Bot(command_prefix="!", intents=intents, http_trace=metrics.HTTP_TRACE)
 
 # Register events and commands (Fichiers normaux)
 events.setup(bot)
 bot_commands.setup(bot)
+# Boutons qui doivent survivre aux redémarrages (quiz, ventes, échanges, cadeau /mp_revient)
+persistent_views.setup(bot)
+# Latences DB et boucles de fond (les commandes slash sont instrumentées dans on_ready, cogs compris)
+metrics.instrument_module(database)
+metrics.instrument_loops(tasks)
 
 async def main():
     async with bot: